@@ -0,0 +1,5 @@
+"""
+Trading automation on the poloniex cryptocoin exchange. The command is in
+cli, the trading logic in trader.
+"""
+__version__ = '2.0.0'
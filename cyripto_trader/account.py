@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+My account on a simulated exchange, shared by the backtest and the simulator.
+
+Account keeps my balances and does the bookkeeping of my orders the way
+poloniex does it: a new order is checked and what it needs is held (the coin
+of a sell, the total of a buy), a fill moves the balances at the fill price
+with the fee taken from what is received, and a canceled or done order gives
+back what it still holds. A move gives the old order back and places the new
+one, or holds the old one again if the new one can't be placed.
+
+Where my orders are matched is up to the exchange: BacktestExchange matches
+them against the recorded market, ExchangeSimulator in its matching engine.
+An order is a dict with at least type, price, amount (left),
+starting_amount and held.
+
+Money is in satoshis, fees are in parts per million.
+"""
+from .satoshi import div_round, from_satoshi, mul_satoshi, to_satoshi
+
+
+INVALID_ORDER = 'Invalid order number, or you are not the person who placed the order.'
+
+
+def fee_ppm(rate):
+    """
+    parts per million of a fee rate like 0.0025.
+    """
+    return int(round(rate * 1000000))
+
+
+def open_order_fields(order_number, order):
+    """
+    the order in the returnOpenOrders format.
+    """
+    return {'orderNumber': str(order_number), 'type': order['type'],
+            'rate': from_satoshi(order['price']), 'amount': from_satoshi(order['amount']),
+            'startingAmount': from_satoshi(order['starting_amount']),
+            'total': from_satoshi(mul_satoshi(order['price'], order['amount']))}
+
+
+class Account(object):
+    """
+    my balances (coin -> amount in coins) on the exchange, with the order
+    statistics of a run. fees are rates.
+    """
+    def __init__(self, balances, maker_fee=0.0015, taker_fee=0.0025, min_total='0.0001'):
+        self.balances = dict((coin, to_satoshi(amount)) for coin, amount in balances.items())
+        self.maker_fee = fee_ppm(maker_fee)
+        self.taker_fee = fee_ppm(taker_fee)
+        self.min_total = to_satoshi(min_total)
+
+        # statistics
+        self.orders_placed = 0
+        self.amount_placed = 0
+        self.orders_filled = 0
+        self.amount_filled = 0
+        self.volume = 0
+        # in the currency
+        self.fees = 0
+
+    def fee(self, value, rate):
+        return div_round(value * rate, 1000000)
+
+    def held_coin(self, pair, order_type):
+        """
+        what an order of the type holds, the coin of a sell or the currency
+        of a buy.
+        """
+        currency, coin = pair.split('_')
+        if order_type == 'sell':
+            return coin
+        return currency
+
+    def hold(self, pair, order_type, rate, amount):
+        """
+        checks a new order and takes what it needs from the balances. Returns
+        (price, amount, held) in satoshis. Raises RuntimeError like the
+        exchange.
+        """
+        price = to_satoshi(rate)
+        amount = to_satoshi(amount)
+        total = mul_satoshi(price, amount)
+        if price <= 0 or amount <= 0:
+            raise RuntimeError('Invalid rate or amount.')
+        if total < self.min_total:
+            raise RuntimeError('Total must be at least %s.' % from_satoshi(self.min_total))
+        coin = self.held_coin(pair, order_type)
+        held = amount if order_type == 'sell' else total
+        if self.balances.get(coin, 0) < held:
+            raise RuntimeError('Not enough %s.' % coin)
+        self.balances[coin] -= held
+        self.orders_placed += 1
+        self.amount_placed += amount
+        return price, amount, held
+
+    def settle(self, pair, order, price, amount, fee_rate):
+        """
+        moves the balances of amount of the order filled at price. The order
+        amount is taken down by the exchange that matched it.
+        """
+        currency, coin = pair.split('_')
+        value = mul_satoshi(price, amount)
+        if order['type'] == 'sell':
+            fee = self.fee(value, fee_rate)
+            self.balances[currency] += value - fee
+            order['held'] -= amount
+            self.fees += fee
+        else:
+            fee = self.fee(amount, fee_rate)
+            self.balances[coin] += amount - fee
+            held = mul_satoshi(order['price'], amount)
+            # a better price gives some of the held currency back
+            self.balances[currency] += held - value
+            order['held'] -= held
+            self.fees += mul_satoshi(fee, price)
+        self.amount_filled += amount
+        self.volume += value
+
+    def release(self, pair, order):
+        """
+        gives back what the order still holds.
+        """
+        self.balances[self.held_coin(pair, order['type'])] += order['held']
+        order['held'] = 0
+
+    def replace(self, pair, order, place):
+        """
+        gives back what the order holds and calls place, which places the new
+        order. If place raises the order holds what it held again.
+        """
+        held = order['held']
+        self.release(pair, order)
+        try:
+            return place()
+        except RuntimeError:
+            self.balances[self.held_coin(pair, order['type'])] -= held
+            order['held'] = held
+            raise
+
+    def balance_fields(self):
+        """
+        the balances in the returnBalances format.
+        """
+        return dict((coin, from_satoshi(balance)) for coin, balance in self.balances.items())
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Backtesting on recorded market data.
+
+BacktestExchange stands in for the poloniex client: it keeps the recorded
+order book, holds the balances and matches my orders against the recorded
+trades and book. run_backtest feeds the recorded events to the exchange and to
+the Trader, which runs its normal streaming logic (find_*_price,
+decide_to_trade, sell, buy) against the simulated exchange with no sleeps.
+
+The events are the market_feed ones, read from a JSON lines file or a
+recording. The balances, holds and fees of my orders are kept by an
+account.Account, the same as in the simulator.
+
+Fills are optimistic: my resting order is filled by any trade through its
+price, or fully when the recorded book crosses it, as if it was first in the
+queue. My orders don't take liquidity out of the recorded book.
+"""
+import time
+
+from .account import INVALID_ORDER, Account, open_order_fields
+from .order_book import OrderBook
+from .satoshi import from_satoshi, mul_satoshi, to_satoshi
+
+
+class BacktestExchange(object):
+    """
+    The poloniex api subset Trader uses, on one currency pair.
+    balances are in coins. fees are rates, e.g. 0.0025.
+    """
+    def __init__(self, pair, currency_balance=1.0, coin_balance=0.0,
+                 maker_fee=0.0015, taker_fee=0.0025, min_total='0.0001'):
+        self.pair = pair
+        self.currency, self.coin = pair.split('_')
+        # the balances and order statistics
+        self.account = Account({self.currency: currency_balance, self.coin: coin_balance},
+                               maker_fee, taker_fee, min_total)
+        self.balances = self.account.balances
+        self.book = OrderBook()
+        # order number -> {'type', 'price', 'amount', 'starting_amount', 'held'}
+        self.orders = {}
+        self.next_order_number = 1
+        self.ts = None
+        # set when one of my orders was filled, the backtest clears it
+        self.filled = False
+
+    # market data
+
+    def apply_market_event(self, event):
+        if event.get('pair') != self.pair:
+            return
+        if 'ts' in event:
+            self.ts = event['ts']
+        if event['type'] == 'snapshot':
+            self.book.apply_snapshot(event['bids'], event['asks'], event.get('seq'))
+        elif event['type'] == 'update':
+            self.book.apply_updates(event.get('seq'), event['changes'])
+        elif event['type'] == 'trade':
+            self.match_trade(event)
+        self.match_crossed()
+
+    def mid_price(self):
+        bid = self.book.best_bid()
+        ask = self.book.best_ask()
+        if bid is None or ask is None:
+            return bid or ask
+        return (bid + ask) // 2
+
+    # matching
+
+    def fill(self, order_number, price, amount, fee_rate):
+        """
+        fills amount of the order at price.
+        """
+        order = self.orders[order_number]
+        self.account.settle(self.pair, order, price, amount, fee_rate)
+        order['amount'] -= amount
+        self.filled = True
+        if order['amount'] <= 0:
+            self.account.orders_filled += 1
+            self.release(order_number)
+
+    def release(self, order_number):
+        self.account.release(self.pair, self.orders.pop(order_number))
+
+    def match_trade(self, trade):
+        """
+        a recorded trade fills my orders at or better than its price.
+        """
+        price = to_satoshi(trade['price'])
+        left = to_satoshi(trade['amount'])
+        if trade['trade_type'] == 'buy':
+            hit = [(o['price'], n) for n, o in self.orders.items()
+                   if o['type'] == 'sell' and o['price'] <= price]
+            hit.sort()
+        else:
+            hit = [(-o['price'], n) for n, o in self.orders.items()
+                   if o['type'] == 'buy' and o['price'] >= price]
+            hit.sort()
+        for _, order_number in hit:
+            if left <= 0:
+                break
+            order = self.orders[order_number]
+            amount = min(left, order['amount'])
+            self.fill(order_number, order['price'], amount, self.account.maker_fee)
+            left -= amount
+
+    def match_crossed(self):
+        """
+        my orders the recorded book went through are filled.
+        """
+        if not self.orders:
+            return
+        bid = self.book.best_bid()
+        ask = self.book.best_ask()
+        for order_number, order in list(self.orders.items()):
+            if order['type'] == 'sell' and bid is not None and bid >= order['price']:
+                self.fill(order_number, order['price'], order['amount'], self.account.maker_fee)
+            elif order['type'] == 'buy' and ask is not None and ask <= order['price']:
+                self.fill(order_number, order['price'], order['amount'], self.account.maker_fee)
+
+    def take(self, order_number):
+        """
+        fills a new order against the recorded book as far as it crosses it.
+        """
+        order = self.orders[order_number]
+        if order['type'] == 'sell':
+            side = self.book.sides['buy']
+            crosses = lambda price: price >= order['price']
+        else:
+            side = self.book.sides['sell']
+            crosses = lambda price: price <= order['price']
+        trades = []
+        for index in range(len(side)):
+            if order_number not in self.orders or not crosses(side.prices[index]):
+                break
+            amount = min(order['amount'], side.amounts[index])
+            self.fill(order_number, side.prices[index], amount, self.account.taker_fee)
+            trades.append({'amount': from_satoshi(amount),
+                           'rate': from_satoshi(side.prices[index]), 'type': order['type']})
+        return trades
+
+    # api
+
+    def returnBalances(self):
+        return self.account.balance_fields()
+
+    def returnOpenOrders(self, currencyPair='all'):
+        orders = [open_order_fields(order_number, self.orders[order_number])
+                  for order_number in sorted(self.orders)]
+        if currencyPair == 'all':
+            return {self.pair: orders}
+        return orders
+
+    def returnOrderBook(self, currencyPair='all', depth='50'):
+        depth = int(depth)
+        order_book = {'seq': self.book.seq, 'isFrozen': '0'}
+        for name, order_type in (('bids', 'buy'), ('asks', 'sell')):
+            side = self.book.sides[order_type]
+            order_book[name] = [[from_satoshi(side.prices[i]), from_satoshi(side.amounts[i])]
+                                for i in range(min(depth, len(side)))]
+        if currencyPair == 'all':
+            return {self.pair: order_book}
+        return order_book
+
+    def place(self, order_type, currencyPair, rate, amount):
+        price, amount, held = self.account.hold(self.pair, order_type, rate, amount)
+        order_number = self.next_order_number
+        self.next_order_number += 1
+        self.orders[order_number] = {'type': order_type, 'price': price, 'amount': amount,
+                                     'starting_amount': amount, 'held': held}
+        trades = self.take(order_number)
+        return {'orderNumber': str(order_number), 'resultingTrades': trades}
+
+    def sell(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.place('sell', currencyPair, rate, amount)
+
+    def buy(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.place('buy', currencyPair, rate, amount)
+
+    def cancelOrder(self, orderNumber):
+        order_number = int(orderNumber)
+        if order_number not in self.orders:
+            raise RuntimeError(INVALID_ORDER)
+        self.release(order_number)
+        return {'success': 1}
+
+    def moveOrder(self, orderNumber, rate, amount=None, *args, **kwargs):
+        """
+        cancels and places the order in one go. The order stays as it was if
+        the new one can't be placed.
+        """
+        order_number = int(orderNumber)
+        if order_number not in self.orders:
+            raise RuntimeError(INVALID_ORDER)
+        order = self.orders.pop(order_number)
+        if amount is None:
+            amount = from_satoshi(order['amount'])
+        try:
+            retval = self.account.replace(
+                self.pair, order, lambda: self.place(order['type'], self.pair, rate, amount))
+        except RuntimeError:
+            self.orders[order_number] = order
+            raise
+        return {'success': 1, 'orderNumber': retval['orderNumber'],
+                'resultingTrades': {self.pair: retval['resultingTrades']}}
+
+    # results
+
+    def holdings(self):
+        """
+        (coin, currency) in satoshis, with what is held in open orders.
+        """
+        coin = self.balances[self.coin]
+        currency = self.balances[self.currency]
+        for order in self.orders.values():
+            if order['type'] == 'sell':
+                coin += order['held']
+            else:
+                currency += order['held']
+        return coin, currency
+
+    def equity(self):
+        """
+        value of the holdings in the currency at the mid price.
+        """
+        coin, currency = self.holdings()
+        mid = self.mid_price() or 0
+        return currency + mul_satoshi(coin, mid)
+
+
+def run_backtest(trader, exchange, events, sample_every=1000):
+    """
+    runs the trader's streaming logic over the events against the exchange.
+    trader.polo should be the exchange. Returns the report as a dict.
+    """
+    started = time.time()
+    count = 0
+    decisions = 0
+    first_equity = None
+    inventory = []
+    trader.cancel_wait_time = 0
+    trader.last_prices = None
+    for event in events:
+        exchange.apply_market_event(event)
+        if exchange.filled:
+            exchange.filled = False
+            trader.load_balances()
+            trader.last_prices = None
+        if first_equity is None and exchange.book.synced:
+            trader.load_balances()
+            first_equity = exchange.equity()
+        if trader.on_market_event(event):
+            decisions += 1
+        count += 1
+        if sample_every and count % sample_every == 0:
+            coin, currency = exchange.holdings()
+            inventory.append({'ts': exchange.ts, 'coin': from_satoshi(coin),
+                              'currency': from_satoshi(currency),
+                              'equity': from_satoshi(exchange.equity())})
+
+    elapsed = time.time() - started
+    coin, currency = exchange.holdings()
+    last_equity = exchange.equity()
+    account = exchange.account
+    report = {
+        'pair': exchange.pair,
+        'events': count,
+        'seconds': round(elapsed, 3),
+        'events_per_second': int(count / elapsed) if elapsed else None,
+        'decisions': decisions,
+        'orders_placed': account.orders_placed,
+        'orders_filled': account.orders_filled,
+        'fill_rate': (float(account.amount_filled) / account.amount_placed
+                      if account.amount_placed else 0.0),
+        'volume': from_satoshi(account.volume),
+        'fees': from_satoshi(account.fees),
+        'coin': from_satoshi(coin),
+        'currency': from_satoshi(currency),
+        'start_equity': from_satoshi(first_equity or 0),
+        'end_equity': from_satoshi(last_equity),
+        'pnl': from_satoshi(last_equity - (first_equity or 0)),
+        'inventory': inventory,
+    }
+    return report
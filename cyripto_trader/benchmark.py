@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the Trader hot path.
+
+Every case runs one step of a tick (syncing the book, tagging my orders,
+finding the prices, deciding, parsing the open orders, reconciling them)
+against a book of a given depth with a given number of my open orders, on
+synthetic books or on the last book of a recording. The exchange is a stub
+that answers at once, so only the trader's own time is measured.
+
+The results are ops per second (best of a few rounds) and the allocations
+left behind per op, the net allocated blocks from tracemalloc. They can be
+saved as a JSON baseline and later runs compared
+against it.
+"""
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+from .order_book import OrderBook
+from .satoshi import from_satoshi, to_satoshi
+from .sweep import dataset_events
+
+
+DEPTHS = (50, 200, 1000, 5000)
+OPEN_ORDERS = (1, 10, 100)
+
+
+class StubExchange(object):
+    """
+    answers the order calls at once with no fills.
+    """
+    def __init__(self):
+        self.next_order_number = 1
+
+    def new_order(self):
+        self.next_order_number += 1
+        return {'orderNumber': str(self.next_order_number), 'resultingTrades': []}
+
+    def sell(self, *args, **kwargs):
+        return self.new_order()
+
+    def buy(self, *args, **kwargs):
+        return self.new_order()
+
+    def moveOrder(self, *args, **kwargs):
+        return self.new_order()
+
+    def cancelOrder(self, *args, **kwargs):
+        return {'success': 1}
+
+
+def synthetic_book(depth, seed=1, mid=0.02, tick=0.000001):
+    """
+    raw order book with depth levels per side, like returnOrderBook.
+    """
+    rand = random.Random(seed)
+    mid = to_satoshi(mid)
+    tick = to_satoshi(tick)
+    book = {'bids': [], 'asks': [], 'seq': seed}
+    for level in range(1, depth + 1):
+        for name, sign in (('bids', -1), ('asks', 1)):
+            amount = int(to_satoshi(2) * rand.expovariate(1.0)) + 1
+            book[name].append([from_satoshi(mid + sign * level * tick), from_satoshi(amount)])
+    return book
+
+
+def recorded_book(path):
+    """
+    raw order book at the end of a recording.
+    """
+    book = OrderBook()
+    for event in dataset_events(path):
+        if event['type'] == 'snapshot':
+            book.apply_snapshot(event['bids'], event['asks'], event.get('seq'))
+        elif event['type'] == 'update':
+            book.apply_updates(event.get('seq'), event['changes'])
+    raw = {'seq': book.seq}
+    for name, order_type in (('bids', 'buy'), ('asks', 'sell')):
+        side = book.sides[order_type]
+        raw[name] = [[from_satoshi(side.prices[i]), from_satoshi(side.amounts[i])]
+                     for i in range(len(side))]
+    return raw
+
+
+def cut_book(book, depth):
+    return {'bids': book['bids'][:depth], 'asks': book['asks'][:depth], 'seq': book['seq']}
+
+
+def changed_book(book, seed=2):
+    """
+    the book with a tenth of the amounts changed and the next seq, for syncs
+    that have something to do.
+    """
+    rand = random.Random(seed)
+    changed = {'seq': book['seq'] + 1}
+    for name in ('bids', 'asks'):
+        levels = []
+        for price, amount in book[name]:
+            if rand.random() < 0.1:
+                amount = from_satoshi(to_satoshi(amount) + rand.randint(1, 100000000))
+            levels.append([price, amount])
+        changed[name] = levels
+    return changed
+
+
+def open_orders_raw(book, count):
+    """
+    my open orders on the top levels of the book, alternating sells and buys.
+    """
+    orders = []
+    for number in range(count):
+        order_type = 'sell' if number % 2 == 0 else 'buy'
+        levels = book['asks'] if order_type == 'sell' else book['bids']
+        price = levels[min(number // 2, len(levels) - 1)][0]
+        orders.append({'orderNumber': str(number + 1), 'type': order_type, 'rate': price,
+                       'amount': '1.00000000', 'startingAmount': '1.00000000',
+                       'total': price})
+    return orders
+
+
+def make_trader(trader_class, book, open_orders):
+    trader = trader_class(None, None, 'ZEC', 'BTC', 5.5, 50.0, 0.0002, 3,
+                          polo=StubExchange())
+    trader.cancel_wait_time = 0
+    trader.process_open_orders(open_orders)
+    trader.process_balances({'ZEC': '10.0', 'BTC': '1.0'})
+    trader.apply_order_book(book)
+    return trader
+
+
+def cases(trader_class, book, open_orders):
+    """
+    (name, setup, function) of the benchmarks on a book and open orders.
+    setup returns the argument of function, it is not timed.
+    """
+    other = changed_book(book)
+
+    def with_trader():
+        return make_trader(trader_class, book, open_orders)
+
+    def sync_book(trader):
+        trader.apply_order_book(other)
+        trader.apply_order_book(book)
+
+    def process_order_book(trader):
+        trader.process_order_book('buy')
+        trader.process_order_book('sell')
+
+    def find_prices(trader):
+        trader.find_sell_price()
+        trader.find_buy_price()
+
+    def decide_to_trade(trader):
+        trader.decide_to_trade()
+
+    def process_open_orders(trader):
+        trader.process_open_orders(open_orders)
+
+    def reconcile(trader):
+        # back to the loaded open orders, then sell() moves or cancels them
+        trader.process_open_orders(open_orders)
+        trader.process_balances({'ZEC': '10.0', 'BTC': '1.0'})
+        trader.sell_price = trader.find_sell_price()
+        trader.sell()
+
+    return [
+        ('sync_book', with_trader, sync_book),
+        ('process_order_book', with_trader, process_order_book),
+        ('find_prices', with_trader, find_prices),
+        ('decide_to_trade', with_trader, decide_to_trade),
+        ('process_open_orders', with_trader, process_open_orders),
+        ('reconcile', with_trader, reconcile),
+    ]
+
+
+def measure(function, argument, min_time=0.2, rounds=3):
+    """
+    ops per second of function(argument), the best of rounds runs of at
+    least min_time seconds, and allocations per op.
+    """
+    # how many calls take about min_time
+    number = 1
+    while True:
+        started = time.time()
+        for _ in range(number):
+            function(argument)
+        elapsed = time.time() - started
+        if elapsed >= min_time / 10 or number >= 1000000:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = None
+    for _ in range(rounds):
+        started = time.time()
+        for _ in range(number):
+            function(argument)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+
+    ops = number / best if best else None
+    # the allocations of about a tenth of a round
+    return ops, allocations(function, argument, max(1, min(100, number // 10)))
+
+
+def allocations(function, argument, number=100):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(number):
+        function(argument)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename')
+                 if stat.count_diff > 0)
+    return {'blocks_per_op': round(blocks / number, 2)}
+
+
+def run_benchmarks(trader_class, datasets=None, depths=DEPTHS, open_order_counts=OPEN_ORDERS,
+                   min_time=0.2):
+    """
+    runs every case on synthetic books of the depths and on the books of the
+    datasets (cut to the depths). Returns the results keyed by case name.
+    """
+    books = [('synthetic', synthetic_book(max(depths)))]
+    for path in datasets or []:
+        books.append((path, recorded_book(path)))
+
+    results = {}
+    for source, full_book in books:
+        for depth in depths:
+            if depth > max(len(full_book['bids']), len(full_book['asks'])):
+                continue
+            book = cut_book(full_book, depth)
+            for count in open_order_counts:
+                open_orders = open_orders_raw(book, count)
+                for name, setup, function in cases(trader_class, book, open_orders):
+                    ops, allocated = measure(function, setup(), min_time)
+                    key = '%s/%s/depth=%d/orders=%d' % (name, source, depth, count)
+                    result = {'ops_per_second': round(ops, 1)}
+                    result.update(allocated)
+                    results[key] = result
+    return {'python': platform.python_version(), 'results': results}
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    cases that got slower than the baseline by more than tolerance, as
+    (key, baseline ops, ops) sorted by how much slower.
+    """
+    slower = []
+    for key, result in results['results'].items():
+        old = baseline['results'].get(key)
+        if not old:
+            continue
+        if result['ops_per_second'] < old['ops_per_second'] * (1 - tolerance):
+            slower.append((key, old['ops_per_second'], result['ops_per_second']))
+    slower.sort(key=lambda item: item[2] / item[1])
+    return slower
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
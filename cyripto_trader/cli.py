@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+The cyripto_trader command. The settings are read and the modules of an action
+imported only when the action runs, so --help and benchmark don't need a
+settings.yaml and only the live actions import requests.
+"""
+import argparse
+import json
+import sys
+
+
+LIVE_ACTIONS = ('sell_all', 'buy_all', 'scalp', 'stream', 'portfolio')
+
+ACTIONS = LIVE_ACTIONS + ('backtest', 'sweep', 'record', 'replay', 'simulate', 'benchmark',
+                          'pnl')
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='cyripto_trader')
+    parser.add_argument(
+        'action',
+        choices=ACTIONS,
+        help="What to do? sell_all, buy_all, scalp, stream (scalp on a push feed), "
+             "portfolio (scalp all the pairs in the settings), backtest, sweep "
+             "(backtest the sweep settings), record (save the market data), replay "
+             "(serve a recording to stream --replay tcp://), simulate "
+             "(run the local exchange simulator), benchmark (time the trader hot path) "
+             "or pnl (the positions and PnL in the fill ledger)",
+        )
+    parser.add_argument(
+        '--settings', default='settings.yaml',
+        help="the settings file",
+        )
+    parser.add_argument(
+        '--concurrent', action='store_true',
+        help="scalp, sell_all, buy_all, stream: send the independent api calls of a tick "
+             "at the same time",
+        )
+    parser.add_argument(
+        '--replay',
+        help="stream, record: replay market events from a JSON lines file, a recording "
+             "or tcp://host:port instead of the live feed. replay: the file to serve",
+        )
+    parser.add_argument(
+        '--replay-speed', type=float, default=0,
+        help="stream, replay: 1.0 replays in real time, 0 with no waiting",
+        )
+    parser.add_argument(
+        '--listen', default='127.0.0.1:9010',
+        help="replay: host:port the recording is served on",
+        )
+    parser.add_argument(
+        '--data', nargs='+',
+        help="backtest, sweep, benchmark: recorded market events (JSON lines or .rec "
+             "recordings). backtest runs them one after the other, sweep tests each one, "
+             "benchmark uses the book at the end of each",
+        )
+    parser.add_argument(
+        '--report',
+        help="backtest, sweep, benchmark: write the full report to this JSON file",
+        )
+    parser.add_argument(
+        '--record-dir', default='recordings',
+        help="record: directory of the recordings, one per pair",
+        )
+    parser.add_argument(
+        '--samples', type=int,
+        help="sweep: test this many random parameter sets instead of the whole grid",
+        )
+    parser.add_argument(
+        '--processes', type=int,
+        help="sweep: number of worker processes, all the cores by default",
+        )
+    parser.add_argument(
+        '--baseline',
+        help="benchmark: compare with the report of an earlier run, exit with 1 if a "
+             "case got slower",
+        )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help="benchmark: how much slower than the baseline a case may be",
+        )
+    parser.add_argument(
+        '--ticks', type=int,
+        help="simulate: scalp this many ticks against the simulator in this process "
+             "instead of serving it",
+        )
+    parser.add_argument(
+        '--log-level',
+        help="DEBUG, INFO, WARNING or ERROR (default from the log settings)",
+        )
+    parser.add_argument(
+        '--metrics-port', type=int,
+        help="serve the latency metrics on this port, 0 to turn it off "
+             "(default from the metrics settings)",
+        )
+    parser.add_argument(
+        '--ledger',
+        help="pnl: the fill ledger file (default from the ledger settings)",
+        )
+    return parser
+
+
+def make_trader(trader_class, config, pair, **kwargs):
+    """
+    trader of the pair settings.
+    """
+    return trader_class(config.api_key, config.api_secret, pair.coin, pair.currency,
+                        pair.dust_total, pair.dust_amount, pair.min_spread,
+                        pair.max_trading_amount, **kwargs)
+
+
+def write_report(report, path):
+    if path:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def run_pnl(config, args):
+    from .ledger import Ledger
+    from .satoshi import from_satoshi
+
+    ledger = Ledger(args.ledger or config.ledger.path or 'ledger.jsonl')
+    for pair in config.pairs:
+        pnl = ledger.pnl(pair.pair)
+        print('%s: position %s realized %s fills %d volume %s fees %s %s' % (
+            pair.pair, from_satoshi(pnl['position']), from_satoshi(pnl['realized']),
+            pnl['fills'], from_satoshi(pnl['volume']), from_satoshi(pnl['coin_fees']),
+            from_satoshi(pnl['currency_fees'])))
+
+
+def run_simulate(config, args):
+    from .simulator import make_simulator, run_load_test, serve_simulator
+
+    simulator = make_simulator([pair.pair for pair in config.pairs], config.simulator)
+    if not args.ticks:
+        serve_simulator(simulator, config.simulator.host, config.simulator.port)
+        return
+    from .trader import Trader
+
+    trader = make_trader(Trader, config, config.pair, polo=simulator)
+    trader.ladder_levels = config.pair.ladder_levels
+    report = run_load_test(trader, simulator, args.ticks)
+    for key in sorted(report):
+        print('%s: %s' % (key, report[key]))
+
+
+def run_record(config, args):
+    from .market_feed import make_feed
+    from .recording import record_feed
+
+    record_feed(make_feed(args.replay), [pair.pair for pair in config.pairs],
+                args.record_dir, block_records=config.record.block_records,
+                snapshot_interval=config.record.snapshot_interval)
+
+
+def run_backtest_action(config, args):
+    import itertools
+
+    from .backtest import BacktestExchange, run_backtest
+    from .market_feed import ReplayFeed
+    from .trader import Trader
+
+    backtest = config.backtest
+    exchange = BacktestExchange(config.pair.pair, backtest.currency_balance,
+                                backtest.coin_balance, backtest.maker_fee, backtest.taker_fee)
+    trader = make_trader(Trader, config, config.pair, polo=exchange)
+    events = itertools.chain(*[ReplayFeed(path).events() for path in args.data])
+    report = run_backtest(trader, exchange, events)
+    for key in sorted(report):
+        if key != 'inventory':
+            print('%s: %s' % (key, report[key]))
+    write_report(report, args.report)
+
+
+def run_sweep_action(config, args):
+    import dataclasses
+
+    from .config import ConfigError
+    from .sweep import grid, run_sweep, samples
+    from .trader import Trader
+
+    if not config.sweep:
+        raise ConfigError('sweep settings missing')
+    if args.samples:
+        param_sets = list(samples(config.sweep, args.samples))
+    else:
+        param_sets = list(grid(config.sweep))
+    pair = config.pair
+    defaults = {'dust_total': pair.dust_total, 'dust_amount': pair.dust_amount,
+                'min_spread': pair.min_spread, 'max_trading_amount': pair.max_trading_amount}
+    ranked = run_sweep(Trader, param_sets, args.data, pair.coin, pair.currency, defaults,
+                       dataclasses.asdict(config.backtest), args.processes)
+    for result in ranked[:20]:
+        print('pnl: %.8f fill rate: %.4f orders: %s %s' % (
+            result['pnl'], result['fill_rate'], result['orders_placed'],
+            json.dumps(result['params'], sort_keys=True)))
+    write_report(ranked, args.report)
+
+
+def run_replay(args):
+    from .market_feed import serve_replay
+
+    host, port = args.listen.rsplit(':', 1)
+    serve_replay(args.replay, host, int(port), args.replay_speed)
+
+
+def run_benchmark(args):
+    from .benchmark import compare, load_baseline, run_benchmarks, save_baseline
+    from .trader import Trader
+
+    results = run_benchmarks(Trader, args.data)
+    for key in sorted(results['results']):
+        result = results['results'][key]
+        print('%-60s %12.1f ops/s %s' % (
+            key, result['ops_per_second'],
+            ' '.join('%s=%s' % item for item in sorted(result.items())
+                     if item[0] != 'ops_per_second')))
+    if args.report:
+        save_baseline(results, args.report)
+    if args.baseline:
+        slower = compare(results, load_baseline(args.baseline), args.tolerance)
+        for key, old, new in slower:
+            print('SLOWER %s: %.1f -> %.1f ops/s (%+.0f%%)' % (
+                key, old, new, (new / old - 1) * 100))
+        if slower:
+            return 1
+        print('no regressions against %s' % args.baseline)
+    return 0
+
+
+def run_live(config, args):
+    from .event_log import setup_logging
+    from .ledger import FillIngester, make_ledger
+    from .metrics import InstrumentedClient, Metrics, serve_metrics
+    from .rate_limiter import RateLimitedClient, TokenBucket
+    from .risk import make_risk_gate
+    from .scheduler import make_scheduler
+    from .state import make_state_file
+    from .transport import PoloniexClient
+
+    config.require_api_keys()
+    setup_logging(args.log_level or config.log.level, config.log.path,
+                  config.log.sample_rate, config.log.queue_size)
+    metrics = Metrics(config.metrics.summary_interval)
+    metrics_port = args.metrics_port
+    if metrics_port is None:
+        metrics_port = config.metrics.port
+    if metrics_port:
+        serve_metrics(metrics, config.metrics.host, metrics_port)
+
+    # a url in the exchange settings (the simulator's) takes the place of poloniex
+    exchange = config.exchange
+    client = PoloniexClient(config.api_key, config.api_secret, exchange.url,
+                            exchange.pool_size, exchange.connect_timeout,
+                            exchange.read_timeout, exchange.retries, exchange.backoff)
+    polo = InstrumentedClient(client, metrics)
+    # the request budget the scheduler looks at, every call takes from it
+    limiter = TokenBucket(config.api_rate_limit)
+    limited_polo = RateLimitedClient(polo, limiter)
+    # one fill ledger and one risk gate for all the pairs
+    ledger = make_ledger(config.ledger)
+    risk = make_risk_gate(config.risk, config.pairs)
+
+    def setup(trader, pair, fills_polo):
+        trader.state_file = make_state_file(config.state, trader.my_pair)
+        trader.ladder_levels = pair.ladder_levels
+        trader.risk = risk
+        if ledger is not None:
+            trader.fills = FillIngester(fills_polo, ledger, trader.my_pair, config.ledger.since)
+        return trader
+
+    if args.action == 'portfolio':
+        from .portfolio import Portfolio
+        from .trader import Trader
+
+        traders = [setup(make_trader(Trader, config, pair, polo=limited_polo, metrics=metrics),
+                         pair, limited_polo)
+                   for pair in config.pairs]
+        shares = dict((pair.pair, pair.share) for pair in config.pairs)
+        Portfolio(traders, limited_polo, limiter, config.priority, shares,
+                  metrics=metrics).run()
+        return
+
+    if args.concurrent:
+        from .trader import ConcurrentTrader
+
+        trader = make_trader(ConcurrentTrader, config, config.pair, polo=polo,
+                             metrics=metrics, limiter=limiter)
+    else:
+        from .trader import Trader
+
+        trader = make_trader(Trader, config, config.pair, polo=limited_polo, metrics=metrics)
+    setup(trader, config.pair, limited_polo)
+    trader.scheduler = make_scheduler(config.schedule, limiter)
+
+    if args.action == 'scalp':
+        trader.run_scalping()
+    elif args.action == 'sell_all':
+        trader.run_sell_all()
+    elif args.action == 'buy_all':
+        trader.run_buy_all()
+    elif args.action == 'stream':
+        from .market_feed import make_feed
+
+        trader.run_streaming(make_feed(args.replay, args.replay_speed))
+
+
+def main(argv=None):
+    """
+    runs the action of the command line arguments, returns the exit status.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.concurrent and args.action not in ('scalp', 'sell_all', 'buy_all', 'stream'):
+        parser.error('--concurrent works with scalp, sell_all, buy_all and stream')
+    if args.action in ('backtest', 'sweep') and not args.data:
+        parser.error('%s needs --data' % args.action)
+    if args.action == 'benchmark':
+        return run_benchmark(args)
+    if args.action == 'replay':
+        if not args.replay:
+            parser.error('replay needs --replay')
+        return run_replay(args)
+    from .config import ConfigError, load_config
+
+    try:
+        config = load_config(args.settings)
+        if args.action in LIVE_ACTIONS:
+            return run_live(config, args)
+        return {'pnl': run_pnl, 'simulate': run_simulate, 'record': run_record,
+                'backtest': run_backtest_action,
+                'sweep': run_sweep_action}[args.action](config, args)
+    except ConfigError as e:
+        print('settings not valid: %s' % e)
+        print('create a file named %s and put them here like this:' % args.settings)
+        print('polo_api:')
+        print('  key: super_rich_acounts_api_key')
+        print('  secret: super_secret_top_secret')
+        print('(settings_example.yaml has all the settings)')
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+The settings.yaml read once and checked into frozen dataclasses, one per
+settings section. A missing key takes the default of its field, an unknown
+key or a value of the wrong type is a ConfigError naming the key. The
+sections are in settings_example.yaml.
+"""
+import dataclasses
+import typing
+from typing import Optional, Tuple
+
+
+class ConfigError(ValueError):
+    """
+    the settings are missing or wrong.
+    """
+
+
+@dataclasses.dataclass(frozen=True)
+class PairConfig:
+    """
+    one currency pair, with the top level values as the defaults.
+    """
+    coin: str
+    currency: str
+    dust_total: float
+    dust_amount: float
+    min_spread: float
+    max_trading_amount: float
+    ladder_levels: int = 1
+    share: float = 1.0
+    max_position: Optional[float] = None
+
+    @property
+    def pair(self):
+        return '%s_%s' % (self.currency, self.coin)
+
+
+@dataclasses.dataclass(frozen=True)
+class ExchangeConfig:
+    url: Optional[str] = None
+    pool_size: int = 4
+    connect_timeout: float = 3.05
+    read_timeout: float = 10.0
+    retries: int = 2
+    backoff: float = 0.1
+
+
+@dataclasses.dataclass(frozen=True)
+class LogConfig:
+    level: str = 'INFO'
+    path: Optional[str] = None
+    sample_rate: int = 1
+    queue_size: int = 10000
+
+
+@dataclasses.dataclass(frozen=True)
+class MetricsConfig:
+    host: str = '127.0.0.1'
+    port: int = 9108
+    summary_interval: float = 60
+
+
+@dataclasses.dataclass(frozen=True)
+class StateConfig:
+    path: Optional[str] = 'state_{pair}.json'
+    fsync: bool = False
+    max_age: float = 600
+
+
+@dataclasses.dataclass(frozen=True)
+class LedgerConfig:
+    path: Optional[str] = 'ledger.jsonl'
+    fsync: bool = False
+    since: Optional[float] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class ScheduleConfig:
+    enabled: bool = True
+    base_wait: float = 0.8
+    min_wait: float = 0.2
+    max_wait: float = 5.0
+    order_wait: Optional[float] = None
+    idle_after: float = 10.0
+    volatility_scale: float = 0.0005
+
+
+@dataclasses.dataclass(frozen=True)
+class RiskConfig:
+    enabled: bool = False
+    max_position: Optional[float] = None
+    max_exposure: Optional[float] = None
+    collar: Optional[float] = 0.05
+    max_order_rate: Optional[float] = None
+    max_loss: Optional[float] = None
+    kill_file: Optional[str] = None
+    kill_check_interval: float = 1.0
+
+
+@dataclasses.dataclass(frozen=True)
+class BacktestConfig:
+    currency_balance: float = 1.0
+    coin_balance: float = 0.0
+    maker_fee: float = 0.0015
+    taker_fee: float = 0.0025
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordConfig:
+    block_records: int = 65536
+    snapshot_interval: float = 60
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulatorConfig:
+    host: str = '127.0.0.1'
+    port: int = 9200
+    balances: dict = dataclasses.field(default_factory=dict)
+    maker_fee: float = 0.0015
+    taker_fee: float = 0.0025
+    latency: float = 0.0
+    jitter: float = 0.0
+    flow_steps: int = 1
+    rate_limit: Optional[float] = None
+    # the keyword arguments of RandomFlow, or script and loop
+    flow: dict = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass(frozen=True)
+class Config:
+    """
+    all the settings. pair is the coin section, pairs the pairs of the
+    portfolio (just pair when there is no pairs section).
+    """
+    pair: PairConfig
+    pairs: Tuple[PairConfig, ...]
+    api_key: Optional[str] = None
+    api_secret: Optional[str] = None
+    api_rate_limit: float = 6
+    priority: str = 'spread'
+    exchange: ExchangeConfig = dataclasses.field(default_factory=ExchangeConfig)
+    log: LogConfig = dataclasses.field(default_factory=LogConfig)
+    metrics: MetricsConfig = dataclasses.field(default_factory=MetricsConfig)
+    state: StateConfig = dataclasses.field(default_factory=StateConfig)
+    ledger: LedgerConfig = dataclasses.field(default_factory=LedgerConfig)
+    schedule: ScheduleConfig = dataclasses.field(default_factory=ScheduleConfig)
+    risk: RiskConfig = dataclasses.field(default_factory=RiskConfig)
+    backtest: BacktestConfig = dataclasses.field(default_factory=BacktestConfig)
+    record: RecordConfig = dataclasses.field(default_factory=RecordConfig)
+    simulator: SimulatorConfig = dataclasses.field(default_factory=SimulatorConfig)
+    # the axes of the sweep action, a list or {min: x, max: y} per parameter
+    sweep: dict = dataclasses.field(default_factory=dict)
+
+    def require_api_keys(self):
+        if not (self.api_key and self.api_secret):
+            raise ConfigError('api keys missing')
+
+
+PAIR_KEYS = ('dust_total', 'dust_amount', 'min_spread', 'max_trading_amount',
+             'ladder_levels')
+
+SECTIONS = {'exchange': ExchangeConfig, 'log': LogConfig, 'metrics': MetricsConfig,
+            'state': StateConfig, 'ledger': LedgerConfig, 'schedule': ScheduleConfig,
+            'risk': RiskConfig, 'backtest': BacktestConfig, 'record': RecordConfig,
+            'simulator': SimulatorConfig}
+
+
+def check_value(name, kind, value):
+    """
+    value if it is of the kind of a field, ints are taken for floats.
+    """
+    if typing.get_origin(kind) is typing.Union:
+        if value is None:
+            return None
+        kind = [arg for arg in typing.get_args(kind) if arg is not type(None)][0]
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if kind is int and isinstance(value, bool) or not isinstance(value, kind):
+        raise ConfigError('%s should be %s, not %r' % (name, kind.__name__, value))
+    return value
+
+
+def make_section(cls, name, values, extra=None):
+    """
+    cls from a mapping of the settings, extra are values from elsewhere.
+    """
+    if values is None:
+        values = {}
+    if not isinstance(values, dict):
+        raise ConfigError('%s should be a mapping, not %r' % (name, values))
+    kinds = dict((field.name, field.type) for field in dataclasses.fields(cls))
+    unknown = sorted(set(values) - set(kinds))
+    if unknown:
+        raise ConfigError('unknown settings in %s: %s' % (name, ', '.join(unknown)))
+    arguments = dict(extra or {})
+    for key, value in values.items():
+        arguments[key] = check_value('%s.%s' % (name, key), kinds[key], value)
+    try:
+        return cls(**arguments)
+    except TypeError:
+        missing = [field.name for field in dataclasses.fields(cls)
+                   if field.name not in arguments
+                   and field.default is dataclasses.MISSING
+                   and field.default_factory is dataclasses.MISSING]
+        raise ConfigError('%s misses %s' % (name, ', '.join(missing)))
+
+
+def make_pair(name, values, defaults):
+    """
+    pair from a coin or pairs entry, my_coin is the coin.
+    """
+    if not isinstance(values, dict):
+        raise ConfigError('%s should be a mapping, not %r' % (name, values))
+    values = dict(values)
+    if 'my_coin' not in values and 'coin' not in values:
+        raise ConfigError('%s misses my_coin' % name)
+    if 'my_coin' in values:
+        values['coin'] = values.pop('my_coin')
+    return make_section(PairConfig, name, values, defaults)
+
+
+def make_config(settings):
+    """
+    Config from the parsed settings.yaml.
+    """
+    if not isinstance(settings, dict):
+        raise ConfigError('settings should be a mapping')
+    settings = dict(settings)
+    known = set(SECTIONS) | set(PAIR_KEYS) | set(['polo_api', 'coin', 'pairs',
+                                                  'api_rate_limit', 'priority', 'sweep'])
+    unknown = sorted(set(settings) - known)
+    if unknown:
+        raise ConfigError('unknown settings: %s' % ', '.join(unknown))
+
+    defaults = dict((key, settings[key]) for key in PAIR_KEYS if key in settings)
+    for key, value in defaults.items():
+        defaults[key] = check_value(key, PairConfig.__annotations__[key], value)
+    pair = make_pair('coin', settings.get('coin'), defaults)
+    pairs = tuple(make_pair('pairs[%d]' % index, values, defaults)
+                  for index, values in enumerate(settings.get('pairs') or []))
+
+    api = settings.get('polo_api') or {}
+    if not isinstance(api, dict):
+        raise ConfigError('polo_api should be a mapping')
+    arguments = {'pair': pair, 'pairs': pairs or (pair,),
+                 'api_key': api.get('key'), 'api_secret': api.get('secret'),
+                 'sweep': check_value('sweep', dict, settings.get('sweep') or {})}
+    for key in ('api_rate_limit', 'priority'):
+        if key in settings:
+            arguments[key] = check_value(key, Config.__annotations__[key], settings[key])
+    if arguments.get('priority', 'spread') not in ('spread', 'volatility'):
+        raise ConfigError('priority should be spread or volatility')
+    for name, cls in SECTIONS.items():
+        arguments[name] = make_section(cls, name, settings.get(name))
+    return Config(**arguments)
+
+
+def load_config(path='settings.yaml'):
+    """
+    Config from a settings file. Raises ConfigError when it is missing or
+    wrong.
+    """
+    import yaml
+
+    try:
+        with open(path) as f:
+            settings = yaml.safe_load(f)
+    except (IOError, OSError):
+        raise ConfigError('%s not found' % path) from None
+    except yaml.YAMLError as e:
+        raise ConfigError('%s is not valid yaml: %s' % (path, e))
+    return make_config(settings)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Structured event log of the trader.
+
+Every record is one JSON line: ts, level, event and the fields given with
+extra=fields(...). The trading loop only puts the records on a queue, a
+background thread formats and writes them, so a slow stdout (a docker log
+driver) doesn't hold up a tick. When the queue is full the records are dropped
+and counted instead of waiting.
+
+The debug events (every kept order, every book resync) are off by default.
+With debug on, sample_rate keeps one of every sample_rate of them.
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+log = logging.getLogger('trader')
+# nothing is written until setup_logging is called (backtest, sweep)
+log.addHandler(logging.NullHandler())
+
+
+def fields(**kwargs):
+    """
+    extra for a log call: log.info('order placed', extra=fields(price=...)).
+    """
+    return {'fields': kwargs}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat().replace('+00:00', 'Z'),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+        }
+        extra = getattr(record, 'fields', None)
+        if extra:
+            entry.update(extra)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, sort_keys=True, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """
+    passes one of every `rate` debug records, and all the others.
+    """
+    def __init__(self, rate=1):
+        logging.Filter.__init__(self)
+        self.rate = max(int(rate), 1)
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        self.seen += 1
+        return self.seen % self.rate == 1
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    puts the records on a bounded queue without waiting, a full queue drops
+    them. The message is rendered here since its arguments may change after
+    the call, the exception is kept apart for the exc field and the JSON is
+    made by the writer.
+    """
+    def __init__(self, records):
+        logging.handlers.QueueHandler.__init__(self, records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(logging.handlers.QueueListener):
+    """
+    background thread that hands the queued records to the target handler,
+    with a warning of how many were dropped since the last one.
+    """
+    def __init__(self, records, target, queue_handler):
+        logging.handlers.QueueListener.__init__(self, records, target)
+        self.target = target
+        self.queue_handler = queue_handler
+        self.reported = 0
+
+    def handle(self, record):
+        dropped = self.queue_handler.dropped
+        if dropped != self.reported:
+            self.target.handle(logging.makeLogRecord({
+                'name': log.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'log records dropped', 'created': record.created,
+                'fields': {'dropped': dropped - self.reported}}))
+            self.reported = dropped
+        self.target.handle(record)
+
+    def enqueue_sentinel(self):
+        # waits for room, the records before it are still written
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        """
+        writes what is left on the queue and stops the thread.
+        """
+        if self._thread is None:
+            return
+        logging.handlers.QueueListener.stop(self)
+        self.target.flush()
+
+
+def setup_logging(level='INFO', path=None, sample_rate=1, queue_size=10000):
+    """
+    sends the trader log to stdout, or to the file at path, as JSON lines
+    through the background writer. Returns the writer, it is stopped at exit.
+    """
+    if path:
+        target = logging.FileHandler(path)
+    else:
+        target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter())
+
+    records = queue.Queue(queue_size)
+    handler = DroppingQueueHandler(records)
+    handler.addFilter(SampleFilter(sample_rate))
+    log.addHandler(handler)
+    log.setLevel(getattr(logging, str(level).upper()))
+    log.propagate = False
+
+    writer = LogWriter(records, target, handler)
+    writer.start()
+    atexit.register(writer.stop)
+    return writer
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Fill ledger with running position and PnL per pair.
+
+FillIngester fetches my trades of a pair with returnTradeHistory, only the
+ones newer than the cursor (the time of the last trade in the ledger), and
+appends them to the Ledger. The ledger is a JSON lines file that is only ever
+appended to, one fill per line. Every fill also updates the running
+aggregates of its pair (position, cost of the position, realized PnL, fees,
+volumes), so a PnL query doesn't look at the fills again. At start the file
+is read once to rebuild the aggregates and the cursors.
+
+The cost of the position is the average cost: a buy adds what it cost to it,
+a sell takes out the average cost of what it sold and the difference with
+what it got is realized. Going short works the same way the other round.
+The fees are in the amounts: a buy adds what was bought minus the fee (paid
+in the coin), a sell gets the total minus the fee (paid in the currency).
+
+Money is in satoshis, fills and aggregates alike.
+"""
+import calendar
+import json
+import numbers
+import os
+import threading
+import time
+
+from .satoshi import div_round, from_satoshi, mul_satoshi, to_satoshi
+
+
+def parse_date(text):
+    """
+    unix time of a poloniex date, '2017-05-03 01:29:55' in UTC.
+    """
+    return calendar.timegm(time.strptime(text, '%Y-%m-%d %H:%M:%S'))
+
+
+def parse_trade(pair, trade):
+    """
+    fill of a returnTradeHistory trade.
+    """
+    price = to_satoshi(trade['rate'])
+    amount = to_satoshi(trade['amount'])
+    total = to_satoshi(trade['total'])
+    fee_rate = to_satoshi(trade.get('fee') or 0)
+    if trade['type'] == 'buy':
+        # paid in the coin
+        fee = mul_satoshi(amount, fee_rate)
+    else:
+        # paid in the currency
+        fee = mul_satoshi(total, fee_rate)
+    return {'pair': pair, 'id': str(trade.get('globalTradeID') or trade['tradeID']),
+            'order_number': str(trade.get('orderNumber', '')), 'ts': parse_date(trade['date']),
+            'type': trade['type'], 'price': price, 'amount': amount, 'total': total,
+            'fee': fee}
+
+
+class Position(object):
+    """
+    running aggregates of the fills of one pair.
+    """
+    def __init__(self, pair):
+        self.pair = pair
+        # coin held, negative when short
+        self.position = 0
+        # currency the position cost, negative when short
+        self.cost = 0
+        self.realized = 0
+        # fees in the coin (buys) and in the currency (sells)
+        self.coin_fees = 0
+        self.currency_fees = 0
+        self.bought = 0
+        self.sold = 0
+        self.volume = 0
+        self.fills = 0
+        self.last_ts = None
+
+    def add(self, fill):
+        if fill['type'] == 'buy':
+            change = fill['amount'] - fill['fee']
+            cash = -fill['total']
+            self.bought += fill['amount']
+            self.coin_fees += fill['fee']
+        else:
+            change = -fill['amount']
+            cash = fill['total'] - fill['fee']
+            self.sold += fill['amount']
+            self.currency_fees += fill['fee']
+        self.volume += fill['total']
+        self.fills += 1
+        self.last_ts = fill['ts']
+
+        if self.position == 0 or (self.position > 0) == (change > 0):
+            # opens or adds to the position
+            self.position += change
+            self.cost -= cash
+            return
+        # closes some of it, and opens the other way with the rest
+        closed = min(abs(change), abs(self.position))
+        closed_cost = div_round(self.cost * closed, abs(self.position))
+        closed_cash = div_round(cash * closed, abs(change))
+        # closed_cost has the sign of the position, what a short cost is
+        # minus what it got
+        self.realized += closed_cash - closed_cost
+        self.cost -= closed_cost
+        self.position += change
+        if abs(change) > closed:
+            self.cost = -(cash - closed_cash)
+
+    def average_price(self):
+        if not self.position:
+            return None
+        return div_round(abs(self.cost) * 100000000, abs(self.position))
+
+    def pnl(self, mark_price=None):
+        """
+        the aggregates, with the unrealized PnL at mark_price if given.
+        """
+        result = {'pair': self.pair, 'position': self.position, 'cost': self.cost,
+                  'average_price': self.average_price(), 'realized': self.realized,
+                  'coin_fees': self.coin_fees, 'currency_fees': self.currency_fees,
+                  'bought': self.bought, 'sold': self.sold, 'volume': self.volume,
+                  'fills': self.fills, 'last_ts': self.last_ts}
+        if mark_price is not None:
+            result['unrealized'] = mul_satoshi(self.position, mark_price) - self.cost
+            result['total'] = self.realized + result['unrealized']
+        return result
+
+
+class Ledger(object):
+    """
+    the fills of all the pairs, in a JSON lines file if path is given. With
+    fsync every append is on the disk before it returns.
+    """
+    def __init__(self, path=None, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.positions = {}
+        # pair -> (time of the last fill, ids of the fills at that time)
+        self.cursors = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        good = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('no end of line')
+                    fill = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                self.apply(fill)
+                good += len(line)
+        if good < os.path.getsize(self.path):
+            # a line cut short by a crash, the next appends go after the good ones
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
+
+    def apply(self, fill):
+        pair = fill['pair']
+        position = self.positions.get(pair)
+        if position is None:
+            position = self.positions[pair] = Position(pair)
+        position.add(fill)
+        ts, ids = self.cursors.get(pair, (None, None))
+        if ts != fill['ts']:
+            self.cursors[pair] = (fill['ts'], set([fill['id']]))
+        else:
+            ids.add(fill['id'])
+
+    def is_new(self, fill):
+        ts, ids = self.cursors.get(fill['pair'], (None, ()))
+        if ts is None:
+            return True
+        return fill['ts'] > ts or (fill['ts'] == ts and fill['id'] not in ids)
+
+    def append(self, fills):
+        """
+        adds the fills that are not in the ledger yet, oldest first. Returns
+        the ones added.
+        """
+        with self.lock:
+            added = []
+            for fill in sorted(fills, key=lambda fill: (fill['ts'], fill['id'])):
+                if self.is_new(fill):
+                    self.apply(fill)
+                    added.append(fill)
+            if added and self.path:
+                with open(self.path, 'a') as f:
+                    for fill in added:
+                        f.write(json.dumps(fill, sort_keys=True) + '\n')
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            return added
+
+    def cursor(self, pair):
+        """
+        time of the last fill of the pair, None if it has none.
+        """
+        return self.cursors.get(pair, (None, None))[0]
+
+    def position(self, pair):
+        position = self.positions.get(pair)
+        if position is None:
+            position = Position(pair)
+        return position
+
+    def pnl(self, pair, mark_price=None):
+        return self.position(pair).pnl(mark_price)
+
+
+class FillIngester(object):
+    """
+    brings the fills of a pair from the exchange into the ledger. Without
+    cursor the trades since since (unix time) are fetched, by default the
+    ones from when the ingester was made.
+    """
+    def __init__(self, polo, ledger, pair, since=None, limit=1000):
+        self.polo = polo
+        self.ledger = ledger
+        self.pair = pair
+        self.since = since
+        if self.since is None:
+            self.since = int(time.time())
+        self.limit = limit
+
+    def fetch(self, start, end):
+        """
+        the trades of the pair from start to end, both in. The exchange gives
+        the newest limit ones, so full pages are followed by the older ones.
+        """
+        trades = []
+        while True:
+            page = self.polo.returnTradeHistory(currencyPair=self.pair, start=start,
+                                                end=end, limit=self.limit)
+            if isinstance(page, dict):
+                page = page.get(self.pair, [])
+            trades.extend(page)
+            if len(page) < self.limit:
+                return trades
+            oldest = min(parse_date(trade['date']) for trade in page)
+            if oldest < start:
+                return trades
+            if oldest >= end:
+                # a full page of one second, the exchange can't page inside it
+                end = oldest - 1
+            else:
+                # the trades of that second again, the ledger drops the ones it has
+                end = oldest
+
+    def ingest(self):
+        """
+        fetches the new trades and appends them. Returns the new fills.
+        """
+        start = self.ledger.cursor(self.pair)
+        if start is None:
+            start = self.since
+        fills = [parse_trade(self.pair, trade)
+                 for trade in self.fetch(start, int(time.time()) + 1)]
+        return self.ledger.append(fills)
+
+
+def pnl_fields(pnl):
+    """
+    the PnL as coin strings for a log event.
+    """
+    return dict((key, from_satoshi(value) if isinstance(value, numbers.Integral) and
+                 key not in ('fills', 'last_ts') else value)
+                for key, value in pnl.items())
+
+
+def make_ledger(options):
+    """
+    ledger from the ledger settings, None if there is no path.
+    """
+    if not options.path:
+        return None
+    return Ledger(options.path, options.fsync)
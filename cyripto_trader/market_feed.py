@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Push market data feeds.
+
+A feed yields market events as dicts. Every event has 'type' and 'pair' and
+most have 'seq', the exchange sequence number:
+
+    {'type': 'snapshot', 'pair': 'BTC_ZEC', 'seq': 10,
+     'bids': [['0.01000000', 1.5], ...], 'asks': [...]}
+    {'type': 'update', 'pair': 'BTC_ZEC', 'seq': 11,
+     'changes': [['sell', '0.01020000', '0.00000000'], ...]}
+    {'type': 'trade', 'pair': 'BTC_ZEC', 'seq': 11, 'trade_type': 'buy',
+     'price': '0.01020000', 'amount': '2.0', 'ts': 1500000000.0}
+
+An update with a zero amount removes the price level. The replay feeds read the
+same events as JSON lines from a file or a socket, so the streaming mode can be
+run with no network. recording has a compact binary format for the same events.
+"""
+import json
+import socket
+import time
+
+
+class MarketFeed(object):
+    """
+    Base class of the feeds.
+    """
+    def subscribe(self, pair):
+        raise NotImplementedError
+
+    def events(self):
+        """
+        generator of the market events. Ends when the feed is closed.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def paced(events, speed):
+    """
+    sleeps between the events following their 'ts' so a recording replays in
+    real time (speed=1.0), faster or slower. speed 0 replays with no waiting.
+    """
+    started = None
+    first_ts = None
+    for event in events:
+        if speed and 'ts' in event:
+            if started is None:
+                started = time.time()
+                first_ts = event['ts']
+            wait = (event['ts'] - first_ts) / speed - (time.time() - started)
+            if wait > 0:
+                time.sleep(wait)
+        yield event
+
+
+class ReplayFeed(MarketFeed):
+    """
+    Replays market events from a JSON lines file or a recording (.rec, see
+    recording).
+    """
+    def __init__(self, path, speed=0):
+        self.path = path
+        self.speed = speed
+        self.pairs = set()
+        self.closed = False
+
+    def subscribe(self, pair):
+        self.pairs.add(pair)
+
+    def lines(self):
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def read(self):
+        if self.path.endswith('.rec'):
+            from .recording import read_recording
+            source = read_recording(self.path)
+        else:
+            source = self.lines()
+        for event in source:
+            if self.closed:
+                return
+            if not self.pairs or event.get('pair') in self.pairs:
+                yield event
+
+    def events(self):
+        return paced(self.read(), self.speed)
+
+    def close(self):
+        self.closed = True
+
+
+class SocketReplayFeed(MarketFeed):
+    """
+    Reads market events as JSON lines from a TCP socket, e.g. from
+    serve_replay running on another box.
+    """
+    def __init__(self, host, port, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pairs = set()
+        self.sock = None
+
+    def subscribe(self, pair):
+        self.pairs.add(pair)
+
+    def events(self):
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        f = self.sock.makefile('r')
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if not self.pairs or event.get('pair') in self.pairs:
+                    yield event
+        finally:
+            f.close()
+            self.close()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def serve_replay(path, host='127.0.0.1', port=9010, speed=0):
+    """
+    streams a recorded JSON lines file to each client that connects.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                for event in ReplayFeed(path, speed).events():
+                    conn.sendall((json.dumps(event) + '\n').encode('utf-8'))
+            except socket.error:
+                pass
+            finally:
+                conn.close()
+    finally:
+        server.close()
+
+
+class PoloniexPushFeed(MarketFeed):
+    """
+    Order book and trade updates from the poloniex websocket api. Needs the
+    websocket-client package.
+    """
+    url = 'wss://api2.poloniex.com'
+
+    def __init__(self, url=None, timeout=30):
+        if url:
+            self.url = url
+        self.timeout = timeout
+        self.pairs = set()
+        self.ws = None
+        # channel id -> currency pair, learned from the initial book message
+        self.channels = {}
+
+    def subscribe(self, pair):
+        self.pairs.add(pair)
+        if self.ws is not None:
+            self.ws.send(json.dumps({'command': 'subscribe', 'channel': pair}))
+
+    def connect(self):
+        import websocket
+        self.ws = websocket.create_connection(self.url, timeout=self.timeout)
+        for pair in self.pairs:
+            self.ws.send(json.dumps({'command': 'subscribe', 'channel': pair}))
+
+    def events(self):
+        if self.ws is None:
+            self.connect()
+        while self.ws is not None:
+            message = json.loads(self.ws.recv())
+            # heartbeats and acks have no payload
+            if len(message) < 3:
+                continue
+            for event in self.parse(message):
+                yield event
+
+    def parse(self, message):
+        channel, seq, items = message[0], message[1], message[2]
+        snapshots = []
+        changes = []
+        trades = []
+        for item in items:
+            if item[0] == 'i':
+                pair = item[1]['currencyPair']
+                self.channels[channel] = pair
+                asks, bids = item[1]['orderBook']
+                snapshots.append({
+                    'type': 'snapshot', 'pair': pair, 'seq': seq,
+                    'bids': sorted(bids.items(), key=lambda level: float(level[0]), reverse=True),
+                    'asks': sorted(asks.items(), key=lambda level: float(level[0])),
+                })
+            elif item[0] == 'o':
+                order_type = 'buy' if item[1] == 1 else 'sell'
+                changes.append([order_type, item[2], item[3]])
+            elif item[0] == 't':
+                trades.append({
+                    'type': 'trade', 'pair': self.channels.get(channel), 'seq': seq,
+                    'trade_type': 'buy' if item[2] == 1 else 'sell',
+                    'price': item[3], 'amount': item[4], 'ts': float(item[5]),
+                })
+        events = snapshots
+        if changes:
+            events.append({'type': 'update', 'pair': self.channels.get(channel),
+                           'seq': seq, 'changes': changes})
+        # book changes come before the trades of the same message
+        return events + trades
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+
+def make_feed(source=None, speed=0):
+    """
+    feed for a --replay argument: a file path, tcp://host:port, or None for
+    the live poloniex feed.
+    """
+    if not source:
+        return PoloniexPushFeed()
+    if source.startswith('tcp://'):
+        host, port = source[len('tcp://'):].rsplit(':', 1)
+        return SocketReplayFeed(host, int(port))
+    return ReplayFeed(source, speed)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Latency and api call metrics of the trading loop.
+
+The stages of a tick are timed into fixed bucket histograms, the api calls are
+counted and timed per method, and the time from the start of a tick to an
+order going out is kept as well. Recording is a bisect and a few additions
+under a lock, so it stays on in production.
+
+The metrics are served in the Prometheus text format by serve_metrics and
+summed up in one line by Metrics.summary.
+"""
+import bisect
+import functools
+import threading
+import time
+
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        upper bound of the bucket the q quantile is in.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                return self.max
+        return self.max
+
+
+class Metrics(object):
+    """
+    Metrics of one or more traders. Safe to share between threads.
+    """
+    def __init__(self, summary_interval=60):
+        self.lock = threading.Lock()
+        # stage -> Histogram
+        self.stages = {}
+        # api method -> Histogram, count of errors
+        self.calls = {}
+        self.errors = {}
+        self.tick_to_order = Histogram()
+        self.started = time.time()
+        self.summary_interval = summary_interval
+        self.last_summary = self.started
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_call(self, method, seconds, error=False):
+        with self.lock:
+            histogram = self.calls.get(method)
+            if histogram is None:
+                histogram = self.calls[method] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                self.errors[method] = self.errors.get(method, 0) + 1
+
+    def observe_order(self, seconds):
+        with self.lock:
+            self.tick_to_order.observe(seconds)
+
+    def render(self):
+        """
+        the metrics in the Prometheus text format.
+        """
+        lines = []
+        with self.lock:
+            lines.append('# TYPE trader_stage_seconds histogram')
+            for stage in sorted(self.stages):
+                self._render_histogram(lines, 'trader_stage_seconds', 'stage="%s"' % stage,
+                                       self.stages[stage])
+            lines.append('# TYPE trader_api_call_seconds histogram')
+            for method in sorted(self.calls):
+                self._render_histogram(lines, 'trader_api_call_seconds',
+                                       'method="%s"' % method, self.calls[method])
+            lines.append('# TYPE trader_api_errors_total counter')
+            for method in sorted(self.errors):
+                lines.append('trader_api_errors_total{method="%s"} %d' % (method,
+                                                                         self.errors[method]))
+            lines.append('# TYPE trader_tick_to_order_seconds histogram')
+            self._render_histogram(lines, 'trader_tick_to_order_seconds', '',
+                                   self.tick_to_order)
+        lines.append('# TYPE trader_uptime_seconds gauge')
+        lines.append('trader_uptime_seconds %.3f' % (time.time() - self.started))
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, lines, name, labels, histogram):
+        prefix = labels + ',' if labels else ''
+        seen = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            seen += count
+            lines.append('%s_bucket{%sle="%s"} %d' % (name, prefix, bound, seen))
+        lines.append('%s_bucket{%sle="+Inf"} %d' % (name, prefix, histogram.count))
+        labels = '{%s}' % labels if labels else ''
+        lines.append('%s_sum%s %.6f' % (name, labels, histogram.sum))
+        lines.append('%s_count%s %d' % (name, labels, histogram.count))
+
+    def summary(self):
+        """
+        one line: api calls and errors, p50/p99 of the stages in milliseconds.
+        """
+        with self.lock:
+            calls = sum(histogram.count for histogram in self.calls.values())
+            errors = sum(self.errors.values())
+            parts = ['uptime=%ds' % (time.time() - self.started),
+                     'api_calls=%d' % calls, 'api_errors=%d' % errors]
+            for stage in sorted(self.stages):
+                histogram = self.stages[stage]
+                parts.append('%s=%.1f/%.1fms' % (stage, histogram.quantile(0.5) * 1000,
+                                                 histogram.quantile(0.99) * 1000))
+            if self.tick_to_order.count:
+                parts.append('tick_to_order=%.1f/%.1fms' % (
+                    self.tick_to_order.quantile(0.5) * 1000,
+                    self.tick_to_order.quantile(0.99) * 1000))
+        return ' '.join(parts)
+
+    def due_summary(self):
+        """
+        the summary line if summary_interval passed since the last one, else None.
+        """
+        now = time.time()
+        if not self.summary_interval or now - self.last_summary < self.summary_interval:
+            return None
+        self.last_summary = now
+        return self.summary()
+
+
+def timed(stage):
+    """
+    method decorator, observes the time of the method as the stage in
+    self.metrics. Does nothing when self.metrics is None.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def timed_method(self, *args, **kwargs):
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+            started = time.time()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.observe(stage, time.time() - started)
+        return timed_method
+    return decorate
+
+
+class InstrumentedClient(object):
+    """
+    Wraps an api client to time and count every call and its errors.
+    """
+    def __init__(self, client, metrics):
+        self.client = client
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        def instrumented(*args, **kwargs):
+            started = time.time()
+            error = True
+            try:
+                retval = method(*args, **kwargs)
+                error = False
+                return retval
+            finally:
+                self.metrics.observe_call(name, time.time() - started, error)
+        return instrumented
+
+
+def serve_metrics(metrics, host='127.0.0.1', port=9108):
+    """
+    serves the metrics at http://host:port/metrics from a daemon thread.
+    Returns the server.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
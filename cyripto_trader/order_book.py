@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent order book.
+
+The book is synced once from a full snapshot and then kept current with
+incremental level updates (insert/modify/remove a price level), keyed by the
+exchange sequence number. A new snapshot is only needed for the first sync and
+when a gap in the sequence numbers is detected.
+
+Each side is stored as parallel integer arrays (satoshis), one entry per price
+level, so deep books stay small and the dust threshold search is a bisect.
+"""
+import array
+import bisect
+
+from .satoshi import mul_satoshi, to_satoshi
+
+
+INT64 = 'q'
+
+
+class BookSide(object):
+    """
+    One side of the order book. Bids ('buy') are kept in descending, asks
+    ('sell') in ascending price order.
+
+    Columns, index i is the i'th level from the top of the book:
+        prices, amounts, notional (price * amount) and own (1 if I have an
+        order at that price).
+    Running columns, computed lazily up to the first level that changed:
+        totals (cumulative notional), free_totals (cumulative notional of the
+        levels without my orders) and free_max (largest amount so far on the
+        levels without my orders).
+    """
+    def __init__(self, order_type):
+        self.order_type = order_type
+        self.prices = array.array(INT64)
+        self.amounts = array.array(INT64)
+        self.notional = array.array(INT64)
+        self.own = array.array('b')
+        # sorted keys for bisect. asks sort by the price itself, bids by -price.
+        if order_type == 'buy':
+            self.keys = array.array(INT64)
+        else:
+            self.keys = self.prices
+        self.totals = array.array(INT64)
+        self.free_totals = array.array(INT64)
+        self.free_max = array.array(INT64)
+        # price -> my order number at that price
+        self.owned = {}
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __iter__(self):
+        for index in range(len(self.prices)):
+            yield self.level(index)
+
+    def _key(self, price):
+        if self.order_type == 'buy':
+            return -price
+        return price
+
+    def _mark_stale(self, index):
+        # running columns are good up to index
+        if index < len(self.totals):
+            del self.totals[index:]
+            del self.free_totals[index:]
+            del self.free_max[index:]
+
+    def clear(self):
+        self._mark_stale(0)
+        for column in (self.prices, self.amounts, self.notional, self.own):
+            del column[:]
+        if self.keys is not self.prices:
+            del self.keys[:]
+
+    def index(self, price):
+        """
+        index of the level at price or None.
+        """
+        key = self._key(price)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def level(self, index):
+        """
+        the level as a dict, for printing and debugging.
+        """
+        self.extend_running(index + 1)
+        price = self.prices[index]
+        return {'type': self.order_type, 'price': price, 'amount': self.amounts[index],
+                'cur': self.notional[index], 'total': self.totals[index],
+                'order_number': self.owned.get(price)}
+
+    def set_level(self, price, amount):
+        """
+        inserts, modifies or removes (amount is zero) the level at price.
+        price and amount are in satoshis.
+        """
+        key = self._key(price)
+        index = bisect.bisect_left(self.keys, key)
+        exists = index < len(self.keys) and self.keys[index] == key
+
+        if amount <= 0:
+            if exists:
+                del self.prices[index]
+                del self.amounts[index]
+                del self.notional[index]
+                del self.own[index]
+                if self.keys is not self.prices:
+                    del self.keys[index]
+                self._mark_stale(index)
+            return
+
+        if exists:
+            if self.amounts[index] == amount:
+                return
+            self.amounts[index] = amount
+            self.notional[index] = mul_satoshi(price, amount)
+        else:
+            self.prices.insert(index, price)
+            self.amounts.insert(index, amount)
+            self.notional.insert(index, mul_satoshi(price, amount))
+            self.own.insert(index, 1 if price in self.owned else 0)
+            if self.keys is not self.prices:
+                self.keys.insert(index, key)
+        self._mark_stale(index)
+
+    def sync(self, order_book_raw):
+        """
+        brings the side in line with a snapshot of [price, amount] pairs.
+        only the levels that differ from the snapshot are changed.
+        """
+        if not self.prices:
+            for item in order_book_raw:
+                self.set_level(to_satoshi(item[0]), to_satoshi(item[1]))
+            return
+
+        snapshot = {}
+        for item in order_book_raw:
+            snapshot[to_satoshi(item[0])] = to_satoshi(item[1])
+        for price in [p for p in self.prices if p not in snapshot]:
+            self.set_level(price, 0)
+        for price, amount in snapshot.items():
+            self.set_level(price, amount)
+
+    def set_owned(self, owned):
+        """
+        marks the levels that have my orders. owned maps price -> order number.
+        """
+        for price in self.owned:
+            if price not in owned:
+                index = self.index(price)
+                if index is not None:
+                    self.own[index] = 0
+                    self._mark_stale(index)
+        for price in owned:
+            if price not in self.owned:
+                index = self.index(price)
+                if index is not None:
+                    self.own[index] = 1
+                    self._mark_stale(index)
+        self.owned = owned
+
+    def extend_running(self, upto, min_amount=None, min_total=None):
+        """
+        computes the running columns up to index upto. Stops early at the first
+        level without my orders that has min_amount, or where free_totals
+        reaches min_total, and returns its index.
+        """
+        index = len(self.totals)
+        upto = min(upto, len(self.prices))
+        if index > 0:
+            total = self.totals[index - 1]
+            free_total = self.free_totals[index - 1]
+            free_max = self.free_max[index - 1]
+        else:
+            total = free_total = free_max = 0
+        while index < upto:
+            notional = self.notional[index]
+            amount = self.amounts[index]
+            total += notional
+            mine = self.own[index]
+            if not mine:
+                free_total += notional
+                if amount > free_max:
+                    free_max = amount
+            self.totals.append(total)
+            self.free_totals.append(free_total)
+            self.free_max.append(free_max)
+            if not mine and ((min_amount is not None and amount >= min_amount) or
+                             (min_total is not None and free_total >= min_total)):
+                return index
+            index += 1
+        return None
+
+    def find_dust_level(self, dust_amount, dust_total):
+        """
+        index of the first level without my orders that has at least
+        dust_amount, or where the notional of the levels without my orders
+        adds up to dust_total. None if there is no such level.
+        """
+        found = len(self.totals)
+        by_amount = bisect.bisect_left(self.free_max, dust_amount)
+        by_total = bisect.bisect_left(self.free_totals, dust_total)
+        index = min(by_amount, by_total)
+        # only if a threshold is zero or less the search can land on my level
+        while index < found and self.own[index]:
+            index += 1
+        if index < found:
+            return index
+        # not in the computed part, go on from there
+        return self.extend_running(len(self.prices), dust_amount, dust_total)
+
+    def top(self):
+        if self.prices:
+            return self.prices[0]
+        return None
+
+
+class OrderBook(object):
+    """
+    Order book of a single currency pair.
+    """
+    def __init__(self):
+        self.sides = {}
+        self.sides['buy'] = BookSide('buy')
+        self.sides['sell'] = BookSide('sell')
+        # last applied sequence number, None when the exchange doesn't send it.
+        self.seq = None
+        self.synced = False
+
+    def apply_snapshot(self, bids, asks, seq=None):
+        """
+        syncs the book with a full snapshot. Returns False if the snapshot has
+        the same sequence number as the book, so nothing needed to change.
+        """
+        if self.synced and seq is not None and seq == self.seq:
+            return False
+        self.sides['buy'].sync(bids)
+        self.sides['sell'].sync(asks)
+        self.seq = seq
+        self.synced = True
+        return True
+
+    def apply_update(self, seq, order_type, price, amount):
+        return self.apply_updates(seq, [(order_type, price, amount)])
+
+    def apply_updates(self, seq, changes):
+        """
+        applies the level changes that came with one sequence number. changes
+        is a list of (order_type, price, amount). A zero amount removes the
+        level.
+
+        Returns False if the update can't be applied because the book is out
+        of sync (there is a gap in the sequence numbers). A new snapshot should
+        be applied then.
+        """
+        if not self.synced:
+            return False
+        if seq is not None and self.seq is not None:
+            if seq <= self.seq:
+                # old news
+                return True
+            if seq != self.seq + 1:
+                self.synced = False
+                return False
+
+        for order_type, price, amount in changes:
+            self.sides[order_type].set_level(to_satoshi(price), to_satoshi(amount))
+        if seq is not None:
+            self.seq = seq
+        return True
+
+    def best_bid(self):
+        return self.sides['buy'].top()
+
+    def best_ask(self):
+        return self.sides['sell'].top()
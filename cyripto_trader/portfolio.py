@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Trading several currency pairs from one process.
+
+All the traders share one api client and one request budget. Each tick the
+balances and the open orders of every pair are fetched with one call each,
+then the pairs get their order book and trade in priority order, as long as
+the budget allows.
+"""
+import time
+
+from .event_log import fields, log
+from .satoshi import from_satoshi, to_satoshi
+
+
+class Portfolio(object):
+    """
+    Runs the scalping strategy of a list of traders.
+
+    priority is 'spread' (relative spread of the book) or 'volatility'
+    (moving average of the relative mid price changes). shares maps a pair to
+    its weight when a balance is split between the traders that use the same
+    coin, pairs not in it get a weight of 1.
+    """
+    def __init__(self, traders, polo, limiter, priority='spread', shares=None,
+                 wait_time=0.8, metrics=None):
+        self.traders = traders
+        self.polo = polo
+        self.limiter = limiter
+        self.priority = priority
+        self.shares = shares or {}
+        self.wait_time = wait_time
+        self.metrics = metrics
+        # my_pair -> {'mid', 'spread', 'volatility', 'waited'}
+        self.stats = {}
+        for trader in traders:
+            self.stats[trader.my_pair] = {
+                'mid': None, 'spread': None, 'volatility': None, 'waited': 0}
+
+    def share(self, trader, coin):
+        """
+        part of the coin balance that belongs to the trader.
+        """
+        users = [t for t in self.traders if coin in (t.coin, t.currency)]
+        weights = sum(self.shares.get(t.my_pair, 1) for t in users)
+        return float(self.shares.get(trader.my_pair, 1)) / weights
+
+    def held(self, trader, coin):
+        """
+        the coin in the open orders of the trader: sells hold the coin, buys
+        the currency.
+        """
+        if coin == trader.coin:
+            return sum(order['amount'] for order in trader.open_orders_sell)
+        if coin == trader.currency:
+            return sum(order['total'] for order in trader.open_orders_buy)
+        return 0
+
+    def balances_for(self, trader, balances):
+        """
+        the balances as the trader should see them. A shared coin, free and in
+        the open orders of all the pairs, is split by the shares and the
+        trader's own open orders come out of its part. The open orders of all
+        the traders should be processed before.
+        """
+        mine = dict(balances)
+        for coin in (trader.coin, trader.currency):
+            free = to_satoshi(balances.get(coin, '0.0'))
+            whole = free + sum(self.held(t, coin) for t in self.traders)
+            balance = int(whole * self.share(trader, coin)) - self.held(trader, coin)
+            mine[coin] = from_satoshi(min(max(balance, 0), free))
+        return mine
+
+    def score(self, trader):
+        stats = self.stats[trader.my_pair]
+        value = stats[self.priority]
+        if value is None:
+            # never seen the book, look at it first
+            return float('inf')
+        # pairs that had to wait move up so they don't starve
+        return max(value, 1e-8) * (1 + stats['waited'])
+
+    def schedule(self):
+        return sorted(self.traders, key=self.score, reverse=True)
+
+    def cost(self, trader):
+        """
+        calls a pair may need this tick: the book, a cancel per open order and
+        a new order.
+        """
+        return 1 + len(trader.open_orders) + 1
+
+    def update_stats(self, trader):
+        stats = self.stats[trader.my_pair]
+        bid = trader.book.best_bid()
+        ask = trader.book.best_ask()
+        if bid is None or ask is None:
+            return
+        mid = float(bid + ask) / 2
+        stats['spread'] = float(ask - bid) / mid
+        if stats['mid']:
+            change = abs(mid - stats['mid']) / stats['mid']
+            if stats['volatility'] is None:
+                stats['volatility'] = change
+            else:
+                stats['volatility'] = 0.8 * stats['volatility'] + 0.2 * change
+        elif stats['volatility'] is None:
+            stats['volatility'] = 0.0
+        stats['mid'] = mid
+
+    def load_accounts(self):
+        """
+        one balance and one open orders call for all the pairs.
+        """
+        balances = self.polo.returnBalances()
+        open_orders = self.polo.returnOpenOrders(currencyPair='all')
+        for trader in self.traders:
+            trader.process_open_orders(open_orders.get(trader.my_pair, []))
+        for trader in self.traders:
+            trader.process_balances(self.balances_for(trader, balances))
+
+    def tick(self):
+        started = time.time()
+        for trader in self.traders:
+            # the tick start and the kill switch poll of the risk gate
+            trader.start_tick()
+        self.load_accounts()
+        for trader in self.schedule():
+            stats = self.stats[trader.my_pair]
+            if self.limiter.available() < self.cost(trader):
+                stats['waited'] += 1
+                log.debug('pair waits for the request budget',
+                          extra=fields(pair=trader.my_pair, waited=stats['waited']))
+                continue
+            stats['waited'] = 0
+            trader.load_order_book()
+            self.update_stats(trader)
+            trader.scalp()
+            trader.ingest_fills()
+            trader.save_state()
+        if self.metrics is not None:
+            self.metrics.observe('tick', time.time() - started)
+            summary = self.metrics.due_summary()
+            if summary:
+                log.info('metrics', extra=fields(summary=summary))
+
+    def run(self):
+        for trader in self.traders:
+            trader.resume()
+        while True:
+            self.tick()
+            time.sleep(self.wait_time)
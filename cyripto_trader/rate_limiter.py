@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Token bucket that keeps the api calls within the exchange request budget.
+"""
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Allows `rate` calls per second on average and bursts of up to `burst`
+    calls. Safe to share between threads.
+    """
+    def __init__(self, rate=6.0, burst=None):
+        self.rate = float(rate)
+        if burst is None:
+            burst = rate
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        """
+        number of calls that can be made right now.
+        """
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def try_acquire(self, tokens=1):
+        """
+        takes the tokens if they are there. Returns False instead of waiting.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        waits until the tokens are there and takes them.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedClient(object):
+    """
+    Wraps an api client so every call takes a token from the bucket first.
+    Traders sharing one of these share the request budget.
+    """
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        def limited(*args, **kwargs):
+            self.limiter.acquire()
+            return method(*args, **kwargs)
+        return limited
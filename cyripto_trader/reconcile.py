@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Order reconciliation.
+
+Works out the fewest actions that turn my open orders into the desired ones.
+An order already at a desired price is kept, or resized if its amount is off
+by more than min_change. A desired order without one at its price takes an
+order of the same type from another price with a move (one atomic call on
+the exchange instead of a cancel and a new order). Only what is left over is
+canceled or placed.
+"""
+
+
+def diff_orders(desired, actual, min_change=0.0):
+    """
+    desired: list of {'type', 'price', 'amount'}, actual: my open orders.
+    min_change is the relative amount change below which an order is kept.
+
+    Returns a dict of lists:
+        keep: orders that are fine as they are
+        move: (order, desired) pairs, the order is moved or resized
+        cancel: orders to cancel
+        place: desired orders to send as new orders
+    """
+    plan = {'keep': [], 'move': [], 'cancel': [], 'place': []}
+    left = list(actual)
+    unmatched = []
+
+    for want in desired:
+        match = None
+        for order in left:
+            if order['type'] == want['type'] and order['price'] == want['price']:
+                match = order
+                break
+        if match is None:
+            unmatched.append(want)
+            continue
+        left.remove(match)
+        if abs(match['amount'] - want['amount']) <= want['amount'] * min_change:
+            plan['keep'].append(match)
+        else:
+            plan['move'].append((match, want))
+
+    for want in unmatched:
+        for order in left:
+            if order['type'] == want['type']:
+                left.remove(order)
+                plan['move'].append((order, want))
+                break
+        else:
+            plan['place'].append(want)
+
+    plan['cancel'] = left
+    return plan
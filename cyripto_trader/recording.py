@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Compact binary recordings of the market events of a pair.
+
+A recording is two append-only files:
+
+    <pair>.rec      header, then zlib compressed blocks of fixed width records
+    <pair>.rec.idx  header, then one fixed width entry per block: first and
+                    last timestamp, offset and length of the block, number of
+                    records and flags
+
+A record is (timestamp in microseconds, sequence number, price, amount, kind)
+with the price and amount in satoshis. A book snapshot is a SNAPSHOT record,
+whose amount is the number of levels, followed by the level records. An update
+is one record per changed level, all with the same timestamp and sequence
+number. A trade is one record.
+
+Each block starts with a snapshot of the book when the recorder has one, so a
+reader can memory-map both files, find the block of a timestamp with a bisect
+on the index and start from there without reading the rest of the file.
+"""
+import bisect
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from .order_book import OrderBook
+from .satoshi import from_satoshi, to_satoshi
+
+
+MAGIC = b'CTREC001'
+INDEX_MAGIC = b'CTIDX001'
+HEADER = struct.Struct('<8s24s')
+RECORD = struct.Struct('<qqqqB')
+INDEX_ENTRY = struct.Struct('<qqqIIi')
+
+# record kinds
+SNAPSHOT = 0
+SNAPSHOT_BID = 1
+SNAPSHOT_ASK = 2
+UPDATE_BID = 3
+UPDATE_ASK = 4
+TRADE_BUY = 5
+TRADE_SELL = 6
+
+# index flags
+STARTS_WITH_SNAPSHOT = 1
+
+
+def recording_path(directory, pair):
+    return os.path.join(directory, '%s.rec' % pair)
+
+
+class MarketRecorder(object):
+    """
+    Writes the market events of one pair to a recording. A block is written
+    when it has block_records records or is snapshot_interval seconds old.
+    """
+    def __init__(self, directory, pair, block_records=65536, snapshot_interval=60,
+                 compress_level=1):
+        self.pair = pair
+        self.block_records = block_records
+        self.snapshot_interval = snapshot_interval
+        self.compress_level = compress_level
+        self.path = recording_path(directory, pair)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.data = open(self.path, 'ab')
+        self.index = open(self.path + '.idx', 'ab')
+        if self.data.tell() == 0:
+            self.data.write(HEADER.pack(MAGIC, pair.encode('ascii')))
+            self.data.flush()
+        if self.index.tell() == 0:
+            self.index.write(HEADER.pack(INDEX_MAGIC, pair.encode('ascii')))
+            self.index.flush()
+
+        # the book as recorded, for the snapshot at the start of each block
+        self.book = OrderBook()
+        self.block = []
+        self.block_flags = 0
+        self.block_first_ts = None
+        self.block_last_ts = None
+
+    def write_book(self, ts, seq):
+        bids = self.book.sides['buy']
+        asks = self.book.sides['sell']
+        block = self.block
+        block.append(RECORD.pack(ts, seq, 0, len(bids) + len(asks), SNAPSHOT))
+        for side, kind in ((bids, SNAPSHOT_BID), (asks, SNAPSHOT_ASK)):
+            for index in range(len(side)):
+                block.append(RECORD.pack(ts, seq, side.prices[index], side.amounts[index], kind))
+
+    def record(self, event):
+        ts = int(event.get('ts', time.time()) * 1000000)
+        seq = event.get('seq')
+        if seq is None:
+            seq = -1
+
+        if not self.block:
+            self.block_first_ts = ts
+            self.block_flags = 0
+            if event['type'] == 'snapshot':
+                self.block_flags = STARTS_WITH_SNAPSHOT
+            elif self.book.synced:
+                self.write_book(ts, self.book.seq if self.book.seq is not None else -1)
+                self.block_flags = STARTS_WITH_SNAPSHOT
+        self.block_last_ts = ts
+
+        block = self.block
+        if event['type'] == 'snapshot':
+            self.book.apply_snapshot(event['bids'], event['asks'], event.get('seq'))
+            self.write_book(ts, seq)
+        elif event['type'] == 'update':
+            self.book.apply_updates(event.get('seq'), event['changes'])
+            for order_type, price, amount in event['changes']:
+                kind = UPDATE_BID if order_type == 'buy' else UPDATE_ASK
+                block.append(RECORD.pack(ts, seq, to_satoshi(price), to_satoshi(amount), kind))
+        elif event['type'] == 'trade':
+            kind = TRADE_BUY if event['trade_type'] == 'buy' else TRADE_SELL
+            block.append(RECORD.pack(ts, seq, to_satoshi(event['price']),
+                                     to_satoshi(event['amount']), kind))
+
+        if (len(block) >= self.block_records or
+                ts - self.block_first_ts >= self.snapshot_interval * 1000000):
+            self.flush()
+
+    def flush(self):
+        """
+        writes the current block.
+        """
+        if not self.block:
+            return
+        raw = b''.join(self.block)
+        compressed = zlib.compress(raw, self.compress_level)
+        offset = self.data.tell()
+        self.data.write(compressed)
+        self.data.flush()
+        self.index.write(INDEX_ENTRY.pack(self.block_first_ts, self.block_last_ts, offset,
+                                          len(compressed), len(self.block), self.block_flags))
+        self.index.flush()
+        self.block = []
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+
+class Recording(object):
+    """
+    Reads a recording through memory maps.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(path + '.idx', 'rb') as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, pair = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or HEADER.unpack_from(self.index, 0)[0] != INDEX_MAGIC:
+            raise ValueError('%s is not a recording' % path)
+        self.pair = pair.rstrip(b'\0').decode('ascii')
+        # a block can be half written if the recorder died, leave it out
+        self.blocks = (len(self.index) - HEADER.size) // INDEX_ENTRY.size
+        while self.blocks:
+            first_ts, last_ts, offset, length, count, flags = self.entry(self.blocks - 1)
+            if offset + length <= len(self.data):
+                break
+            self.blocks -= 1
+        self.first_ts = [self.entry(block)[0] for block in range(self.blocks)]
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def entry(self, block):
+        """
+        (first_ts, last_ts, offset, length, records, flags) of a block.
+        """
+        return INDEX_ENTRY.unpack_from(self.index, HEADER.size + block * INDEX_ENTRY.size)
+
+    def records(self, block):
+        first_ts, last_ts, offset, length, count, flags = self.entry(block)
+        raw = zlib.decompress(self.data[offset:offset + length])
+        for position in range(0, count * RECORD.size, RECORD.size):
+            yield RECORD.unpack_from(raw, position)
+
+    def block_events(self, block):
+        """
+        market events (see market_feed) of a block.
+        """
+        pair = self.pair
+        snapshot = None
+        update = None
+        for ts, seq, price, amount, kind in self.records(block):
+            if snapshot is not None:
+                if kind == SNAPSHOT_BID:
+                    snapshot['bids'].append([from_satoshi(price), from_satoshi(amount)])
+                else:
+                    snapshot['asks'].append([from_satoshi(price), from_satoshi(amount)])
+                levels -= 1
+                if levels == 0:
+                    yield snapshot
+                    snapshot = None
+                continue
+            if kind in (UPDATE_BID, UPDATE_ASK):
+                change = ['buy' if kind == UPDATE_BID else 'sell',
+                          from_satoshi(price), from_satoshi(amount)]
+                if update is not None and update['seq'] == seq and update['ts'] == ts / 1e6:
+                    update['changes'].append(change)
+                    continue
+                if update is not None:
+                    yield update
+                update = {'type': 'update', 'pair': pair, 'seq': seq, 'ts': ts / 1e6,
+                          'changes': [change]}
+                continue
+            if update is not None:
+                yield update
+                update = None
+            if kind == SNAPSHOT:
+                snapshot = {'type': 'snapshot', 'pair': pair, 'seq': seq, 'ts': ts / 1e6,
+                            'bids': [], 'asks': []}
+                levels = amount
+                if levels == 0:
+                    yield snapshot
+                    snapshot = None
+            else:
+                yield {'type': 'trade', 'pair': pair, 'seq': seq, 'ts': ts / 1e6,
+                       'trade_type': 'buy' if kind == TRADE_BUY else 'sell',
+                       'price': from_satoshi(price), 'amount': from_satoshi(amount)}
+        if update is not None:
+            yield update
+
+    def find_block(self, ts):
+        """
+        the last block that starts with a snapshot at or before ts.
+        """
+        block = max(bisect.bisect_right(self.first_ts, ts) - 1, 0)
+        while block > 0 and not self.entry(block)[5] & STARTS_WITH_SNAPSHOT:
+            block -= 1
+        return block
+
+    def events(self, start=None, end=None):
+        """
+        market events from start to end (unix timestamps). When starting in
+        the middle, the first event is a snapshot of the book at start.
+        """
+        first = 0
+        if start is not None:
+            first = self.find_block(int(start * 1000000))
+        book = None
+        if start is not None:
+            book = OrderBook()
+        for block in range(first, self.blocks):
+            if end is not None and self.entry(block)[0] > end * 1000000:
+                return
+            for event in self.block_events(block):
+                if end is not None and event['ts'] > end:
+                    return
+                if book is not None:
+                    if event['ts'] < start:
+                        if event['type'] == 'snapshot':
+                            book.apply_snapshot(event['bids'], event['asks'], event['seq'])
+                        elif event['type'] == 'update':
+                            book.apply_updates(event['seq'], event['changes'])
+                        continue
+                    if book.synced and event['type'] != 'snapshot':
+                        yield self.book_snapshot(book, event['ts'])
+                    book = None
+                yield event
+
+    def book_snapshot(self, book, ts):
+        snapshot = {'type': 'snapshot', 'pair': self.pair, 'seq': book.seq, 'ts': ts,
+                    'bids': [], 'asks': []}
+        for order_type, name in (('buy', 'bids'), ('sell', 'asks')):
+            side = book.sides[order_type]
+            snapshot[name] = [[from_satoshi(side.prices[i]), from_satoshi(side.amounts[i])]
+                              for i in range(len(side))]
+        return snapshot
+
+
+def record_feed(feed, pairs, directory, **options):
+    """
+    records the feed's events of the pairs until it ends or is interrupted.
+    options go to MarketRecorder.
+    """
+    recorders = {}
+    for pair in pairs:
+        recorders[pair] = MarketRecorder(directory, pair, **options)
+        feed.subscribe(pair)
+    try:
+        for event in feed.events():
+            recorder = recorders.get(event.get('pair'))
+            if recorder is not None:
+                recorder.record(event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        feed.close()
+        for recorder in recorders.values():
+            recorder.close()
+
+
+def read_recording(path, start=None, end=None):
+    """
+    market events of a recording, see Recording.events.
+    """
+    recording = Recording(path)
+    try:
+        for event in recording.events(start, end):
+            yield event
+    finally:
+        recording.close()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-trade risk checks.
+
+RiskGate is asked before every order and move goes out. It blocks the order
+if the kill switch is on, the price is outside the collar around the mid of
+the book, a buy would take the coin of the pair (held plus open buys) over
+its max_position, a buy would take the value of all the pairs (held at the
+mid plus open buys) over max_exposure, or more than max_order_rate orders per
+second went out. buy_room tells the traders how much they may buy, so their
+buys are made to fit the limits instead of being blocked.
+
+Everything the checks look at is kept up to date as it changes, so a check is
+a few comparisons: the traders report their balances and open orders, the
+collar and the value of a pair are computed again only when the top of its
+book moved, and the total value changes by the difference of one pair.
+
+The kill switch is turned on by hand (kill, or the kill file showing up) or
+when the realized loss of all the pairs goes over max_loss. It stays on until
+resume is called.
+
+Money is in satoshis.
+"""
+import os
+import threading
+import time
+
+from .rate_limiter import TokenBucket
+from .satoshi import div_round, div_satoshi, mul_satoshi, to_satoshi
+
+
+class PairRisk(object):
+    """
+    what the checks of one pair need.
+    """
+    def __init__(self, max_position=None):
+        self.max_position = max_position
+        # coin held, with what is in open sell orders
+        self.position = 0
+        # coin and currency in open buy orders
+        self.open_buy = 0
+        self.open_buy_total = 0
+        # top of the book the collar and the value are of
+        self.top = None
+        self.low = None
+        self.high = None
+        self.mid = None
+        # position at the mid plus open buys
+        self.exposure = 0
+        self.realized = 0
+
+
+class RiskGate(object):
+    """
+    the risk checks of all the pairs. max_position is the coin limit of the
+    pairs not in positions (pair -> coin), max_exposure and max_loss are in
+    the currency, collar is the largest distance of a price from the mid as
+    a ratio. None turns a check off.
+    """
+    def __init__(self, max_position=None, positions=None, max_exposure=None, collar=0.05,
+                 max_order_rate=None, max_loss=None, kill_file=None, kill_check_interval=1.0):
+        self.max_position = to_satoshi(max_position) if max_position is not None else None
+        self.positions = dict((pair, to_satoshi(limit)) for pair, limit in
+                              (positions or {}).items())
+        self.max_exposure = to_satoshi(max_exposure) if max_exposure is not None else None
+        # parts per million
+        self.collar = int(round(collar * 1000000)) if collar is not None else None
+        self.rate = TokenBucket(max_order_rate) if max_order_rate else None
+        self.max_loss = to_satoshi(max_loss) if max_loss is not None else None
+        self.kill_file = kill_file
+        self.kill_check_interval = kill_check_interval
+        self.kill_checked = 0
+
+        self.pairs = {}
+        self.exposure = 0
+        self.realized = 0
+        self.killed = None
+        self.lock = threading.Lock()
+        self.blocked = 0
+
+    def pair(self, pair):
+        state = self.pairs.get(pair)
+        if state is None:
+            state = self.pairs[pair] = PairRisk(self.positions.get(pair, self.max_position))
+        return state
+
+    # updates
+
+    def _set_exposure(self, state):
+        exposure = state.open_buy_total
+        if state.mid is not None:
+            exposure += mul_satoshi(state.position, state.mid)
+        self.exposure += exposure - state.exposure
+        state.exposure = exposure
+
+    def set_position(self, pair, position):
+        with self.lock:
+            state = self.pair(pair)
+            state.position = position
+            self._set_exposure(state)
+
+    def reset_open(self, pair):
+        """
+        forgets the open orders of the pair, they are added again.
+        """
+        with self.lock:
+            state = self.pair(pair)
+            state.open_buy = 0
+            state.open_buy_total = 0
+            self._set_exposure(state)
+
+    def open_order(self, pair, order, sign=1):
+        """
+        an open buy order of the pair was added (sign 1) or removed (-1).
+        """
+        if order['type'] != 'buy':
+            return
+        with self.lock:
+            state = self.pair(pair)
+            state.open_buy += sign * order['amount']
+            state.open_buy_total += sign * order['total']
+            self._set_exposure(state)
+
+    def set_top(self, state, bid, ask):
+        state.top = (bid, ask)
+        if bid is None or ask is None:
+            state.mid = bid or ask
+        else:
+            state.mid = (bid + ask) // 2
+        if state.mid is None or self.collar is None:
+            state.low = state.high = None
+        else:
+            width = div_round(state.mid * self.collar, 1000000)
+            state.low = state.mid - width
+            state.high = state.mid + width
+        self._set_exposure(state)
+
+    def set_realized(self, pair, realized):
+        """
+        realized PnL of the pair. Turns the kill switch on when the total
+        loss is over max_loss.
+        """
+        with self.lock:
+            state = self.pair(pair)
+            self.realized += realized - state.realized
+            state.realized = realized
+            loss = -self.realized
+        if self.max_loss is not None and loss > self.max_loss:
+            self.kill('loss of %s over the limit' % loss)
+
+    # kill switch
+
+    def kill(self, reason):
+        if self.killed is None:
+            self.killed = reason
+
+    def resume(self):
+        self.killed = None
+
+    def poll(self):
+        """
+        turns the kill switch on if the kill file is there. Looks at most
+        once every kill_check_interval seconds.
+        """
+        if not self.kill_file:
+            return
+        now = time.time()
+        if now - self.kill_checked < self.kill_check_interval:
+            return
+        self.kill_checked = now
+        if os.path.exists(self.kill_file):
+            self.kill('kill file %s' % self.kill_file)
+
+    # check
+
+    def buy_room(self, pair, price, bid, ask):
+        """
+        the most coin the buy orders of the pair may hold together at the
+        price (the open ones included) within the position and exposure
+        limits, None if there is no limit.
+        """
+        state = self.pairs.get(pair)
+        if state is None:
+            state = self.pair(pair)
+        if state.top != (bid, ask):
+            with self.lock:
+                self.set_top(state, bid, ask)
+        room = None
+        if state.max_position is not None:
+            room = max(0, state.max_position - state.position)
+        if self.max_exposure is not None and price:
+            value = self.max_exposure - self.exposure + mul_satoshi(price, state.open_buy)
+            # one satoshi less for the rounding of the check
+            coin = max(0, div_satoshi(max(0, value), price) - 1)
+            room = coin if room is None else min(room, coin)
+        return room
+
+    def check(self, pair, order_type, price, amount, bid, ask, extra=0):
+        """
+        None if the order may go out, else why not. bid and ask are the top
+        of the pair's book, extra is the coin of other orders of the same
+        batch that are not open yet (negative for the order a move replaces).
+        """
+        if self.killed is not None:
+            reason = 'kill switch: %s' % self.killed
+        else:
+            reason = self._check(pair, order_type, price, amount, bid, ask, extra)
+        if reason is not None:
+            self.blocked += 1
+        return reason
+
+    def _check(self, pair, order_type, price, amount, bid, ask, extra):
+        state = self.pairs.get(pair)
+        if state is None:
+            state = self.pair(pair)
+        if state.top != (bid, ask):
+            with self.lock:
+                self.set_top(state, bid, ask)
+        if state.low is not None and not state.low <= price <= state.high:
+            return 'price outside the collar'
+        if order_type == 'buy':
+            if (state.max_position is not None and
+                    state.position + state.open_buy + extra + amount > state.max_position):
+                return 'position limit'
+            if (self.max_exposure is not None and
+                    self.exposure + mul_satoshi(price, amount + extra) > self.max_exposure):
+                return 'exposure limit'
+        if self.rate is not None and not self.rate.try_acquire():
+            return 'order rate'
+        return None
+
+
+def make_risk_gate(options, pairs=()):
+    """
+    gate from the risk settings, None if it is turned off. The pairs may have
+    their own max_position.
+    """
+    if not options.enabled:
+        return None
+    positions = dict((pair.pair, pair.max_position) for pair in pairs
+                     if pair.max_position is not None)
+    return RiskGate(options.max_position, positions, options.max_exposure, options.collar,
+                    options.max_order_rate, options.max_loss, options.kill_file,
+                    options.kill_check_interval)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Integer satoshi arithmetic.
+
+Money is kept as an int number of satoshis (1e-8 of a coin) everywhere inside
+the bot. The numbers are converted from and to the exchange's strings only at
+the api boundary. Rounding is the same as Decimal.quantize(Decimal('1.00000000'))
+with the default context (half even).
+"""
+import decimal
+import numbers
+
+
+SATOSHI = 100000000
+QUANT = decimal.Decimal('1.00000000')
+
+
+def div_round(numerator, denominator):
+    """
+    numerator / denominator rounded half even. denominator must be positive.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+
+def _parse(text):
+    """
+    satoshis of a plain decimal string like '0.01234567', or None if it needs
+    rounding or isn't plain.
+    """
+    text = text.strip()
+    negative = text.startswith('-')
+    if negative:
+        text = text[1:]
+    whole, _, fraction = text.partition('.')
+    if len(fraction) > 8 or not (whole or fraction):
+        return None
+    if not (whole.isdigit() or not whole) or not (fraction.isdigit() or not fraction):
+        return None
+    value = int(whole or 0) * SATOSHI + int(fraction.ljust(8, '0'))
+    if negative:
+        return -value
+    return value
+
+
+def to_satoshi(num):
+    """
+    satoshis of a number in coins. num can be a string, int, float or Decimal.
+    """
+    if isinstance(num, numbers.Integral):
+        return int(num) * SATOSHI
+    if isinstance(num, str):
+        value = _parse(num)
+        if value is not None:
+            return value
+    elif isinstance(num, float) and abs(num) < 1e7:
+        # repr is exact enough below 1e7 if it has at most 8 decimals
+        value = _parse(repr(num))
+        if value is not None:
+            return value
+    return int(decimal.Decimal(num).quantize(QUANT) * SATOSHI)
+
+
+def from_satoshi(value):
+    """
+    the satoshis as a string in coins with 8 decimals, like '0.01234567'.
+    """
+    sign = ''
+    if value < 0:
+        sign = '-'
+        value = -value
+    return '%s%d.%08d' % (sign, value // SATOSHI, value % SATOSHI)
+
+
+def to_decimal(value):
+    return decimal.Decimal(from_satoshi(value))
+
+
+def mul_satoshi(a, b):
+    """
+    a * b, e.g. price * amount.
+    """
+    return div_round(a * b, SATOSHI)
+
+
+def div_satoshi(a, b):
+    """
+    a / b, e.g. total / price.
+    """
+    return div_round(a * SATOSHI, b)
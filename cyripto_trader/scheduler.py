@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive wait between the ticks of the polling loops.
+
+TickScheduler looks at the book after every tick and sets the wait before the
+next one:
+
+- the more the mid price moves from tick to tick (a moving average of the
+  relative change), the shorter the wait, down to min_wait;
+- the longer the book didn't change at all, the longer the wait, up to
+  max_wait;
+- with open orders the wait is at most order_wait, they may be filled or
+  overtaken;
+- if the request budget of the limiter doesn't have the calls of the next
+  tick, the wait is at least the time it takes to get them back.
+
+With no movement and no orders it polls at max_wait, when the market moves it
+polls as fast as the budget allows.
+"""
+import time
+
+
+class TickScheduler(object):
+    """
+    base_wait is the wait of a market that moves volatility_scale (relative
+    mid change per tick) and has open orders. limiter is the TokenBucket of
+    the api calls, None for no budget.
+    """
+    def __init__(self, base_wait=0.8, min_wait=0.2, max_wait=5.0, order_wait=None,
+                 idle_after=10.0, volatility_scale=0.0005, limiter=None):
+        self.base_wait = base_wait
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        if order_wait is None:
+            order_wait = base_wait
+        self.order_wait = order_wait
+        # seconds without a book change before the wait gets longer
+        self.idle_after = idle_after
+        self.volatility_scale = volatility_scale
+        self.limiter = limiter
+
+        self.mid = None
+        self.volatility = None
+        self.top = None
+        self.changed = time.time()
+
+    def observe(self, book):
+        """
+        takes the book of the tick that just ended.
+        """
+        bid = book.best_bid()
+        ask = book.best_ask()
+        top = (book.seq, bid, ask)
+        if book.seq is None:
+            # no sequence number, only the top of the book tells a change
+            top = (None, bid, ask, book.sides['buy'].amounts[:1].tolist(),
+                   book.sides['sell'].amounts[:1].tolist())
+        if top != self.top:
+            self.top = top
+            self.changed = time.time()
+        if bid is None or ask is None:
+            return
+        mid = float(bid + ask) / 2
+        if self.mid:
+            change = abs(mid - self.mid) / self.mid
+            if self.volatility is None:
+                self.volatility = change
+            else:
+                self.volatility = 0.8 * self.volatility + 0.2 * change
+        self.mid = mid
+
+    def idle_time(self):
+        return time.time() - self.changed
+
+    def budget_wait(self, calls):
+        """
+        seconds until the limiter has the calls.
+        """
+        if self.limiter is None:
+            return 0.0
+        missing = calls - self.limiter.available()
+        if missing <= 0:
+            return 0.0
+        return missing / self.limiter.rate
+
+    def next_wait(self, book, open_orders=0, calls=3):
+        """
+        the wait before the next tick after a tick that ended with the book
+        and open_orders open orders. The next tick is expected to make calls
+        api calls.
+        """
+        self.observe(book)
+        wait = self.base_wait
+        if self.volatility is not None:
+            wait = self.base_wait / (1 + self.volatility / self.volatility_scale)
+        idle = self.idle_time()
+        if idle > self.idle_after:
+            wait *= idle / self.idle_after
+        if open_orders:
+            wait = min(wait, self.order_wait)
+        wait = max(wait, self.budget_wait(calls))
+        return min(max(wait, self.min_wait), self.max_wait)
+
+
+def make_scheduler(options, limiter=None):
+    """
+    scheduler from the schedule settings, None if it is turned off.
+    """
+    if not options.enabled:
+        return None
+    return TickScheduler(options.base_wait, options.min_wait, options.max_wait,
+                         options.order_wait, options.idle_after, options.volatility_scale,
+                         limiter)
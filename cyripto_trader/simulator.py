@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+"""
+Local exchange simulator.
+
+ExchangeSimulator implements the poloniex api subset Trader uses
+(returnBalances, returnOpenOrders, returnOrderBook, returnTradeHistory, buy,
+sell, cancelOrder, moveOrder) on top of an in-memory matching engine per pair
+with price-time priority. My orders match against the orders of a scripted
+market flow (RandomFlow or ScriptFlow) that moves a few steps before every api
+call. My balances are kept by an account.Account, the same as in the backtest.
+
+The simulator can be given to Trader as polo in the same process (run_load_test
+does that, with no network in the way) or served over HTTP with
+serve_simulator in the poloniex public/tradingApi format, for
+transport.PoloniexClient with its url.
+An optional latency and a token bucket rate limit make it behave like the
+real exchange.
+"""
+import bisect
+import collections
+import json
+import random
+import threading
+import time
+
+from .account import INVALID_ORDER, Account, open_order_fields
+from .rate_limiter import TokenBucket
+from .satoshi import from_satoshi, mul_satoshi, to_satoshi
+
+
+# the account of the scripted market flow, it has no balances
+MARKET = 'market'
+# my account
+ME = 'me'
+
+
+class MatchingEngine(object):
+    """
+    Limit order book of one pair. Orders at a price level are filled in the
+    order they came in, better prices first.
+
+    An order is a dict: number, account, type, price, amount (left),
+    starting_amount and held (what is locked of my balance).
+    """
+    def __init__(self, pair):
+        self.pair = pair
+        # type -> price -> deque of orders
+        self.levels = {'buy': {}, 'sell': {}}
+        # type -> price -> amount of the level
+        self.totals = {'buy': {}, 'sell': {}}
+        # sorted level keys, asks by price and bids by -price
+        self.keys = {'buy': [], 'sell': []}
+        # order number -> order, and the ones of my account
+        self.orders = {}
+        self.mine = {}
+        self.seq = 0
+
+    def _key(self, order_type, price):
+        if order_type == 'buy':
+            return -price
+        return price
+
+    def best(self, order_type):
+        """
+        best price of the side or None.
+        """
+        keys = self.keys[order_type]
+        if not keys:
+            return None
+        return abs(keys[0])
+
+    def rest(self, order):
+        levels = self.levels[order['type']]
+        totals = self.totals[order['type']]
+        level = levels.get(order['price'])
+        if level is None:
+            level = levels[order['price']] = collections.deque()
+            totals[order['price']] = 0
+            bisect.insort(self.keys[order['type']], self._key(order['type'], order['price']))
+        level.append(order)
+        totals[order['price']] += order['amount']
+        self.orders[order['number']] = order
+        if order['account'] == ME:
+            self.mine[order['number']] = order
+        self.seq += 1
+
+    def remove(self, order):
+        levels = self.levels[order['type']]
+        totals = self.totals[order['type']]
+        level = levels[order['price']]
+        level.remove(order)
+        totals[order['price']] -= order['amount']
+        if not level:
+            del levels[order['price']]
+            del totals[order['price']]
+            keys = self.keys[order['type']]
+            del keys[bisect.bisect_left(keys, self._key(order['type'], order['price']))]
+        del self.orders[order['number']]
+        self.mine.pop(order['number'], None)
+        self.seq += 1
+
+    def match(self, order):
+        """
+        fills the incoming order against the other side as far as it crosses,
+        price None takes any price. Returns the fills as (maker order, price,
+        amount), the maker's price is the fill price.
+        """
+        other = 'sell' if order['type'] == 'buy' else 'buy'
+        levels = self.levels[other]
+        totals = self.totals[other]
+        keys = self.keys[other]
+        fills = []
+        while order['amount'] > 0 and keys:
+            price = abs(keys[0])
+            if order['price'] is not None:
+                if order['type'] == 'buy' and price > order['price']:
+                    break
+                if order['type'] == 'sell' and price < order['price']:
+                    break
+            level = levels[price]
+            maker = level[0]
+            amount = min(order['amount'], maker['amount'])
+            order['amount'] -= amount
+            maker['amount'] -= amount
+            totals[price] -= amount
+            fills.append((maker, price, amount))
+            if maker['amount'] <= 0:
+                self.remove(maker)
+            else:
+                self.seq += 1
+        return fills
+
+    def depth(self, order_type, depth):
+        """
+        [price, total amount] of the first depth levels of the side.
+        """
+        totals = self.totals[order_type]
+        return [[abs(key), totals[abs(key)]] for key in self.keys[order_type][:depth]]
+
+
+class RandomFlow(object):
+    """
+    Random market flow around a mid price that takes a random walk: limit
+    orders within `spread_ticks` of the mid, market orders and cancels. The
+    book is seeded with `depth` levels per side. Prices and amounts in coins.
+    """
+    def __init__(self, mid=0.02, tick=0.00000100, depth=50, amount=5.0, spread_ticks=20,
+                 market_ratio=0.1, cancel_ratio=0.3, volatility=0.05, seed=None):
+        self.mid = to_satoshi(mid)
+        self.tick = to_satoshi(tick)
+        self.depth = depth
+        self.amount = to_satoshi(amount)
+        self.spread_ticks = spread_ticks
+        self.market_ratio = market_ratio
+        self.cancel_ratio = cancel_ratio
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        # order numbers of the flow's resting orders, some may be gone
+        self.placed = []
+
+    def seed_actions(self):
+        for level in range(1, self.depth + 1):
+            for order_type, sign in (('buy', -1), ('sell', 1)):
+                yield {'action': 'limit', 'type': order_type,
+                       'price': self.mid + sign * level * self.tick,
+                       'amount': self.random_amount()}
+
+    def random_amount(self):
+        return max(1, int(self.amount * self.random.expovariate(1.0)))
+
+    def next_action(self):
+        rand = self.random
+        if rand.random() < self.volatility:
+            self.mid = max(self.tick, self.mid + rand.choice((-1, 1)) * self.tick)
+        roll = rand.random()
+        if roll < self.cancel_ratio and self.placed:
+            index = rand.randrange(len(self.placed))
+            number = self.placed[index]
+            self.placed[index] = self.placed[-1]
+            self.placed.pop()
+            return {'action': 'cancel', 'number': number}
+        order_type = rand.choice(('buy', 'sell'))
+        if roll < self.cancel_ratio + self.market_ratio:
+            return {'action': 'market', 'type': order_type, 'amount': self.random_amount()}
+        offset = rand.randint(1, self.spread_ticks) * self.tick
+        if order_type == 'buy':
+            price = self.mid - offset
+        else:
+            price = self.mid + offset
+        return {'action': 'limit', 'type': order_type, 'price': max(self.tick, price),
+                'amount': self.random_amount()}
+
+    def placed_order(self, number):
+        self.placed.append(number)
+
+
+class ScriptFlow(object):
+    """
+    Market flow read from a JSON lines file, one action per line, prices and
+    amounts in coins:
+
+        {"action": "limit", "type": "sell", "price": "0.0201", "amount": "3", "ref": "a"}
+        {"action": "market", "type": "buy", "amount": "2"}
+        {"action": "cancel", "ref": "a"}
+
+    ref names an order for a later cancel. With loop the script starts over
+    at the end, otherwise the market goes quiet.
+    """
+    def __init__(self, path, loop=False):
+        with open(path) as f:
+            self.actions = [json.loads(line) for line in f if line.strip()]
+        self.loop = loop
+        self.position = 0
+        # ref -> order number
+        self.refs = {}
+        self.last_ref = None
+
+    def seed_actions(self):
+        return []
+
+    def next_action(self):
+        if self.position >= len(self.actions):
+            if not self.loop or not self.actions:
+                return None
+            self.position = 0
+        action = dict(self.actions[self.position])
+        self.position += 1
+        for name in ('price', 'amount'):
+            if name in action:
+                action[name] = to_satoshi(action[name])
+        if action['action'] == 'cancel':
+            action['number'] = self.refs.pop(action['ref'], None)
+        self.last_ref = action.get('ref')
+        return action
+
+    def placed_order(self, number):
+        if self.last_ref is not None:
+            self.refs[self.last_ref] = number
+
+
+class ExchangeSimulator(object):
+    """
+    The simulated exchange. balances are my balances in coins, fees are
+    rates. flows maps a pair to its market flow, flow_steps actions of every
+    flow run before each api call. latency (seconds, plus up to jitter more)
+    is slept on every call and rate_limit calls per second are allowed, the
+    ones over it fail like on poloniex.
+    """
+    def __init__(self, balances, flows, flow_steps=1, maker_fee=0.0015, taker_fee=0.0025,
+                 latency=0.0, jitter=0.0, rate_limit=None, min_total='0.0001'):
+        self.account = Account(balances, maker_fee, taker_fee, min_total)
+        self.balances = self.account.balances
+        self.flows = flows
+        self.engines = {}
+        for pair in flows:
+            self.engines[pair] = MatchingEngine(pair)
+            currency, coin = pair.split('_')
+            self.balances.setdefault(currency, 0)
+            self.balances.setdefault(coin, 0)
+        self.flow_steps = flow_steps
+        self.latency = latency
+        self.jitter = jitter
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.next_order_number = 1
+        self.lock = threading.Lock()
+        self.random = random.Random()
+
+        # statistics
+        self.calls = 0
+        self.busy = 0.0
+        self.trades = 0
+        # pair -> my fills in the returnTradeHistory format, and their times
+        self.history = dict((pair, []) for pair in flows)
+        self.history_times = dict((pair, []) for pair in flows)
+
+        for pair, flow in flows.items():
+            for action in flow.seed_actions():
+                self.apply_action(pair, action)
+
+    # market flow
+
+    def apply_action(self, pair, action):
+        engine = self.engines[pair]
+        if action['action'] == 'cancel':
+            order = engine.orders.get(action.get('number'))
+            if order is not None and order['account'] == MARKET:
+                engine.remove(order)
+            return
+        price = action.get('price') if action['action'] == 'limit' else None
+        order = self.new_order(MARKET, action['type'], price, action['amount'], 0)
+        self.execute(engine, order)
+        if engine.orders.get(order['number']) is order:
+            self.flows[pair].placed_order(order['number'])
+
+    def step(self, steps=1):
+        """
+        runs steps actions of every market flow.
+        """
+        for pair, flow in self.flows.items():
+            for _ in range(steps):
+                action = flow.next_action()
+                if action is None:
+                    break
+                self.apply_action(pair, action)
+
+    # matching
+
+    def new_order(self, account, order_type, price, amount, held):
+        order = {'number': self.next_order_number, 'account': account, 'type': order_type,
+                 'price': price, 'amount': amount, 'starting_amount': amount, 'held': held}
+        self.next_order_number += 1
+        return order
+
+    def settle(self, engine, order, price, amount, fee_rate):
+        """
+        moves the balances if the order filled at price is mine.
+        """
+        if order['account'] == ME:
+            self.account.settle(engine.pair, order, price, amount, fee_rate)
+
+    def execute(self, engine, order):
+        """
+        matches a new order and rests what is left of a limit order. Returns
+        the trades of the order in the poloniex format.
+        """
+        account = self.account
+        trades = []
+        for maker, price, amount in engine.match(order):
+            self.settle(engine, maker, price, amount, account.maker_fee)
+            self.settle(engine, order, price, amount, account.taker_fee)
+            if maker['account'] == ME and maker['amount'] <= 0:
+                account.orders_filled += 1
+                self.release(engine, maker)
+            self.trades += 1
+            self.record_fill(engine, maker, price, amount, account.maker_fee)
+            self.record_fill(engine, order, price, amount, account.taker_fee)
+            trades.append({'amount': from_satoshi(amount), 'rate': from_satoshi(price),
+                           'total': from_satoshi(mul_satoshi(price, amount)),
+                           'tradeID': str(self.trades), 'type': order['type']})
+        if order['amount'] > 0 and order['price'] is not None:
+            engine.rest(order)
+        elif order['account'] == ME:
+            if order['amount'] <= 0:
+                account.orders_filled += 1
+            self.release(engine, order)
+        return trades
+
+    def record_fill(self, engine, order, price, amount, fee_rate):
+        if order['account'] != ME:
+            return
+        now = time.time()
+        self.history[engine.pair].append({
+            'globalTradeID': str(self.trades), 'tradeID': str(self.trades),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now)),
+            'rate': from_satoshi(price), 'amount': from_satoshi(amount),
+            'total': from_satoshi(mul_satoshi(price, amount)),
+            # parts per million as a rate
+            'fee': from_satoshi(fee_rate * 100),
+            'orderNumber': str(order['number']), 'type': order['type'],
+            'category': 'exchange'})
+        self.history_times[engine.pair].append(int(now))
+
+    def release(self, engine, order):
+        """
+        gives back what is still held by my order.
+        """
+        self.account.release(engine.pair, order)
+
+    # api
+
+    def call(self, method, *args, **kwargs):
+        """
+        runs an api method the way the exchange would: rate limit, latency and
+        the market moving in between.
+        """
+        if self.limiter is not None and not self.limiter.try_acquire():
+            raise RuntimeError('Please do not make more than %s API calls per second.' % (
+                int(self.limiter.rate)))
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.random() * self.jitter)
+        with self.lock:
+            started = time.time()
+            try:
+                self.step(self.flow_steps)
+                return method(*args, **kwargs)
+            finally:
+                self.calls += 1
+                self.busy += time.time() - started
+
+    def engine(self, pair):
+        engine = self.engines.get(pair)
+        if engine is None:
+            raise RuntimeError('Invalid currency pair.')
+        return engine
+
+    def my_order(self, order_number):
+        for engine in self.engines.values():
+            order = engine.mine.get(int(order_number))
+            if order is not None:
+                return engine, order
+        raise RuntimeError(INVALID_ORDER)
+
+    def returnBalances(self):
+        return self.call(self._balances)
+
+    def _balances(self):
+        return self.account.balance_fields()
+
+    def returnOpenOrders(self, currencyPair='all'):
+        return self.call(self._open_orders, currencyPair)
+
+    def _open_orders(self, pair):
+        result = {}
+        for engine in self.engines.values():
+            if pair != 'all' and engine.pair != pair:
+                continue
+            result[engine.pair] = [open_order_fields(number, engine.mine[number])
+                                   for number in sorted(engine.mine)]
+        if pair == 'all':
+            return result
+        if pair not in result:
+            raise RuntimeError('Invalid currency pair.')
+        return result[pair]
+
+    def returnOrderBook(self, currencyPair='all', depth='50'):
+        return self.call(self._order_book, currencyPair, int(depth))
+
+    def _order_book(self, pair, depth):
+        result = {}
+        for engine in self.engines.values():
+            if pair != 'all' and engine.pair != pair:
+                continue
+            order_book = {'seq': engine.seq, 'isFrozen': '0'}
+            for name, order_type in (('bids', 'buy'), ('asks', 'sell')):
+                order_book[name] = [[from_satoshi(price), from_satoshi(amount)]
+                                    for price, amount in engine.depth(order_type, depth)]
+            result[engine.pair] = order_book
+        if pair == 'all':
+            return result
+        if pair not in result:
+            raise RuntimeError('Invalid currency pair.')
+        return result[pair]
+
+    def returnTradeHistory(self, currencyPair='all', start=None, end=None, limit=None):
+        return self.call(self._trade_history, currencyPair, start, end, limit)
+
+    def _trade_history(self, pair, start, end, limit):
+        """
+        my fills from start to end (unix times, both in), newest first and at
+        most limit (500 by default) of them.
+        """
+        limit = int(limit or 500)
+        result = {}
+        for engine in self.engines.values():
+            if pair != 'all' and engine.pair != pair:
+                continue
+            times = self.history_times[engine.pair]
+            first = bisect.bisect_left(times, int(start)) if start is not None else 0
+            last = bisect.bisect_right(times, int(end)) if end is not None else len(times)
+            trades = self.history[engine.pair][max(first, last - limit):last]
+            trades.reverse()
+            result[engine.pair] = trades
+        if pair == 'all':
+            return result
+        if pair not in result:
+            raise RuntimeError('Invalid currency pair.')
+        return result[pair]
+
+    def sell(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.call(self._place, 'sell', currencyPair, rate, amount)
+
+    def buy(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.call(self._place, 'buy', currencyPair, rate, amount)
+
+    def _place(self, order_type, pair, rate, amount):
+        engine = self.engine(pair)
+        price, amount, held = self.account.hold(pair, order_type, rate, amount)
+        order = self.new_order(ME, order_type, price, amount, held)
+        trades = self.execute(engine, order)
+        return {'orderNumber': str(order['number']), 'resultingTrades': trades}
+
+    def cancelOrder(self, orderNumber):
+        return self.call(self._cancel, orderNumber)
+
+    def _cancel(self, order_number):
+        engine, order = self.my_order(order_number)
+        engine.remove(order)
+        self.release(engine, order)
+        return {'success': 1}
+
+    def moveOrder(self, orderNumber, rate, amount=None, *args, **kwargs):
+        return self.call(self._move, orderNumber, rate, amount)
+
+    def _move(self, order_number, rate, amount):
+        """
+        cancels and places the order in one go. The order stays as it was if
+        the new one can't be placed.
+        """
+        engine, order = self.my_order(order_number)
+        if amount is None:
+            amount = from_satoshi(order['amount'])
+        engine.remove(order)
+        try:
+            retval = self.account.replace(
+                engine.pair, order, lambda: self._place(order['type'], engine.pair, rate, amount))
+        except RuntimeError:
+            engine.rest(order)
+            raise
+        return {'success': 1, 'orderNumber': retval['orderNumber'],
+                'resultingTrades': {engine.pair: retval['resultingTrades']}}
+
+
+PUBLIC_COMMANDS = ('returnOrderBook',)
+PRIVATE_COMMANDS = ('returnBalances', 'returnOpenOrders', 'returnTradeHistory', 'buy', 'sell',
+                    'cancelOrder', 'moveOrder')
+
+
+def serve_simulator(simulator, host='127.0.0.1', port=9200):
+    """
+    serves the simulator in the poloniex http format, GET /public and POST
+    /tradingApi with the command and its arguments. The keys and the nonce
+    are not checked. Runs until interrupted.
+    """
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlparse
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # the headers and the body go out in separate writes on a kept-alive
+        # connection, with Nagle the body waits for the delayed ack
+        disable_nagle_algorithm = True
+
+        def respond(self, commands, params):
+            command = params.pop('command', None)
+            params.pop('nonce', None)
+            if command not in commands:
+                retval = {'error': 'Invalid command.'}
+            else:
+                try:
+                    retval = getattr(simulator, command)(**params)
+                except (RuntimeError, TypeError, ValueError) as e:
+                    retval = {'error': str(e)}
+            body = json.dumps(retval).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/public':
+                self.send_error(404)
+                return
+            self.respond(PUBLIC_COMMANDS, dict(parse_qsl(url.query)))
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/tradingApi':
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8')
+            self.respond(PRIVATE_COMMANDS, dict(parse_qsl(body)))
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server((host, port), Handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def make_simulator(pairs, options):
+    """
+    simulator for the pairs from the simulator settings.
+    """
+    flows = {}
+    flow_settings = options.flow
+    for index, pair in enumerate(pairs):
+        if flow_settings.get('script'):
+            flows[pair] = ScriptFlow(flow_settings['script'], flow_settings.get('loop', False))
+        else:
+            random_settings = dict((key, value) for key, value in flow_settings.items()
+                                   if key not in ('script', 'loop'))
+            if random_settings.get('seed') is not None:
+                random_settings['seed'] += index
+            flows[pair] = RandomFlow(**random_settings)
+    return ExchangeSimulator(options.balances, flows, options.flow_steps, options.maker_fee,
+                             options.taker_fee, options.latency, options.jitter,
+                             options.rate_limit)
+
+
+def run_load_test(trader, simulator, ticks):
+    """
+    runs ticks scalping ticks of the trader against the simulator in the same
+    process with no waiting. trader.polo should be the simulator. Returns the
+    report: ticks per second and the time spent in the trader apart from the
+    simulated exchange.
+    """
+    trader.cancel_wait_time = 0
+    trader.exchange_wait_time = 0
+    busy = simulator.busy
+    calls = simulator.calls
+    started = time.time()
+    for _ in range(ticks):
+        trader.start_tick()
+        trader.load_market()
+        trader.scalp()
+        trader.end_tick()
+    elapsed = time.time() - started
+    exchange = simulator.busy - busy
+    return {
+        'ticks': ticks,
+        'seconds': round(elapsed, 3),
+        'ticks_per_second': int(ticks / elapsed) if elapsed else None,
+        'api_calls': simulator.calls - calls,
+        'exchange_seconds': round(exchange, 3),
+        'trader_seconds': round(elapsed - exchange, 3),
+        'trader_us_per_tick': round((elapsed - exchange) / ticks * 1000000, 1) if ticks else None,
+        'trades': simulator.trades,
+        'balances': simulator._balances(),
+    }
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Trader state snapshots for a warm restart.
+
+The state of a trader (its open orders, balances, the top of the book, the
+last decision and the orders it wanted) is saved as JSON after every tick.
+It is written to a temporary file that is renamed over the old one, so a
+crash leaves either the old or the new snapshot, never half of one. A tick
+that didn't change anything doesn't write.
+
+Money stays in satoshis in the file.
+"""
+import json
+import os
+import tempfile
+import time
+
+
+VERSION = 1
+
+
+def write_atomic(path, data, fsync=False):
+    """
+    replaces the file at path with data. With fsync the data is on the disk
+    before the rename, which also covers a crash of the machine.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(prefix='.state-', dir=directory)
+    try:
+        with os.fdopen(handle, 'w') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class StateFile(object):
+    """
+    the state snapshots of one trader.
+    """
+    def __init__(self, path, fsync=False, max_age=600):
+        self.path = path
+        self.fsync = fsync
+        # older snapshots are not resumed from, in seconds
+        self.max_age = max_age
+        self.last_body = None
+
+    def save(self, state):
+        """
+        writes the state if it changed since the last save. Returns True if
+        it was written.
+        """
+        body = json.dumps(state, sort_keys=True)
+        if body == self.last_body:
+            return False
+        entry = {'version': VERSION, 'saved': time.time(), 'state': state}
+        write_atomic(self.path, json.dumps(entry, sort_keys=True), self.fsync)
+        self.last_body = body
+        return True
+
+    def load(self):
+        """
+        the saved state, or None if there is none, it is unreadable, of
+        another version or too old.
+        """
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get('version') != VERSION:
+            return None
+        if self.max_age and time.time() - entry.get('saved', 0) > self.max_age:
+            return None
+        return entry['state']
+
+
+def make_state_file(options, pair):
+    """
+    state file of the pair from the state settings, None if there is no path.
+    """
+    if not options.path:
+        return None
+    return StateFile(options.path.format(pair=pair), options.fsync, options.max_age)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter sweep of the scalping settings over recorded market data.
+
+Every (parameter set x dataset) job is a backtest run in a process pool. The
+workers only get the path of a dataset (a recording or JSON lines) and
+memory-map the file themselves, so the recorded data is shared through the
+page cache instead of being pickled to each worker. The results are ranked
+by the total PnL over the datasets.
+"""
+import itertools
+import json
+import mmap
+import multiprocessing
+import random
+
+from .backtest import BacktestExchange, run_backtest
+from .recording import read_recording
+
+
+PARAMETERS = ('dust_total', 'dust_amount', 'min_spread', 'max_trading_amount')
+
+
+def mapped_events(path):
+    """
+    market events of a JSON lines file, read through a memory map.
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        for line in iter(data.readline, b''):
+            line = line.strip()
+            if line:
+                yield json.loads(line.decode('utf-8'))
+    finally:
+        data.close()
+
+
+def dataset_events(path):
+    """
+    market events of a recording (.rec) or a JSON lines file.
+    """
+    if path.endswith('.rec'):
+        return read_recording(path)
+    return mapped_events(path)
+
+
+def grid(space):
+    """
+    every combination of the values. space maps a parameter to a list of values.
+    """
+    names = sorted(space)
+    for values in itertools.product(*[space[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def samples(space, count, seed=None):
+    """
+    count random parameter sets. A parameter is a list to pick from or a
+    {'min': x, 'max': y} range.
+    """
+    rand = random.Random(seed)
+    for _ in range(count):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, dict):
+                params[name] = rand.uniform(values['min'], values['max'])
+            else:
+                params[name] = rand.choice(values)
+        yield params
+
+
+def run_job(trader_class, job):
+    """
+    one backtest. Runs in a worker process.
+    """
+    exchange_settings = job['exchange']
+    exchange = BacktestExchange('%s_%s' % (job['currency'], job['coin']),
+                                exchange_settings.get('currency_balance', 1.0),
+                                exchange_settings.get('coin_balance', 0.0),
+                                exchange_settings.get('maker_fee', 0.0015),
+                                exchange_settings.get('taker_fee', 0.0025))
+    params = job['params']
+    trader = trader_class(None, None, job['coin'], job['currency'],
+                          params['dust_total'], params['dust_amount'],
+                          params['min_spread'], params['max_trading_amount'],
+                          polo=exchange)
+    report = run_backtest(trader, exchange, dataset_events(job['data']), sample_every=0)
+    report.pop('inventory')
+    report['params'] = params
+    report['data'] = job['data']
+    return report
+
+
+class JobRunner(object):
+    """
+    picklable job function for the pool.
+    """
+    def __init__(self, trader_class):
+        self.trader_class = trader_class
+
+    def __call__(self, job):
+        return run_job(self.trader_class, job)
+
+
+def rank(reports):
+    """
+    results per parameter set over all the datasets, best total PnL first.
+    """
+    results = {}
+    for report in reports:
+        key = json.dumps(report['params'], sort_keys=True)
+        result = results.setdefault(key, {'params': report['params'], 'pnl': 0.0,
+                                          'orders_placed': 0, 'orders_filled': 0,
+                                          'fill_rates': [], 'runs': []})
+        result['pnl'] += float(report['pnl'])
+        result['orders_placed'] += report['orders_placed']
+        result['orders_filled'] += report['orders_filled']
+        result['fill_rates'].append(report['fill_rate'])
+        result['runs'].append({'data': report['data'], 'pnl': report['pnl'],
+                               'fill_rate': report['fill_rate']})
+    ranked = []
+    for result in results.values():
+        fill_rates = result.pop('fill_rates')
+        result['fill_rate'] = sum(fill_rates) / len(fill_rates)
+        ranked.append(result)
+    ranked.sort(key=lambda result: result['pnl'], reverse=True)
+    return ranked
+
+
+def run_sweep(trader_class, param_sets, datasets, coin, currency, defaults,
+              exchange_settings=None, processes=None):
+    """
+    backtests every parameter set on every dataset over a process pool and
+    returns the ranked results. defaults fill in the parameters a set
+    doesn't have.
+    """
+    jobs = []
+    for params in param_sets:
+        full = dict(defaults)
+        full.update(params)
+        for path in datasets:
+            jobs.append({'params': full, 'data': path, 'coin': coin, 'currency': currency,
+                         'exchange': exchange_settings or {}})
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        reports = list(pool.imap_unordered(JobRunner(trader_class), jobs))
+    finally:
+        pool.close()
+        pool.join()
+    return rank(reports)
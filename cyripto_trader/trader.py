@@ -0,0 +1,1305 @@
+# -*- coding: utf-8 -*-
+"""
+The trading logic: Trader runs the scalping, sell all and buy all loops on
+one currency pair, ConcurrentTrader sends the independent calls of a tick at
+the same time.
+"""
+import functools
+import logging
+import time
+
+from .event_log import fields, log
+from .ledger import pnl_fields
+from .metrics import timed
+from .order_book import OrderBook
+from .rate_limiter import TokenBucket
+from .reconcile import diff_orders
+from .satoshi import div_satoshi, from_satoshi, mul_satoshi, to_satoshi
+
+
+class Trader(object):
+    """Trader class
+    """
+    def __init__(self, api_key, api_secret, coin, currency, dust_total=10,
+                 dust_amount=100.0, min_spread=0.0001, max_trading_amount=1, polo=None,
+                 metrics=None):
+        # set currency pair
+        self.coin = coin
+        self.currency = currency
+        self.my_pair = '%s_%s' % (currency, coin)
+
+        # we'll need this while finding buy/sell prices
+        self.dust_total = self.make_satoshi(dust_total)
+        self.dust_amount = self.make_satoshi(dust_amount)
+        self.min_spread = self.make_satoshi(min_spread)
+        self.max_trading_amount = self.make_satoshi(max_trading_amount)
+
+        # initialize the poloniex api. traders of a portfolio share one client.
+        self.api_key = api_key
+        self.api_secret = api_secret
+        if polo is None:
+            from .transport import PoloniexClient
+            polo = PoloniexClient(api_key, api_secret)
+        self.polo = polo
+        # latency metrics, shared by the traders of a portfolio. None turns them off.
+        self.metrics = metrics
+        # time the current tick started, for the tick to order latency
+        self.tick_started = None
+        # state.StateFile the state is saved to after each tick, None for no saving
+        self.state_file = None
+        # order numbers of a resumed state, checked against the first open orders
+        self.resumed_orders = None
+        # ledger.FillIngester my fills are brought in with, None for no ledger
+        self.fills = None
+        # set when an order may have been filled since the fills were ingested
+        self.fills_pending = True
+        # scheduler.TickScheduler that sets the wait between the ticks, None
+        # for exchange_wait_time
+        self.scheduler = None
+        # time the balances were loaded, and whether orders went out or were
+        # canceled since. the book amounts at my order prices then.
+        self.balances_loaded = None
+        self.orders_sent = True
+        self.watched_levels = {}
+        # risk.RiskGate the orders are checked with, None for no checks
+        self.risk = None
+
+        # initialize other variables
+        self.coin_balance = self.make_satoshi('0.0')
+        self.currency_balance = self.make_satoshi('0.0')
+        self.total_coin_balance = self.make_satoshi('0.0')
+        self.total_currency_balance = self.make_satoshi('0.0')
+
+        self.open_orders_raw = []
+        self.open_orders = []
+        self.open_orders_sell = []
+        self.open_orders_buy = []
+        # (type, price) -> my open orders at that price
+        self.open_orders_index = {}
+
+        self.order_book_raw = []
+        # persistent book, synced from the snapshots and kept between ticks.
+        self.book = OrderBook()
+        self.order_book = {}
+        self.order_book["buy"] = self.book.sides["buy"]
+        self.order_book["sell"] = self.book.sides["sell"]
+
+        self.sell_price = self.make_satoshi('0.0')
+        self.buy_price = self.make_satoshi('0.0')
+        self.price_spread = self.make_satoshi('0.0')
+        self.sell_amount = self.make_satoshi('0.0')
+        self.buy_amount = self.make_satoshi('0.0')
+        self.trade = False
+        self.last_trade = None
+        # prices of the last scalp decision in the streaming mode
+        self.last_prices = None
+        # the orders the last reconcile_orders wanted
+        self.intent = []
+
+        # those are hardcoded. may be added to settings later.
+        self.min_currency_balance = self.make_satoshi('0.00100000')
+        # '0.00000001' balances are no balances. also taken off the buy amounts.
+        self.dust_balance = self.make_satoshi('0.00000001')
+        # the prices are put this much inside the first non dust orders.
+        self.price_margin = self.make_satoshi('0.00000003')
+        # seconds to wait for exchange rate limits.
+        self.exchange_wait_time = 0.8
+        # seconds to wait after canceling an order.
+        self.cancel_wait_time = 0.2
+        # orders off the desired amount by less than this ratio are not resized.
+        self.resize_min_change = 0.01
+        # price levels the sell/buy amount is spread over. level k is where the
+        # dust thresholds times k + 1 are reached in the book.
+        self.ladder_levels = 1
+        # smallest order total the exchange takes.
+        self.min_order_total = self.make_satoshi('0.00010000')
+        # seconds the balances are kept when no order could have been filled.
+        self.balance_max_age = 60
+
+
+    def make_satoshi(self, num):
+        """
+        int number of satoshis. all the money is kept in satoshis, use
+        from_satoshi when sending it to the exchange.
+        """
+        return to_satoshi(num)
+
+
+    def call(self, method, *args, **kwargs):
+        """
+        calls the api method. Every exchange call of the trader goes through
+        here.
+        """
+        return getattr(self.polo, method)(*args, **kwargs)
+
+
+    @timed('load_open_orders')
+    def load_open_orders(self):
+        """
+        loads open orders. Resets the balances so load_balances method should be called after.
+        """
+        return self.process_open_orders(self.call('returnOpenOrders', currencyPair=self.my_pair))
+
+
+    def process_open_orders(self, open_orders_raw):
+        if self.resumed_orders is not None:
+            self.check_resumed_orders(open_orders_raw)
+        if not self.fills_pending and self.open_orders:
+            self.fills_pending = self.orders_filled(open_orders_raw)
+        if self.risk is not None:
+            self.risk.reset_open(self.my_pair)
+        self.total_coin_balance = self.make_satoshi('0.0')
+        self.total_currency_balance = self.make_satoshi('0.0')
+        self.open_orders_raw = open_orders_raw
+        self.open_orders = []
+        self.open_orders_sell = []
+        self.open_orders_buy = []
+        self.open_orders_index = {}
+        for item in self.open_orders_raw:
+            order = {}
+            order['type'] = item['type']
+            order["order_number"] = item['orderNumber']
+            order["price"] = self.make_satoshi(item['rate'])
+            order["amount"] = self.make_satoshi(item['amount'])
+            order["total"] = mul_satoshi(order['price'], order['amount'])
+            order["starting_amount"] = self.make_satoshi(item['startingAmount'])
+
+            self.add_open_order(order)
+            if order['type'] == 'sell':
+                self.total_coin_balance = self.total_coin_balance + order["amount"]
+            else:
+                self.total_currency_balance = self.total_currency_balance + order["total"]
+
+        return self.open_orders
+
+
+    def orders_filled(self, open_orders_raw):
+        """
+        True if one of the orders we know of is gone or smaller in the loaded
+        open orders, some of it may have been filled.
+        """
+        amounts = dict((str(item['orderNumber']), item['amount']) for item in open_orders_raw)
+        for order in self.open_orders:
+            amount = amounts.get(str(order['order_number']))
+            if amount is None or self.make_satoshi(amount) < order['amount']:
+                return True
+        return False
+
+
+    def add_open_order(self, order):
+        """
+        adds the order to the open order lists and the (type, price) index.
+        """
+        self.open_orders.append(order)
+        if order['type'] == 'sell':
+            self.open_orders_sell.append(order)
+        else:
+            self.open_orders_buy.append(order)
+        self.open_orders_index.setdefault((order['type'], order['price']), []).append(order)
+        if self.risk is not None:
+            self.risk.open_order(self.my_pair, order)
+
+
+    def remove_open_order(self, order):
+        self.open_orders.remove(order)
+        if order['type'] == 'sell':
+            self.open_orders_sell.remove(order)
+        else:
+            self.open_orders_buy.remove(order)
+        key = (order['type'], order['price'])
+        orders = self.open_orders_index.get(key)
+        if orders is not None:
+            orders.remove(order)
+            if not orders:
+                del self.open_orders_index[key]
+        if self.risk is not None:
+            self.risk.open_order(self.my_pair, order, -1)
+
+
+    def add_placed_order(self, order_type, price, amount, retval):
+        """
+        keeps track of an order we just sent, until the next load_open_orders.
+        """
+        if not retval or 'orderNumber' not in retval:
+            return None
+        # some of it may be filled right away
+        trades = retval.get('resultingTrades') or []
+        if isinstance(trades, dict):
+            # moveOrder groups them by pair
+            trades = [trade for pair_trades in trades.values() for trade in pair_trades]
+        for trade in trades:
+            amount = amount - self.make_satoshi(trade['amount'])
+        if trades:
+            self.fills_pending = True
+        if amount <= 0:
+            return None
+        order = {}
+        order['type'] = order_type
+        order["order_number"] = retval['orderNumber']
+        order["price"] = price
+        order["amount"] = amount
+        order["total"] = mul_satoshi(price, amount)
+        order["starting_amount"] = amount
+        self.add_open_order(order)
+        return order
+
+
+    def log_fields(self, **kwargs):
+        """
+        extra of a log call about this pair.
+        """
+        return fields(pair=self.my_pair, **kwargs)
+
+
+    def order_fields(self, order):
+        return {'order_number': order['order_number'], 'type': order['type'],
+                'price': from_satoshi(order['price']), 'amount': from_satoshi(order['amount'])}
+
+
+    def start_tick(self):
+        self.tick_started = time.time()
+        if self.risk is not None:
+            self.risk.poll()
+
+
+    def end_tick(self):
+        """
+        ingests the fills, saves the state, observes the tick and logs the
+        metrics summary when it is due.
+        """
+        self.ingest_fills()
+        self.save_state()
+        if self.metrics is None or self.tick_started is None:
+            return
+        self.metrics.observe('tick', time.time() - self.tick_started)
+        summary = self.metrics.due_summary()
+        if summary:
+            log.info('metrics', extra=fields(summary=summary))
+
+
+    def observe_order(self):
+        """
+        an order went out: the balances change, and the time from the start
+        of the tick to it is observed.
+        """
+        self.orders_sent = True
+        if self.metrics is not None and self.tick_started is not None:
+            self.metrics.observe_order(time.time() - self.tick_started)
+
+
+    @timed('load_fills')
+    def ingest_fills(self):
+        """
+        brings the new fills into the ledger, only when an order may have
+        been filled since the last time. Returns the new fills.
+        """
+        if self.fills is None or not self.fills_pending:
+            return []
+        try:
+            new_fills = self.fills.ingest()
+        except RuntimeError:
+            # still pending, tried again next tick
+            log.exception('fills not loaded', extra=self.log_fields())
+            return []
+        self.fills_pending = False
+        for fill in new_fills:
+            log.info('fill', extra=self.log_fields(
+                order_number=fill['order_number'], type=fill['type'],
+                price=from_satoshi(fill['price']), amount=from_satoshi(fill['amount']),
+                fee=from_satoshi(fill['fee'])))
+        if new_fills and self.risk is not None:
+            self.risk.set_realized(self.my_pair, self.fills.ledger.position(self.my_pair).realized)
+        if new_fills:
+            pnl = pnl_fields(self.pnl())
+            del pnl['pair']
+            log.info('pnl', extra=self.log_fields(**pnl))
+        return new_fills
+
+
+    def pnl(self):
+        """
+        position and PnL of the pair from the ledger, marked at the mid price.
+        """
+        bid = self.book.best_bid()
+        ask = self.book.best_ask()
+        mark = (bid + ask) // 2 if bid and ask else None
+        return self.fills.ledger.pnl(self.my_pair, mark)
+
+
+    def state(self):
+        """
+        what a restart needs to pick up where this left off. Money in satoshis.
+        """
+        return {
+            'pair': self.my_pair,
+            'open_orders': self.open_orders,
+            'balances': {'coin': self.coin_balance, 'currency': self.currency_balance,
+                         'total_coin': self.total_coin_balance,
+                         'total_currency': self.total_currency_balance,
+                         'loaded': self.balances_loaded},
+            'book': {'seq': self.book.seq, 'bid': self.book.best_bid(),
+                     'ask': self.book.best_ask()},
+            'watched': [[order_type, price, amount]
+                        for (order_type, price), amount in sorted(self.watched_levels.items())],
+            'decision': {'trade': self.trade, 'sell_price': self.sell_price,
+                         'buy_price': self.buy_price},
+            'intent': self.intent,
+        }
+
+
+    def save_state(self):
+        if self.state_file is None:
+            return
+        try:
+            self.state_file.save(self.state())
+        except (IOError, OSError):
+            log.exception('state not saved', extra=self.log_fields(path=self.state_file.path))
+
+
+    def restore_state(self, state):
+        """
+        takes the open orders, balances and the last decision of a saved state.
+        They are used until they are as old as loaded ones would be reloaded,
+        or the book shows one of the orders may have been filled.
+        """
+        self.process_open_orders([])
+        for order in state['open_orders']:
+            self.add_open_order(dict(order))
+        balances = state['balances']
+        self.coin_balance = balances['coin']
+        self.currency_balance = balances['currency']
+        self.total_coin_balance = balances['total_coin']
+        self.total_currency_balance = balances['total_currency']
+        if self.risk is not None:
+            self.risk.set_position(self.my_pair, self.total_coin_balance)
+        self.balances_loaded = balances.get('loaded')
+        self.orders_sent = False
+        self.watched_levels = dict(((order_type, price), amount)
+                                   for order_type, price, amount in state.get('watched', []))
+        decision = state['decision']
+        self.trade = decision['trade']
+        self.sell_price = decision['sell_price']
+        self.buy_price = decision['buy_price']
+        self.intent = state['intent']
+
+
+    def resume(self):
+        """
+        restores the saved state if there is a recent one of this pair. The
+        first open orders loaded after it are checked against it. Returns True
+        if it resumed.
+        """
+        if self.state_file is None:
+            return False
+        state = self.state_file.load()
+        if not state or state.get('pair') != self.my_pair:
+            log.info('no state to resume', extra=self.log_fields(path=self.state_file.path))
+            return False
+        self.restore_state(state)
+        self.resumed_orders = set(order['order_number'] for order in self.open_orders)
+        log.info('resumed', extra=self.log_fields(
+            open_orders=len(self.open_orders), trade=self.trade,
+            intent=len(self.intent)))
+        return True
+
+
+    def check_resumed_orders(self, open_orders_raw):
+        """
+        compares the first open orders after a resume with the saved ones.
+        Saved orders that are gone were filled or canceled while we were down.
+        """
+        known = self.resumed_orders
+        self.resumed_orders = None
+        numbers = set(str(item['orderNumber']) for item in open_orders_raw)
+        gone = set(str(number) for number in known) - numbers
+        unknown = numbers - set(str(number) for number in known)
+        log.info('resumed orders checked', extra=self.log_fields(
+            kept=len(numbers) - len(unknown), gone=sorted(gone), unknown=sorted(unknown)))
+
+
+    @timed('load_balances')
+    def load_balances(self):
+        # first load the open orders to get the balances in open orders.
+        self.load_open_orders()
+        # request from exchange
+        self.process_balances(self.call('returnBalances'))
+        self.balances_loaded = time.time()
+        self.orders_sent = False
+
+
+    def watch_levels(self):
+        """
+        remembers the book amounts at the prices of my open orders.
+        """
+        self.watched_levels = {}
+        for key in self.open_orders_index:
+            side = self.book.sides[key[0]]
+            index = side.index(key[1])
+            self.watched_levels[key] = side.amounts[index] if index is not None else 0
+
+
+    def orders_touched(self):
+        """
+        True if the book has less at the price of one of my open orders than
+        when it was watched, or went through it. Some of it may be filled.
+        """
+        bid = self.book.best_bid()
+        ask = self.book.best_ask()
+        for (order_type, price), amount in self.watched_levels.items():
+            if order_type == 'sell' and bid is not None and bid >= price:
+                return True
+            if order_type == 'buy' and ask is not None and ask <= price:
+                return True
+            side = self.book.sides[order_type]
+            index = side.index(price)
+            if index is None or side.amounts[index] < amount:
+                return True
+        return False
+
+
+    def balances_stale(self):
+        """
+        True if the balances and open orders need loading: orders went out or
+        were canceled, one may have been filled, or they are too old.
+        """
+        if self.orders_sent or self.balances_expired():
+            return True
+        return bool(self.open_orders) and self.orders_touched()
+
+
+    def balances_expired(self):
+        """
+        True if the balances and open orders were never loaded or are too old.
+        """
+        if self.balances_loaded is None:
+            return True
+        return time.time() - self.balances_loaded > self.balance_max_age
+
+
+    def process_balances(self, balances):
+        """
+        sets the balances. process_open_orders should be called before.
+        """
+        self.balances = balances
+        # set the coin balance
+        self.coin_balance = self.make_satoshi(self.balances[self.coin])
+        self.total_coin_balance = self.total_coin_balance + self.coin_balance
+        # '0.00000001' makes things complicated. get rid of it.
+        if self.coin_balance <= self.dust_balance:
+            self.coin_balance = self.make_satoshi('0.0')
+        if self.total_coin_balance <= self.dust_balance:
+            self.total_coin_balance = self.make_satoshi('0.0')
+        # set the main currency balance
+        self.currency_balance = self.make_satoshi(self.balances[self.currency])
+        self.total_currency_balance = self.total_currency_balance + self.currency_balance
+        # '0.00000001' makes things complicated. get rid of it.
+        if self.currency_balance <= self.dust_balance:
+            self.currency_balance = self.make_satoshi('0.0')
+        if self.total_currency_balance <= self.dust_balance:
+            self.total_currency_balance = self.make_satoshi('0.0')
+        if self.risk is not None:
+            self.risk.set_position(self.my_pair, self.total_coin_balance)
+        # added for debugging. make the BTC amount > 0 so we can test buying.
+        # self.total_currency_balance = self.make_satoshi('0.10000000')
+
+
+    @timed('load_order_book')
+    def load_order_book(self):
+        return self.apply_order_book(self.call('returnOrderBook', currencyPair=self.my_pair,
+                                               depth='200'))
+
+
+    def apply_order_book(self, order_book_raw):
+        self.order_book_raw = order_book_raw
+        # only the levels that changed since the last tick are updated.
+        self.book.apply_snapshot(self.order_book_raw["bids"],
+                                 self.order_book_raw["asks"],
+                                 self.order_book_raw.get("seq"))
+        self.process_order_book('buy')
+        self.process_order_book('sell')
+        return self.order_book
+
+
+    @timed('process_order_book')
+    def process_order_book(self, order_type):
+        """
+        marks my orders in the order book. put order number from open_orders
+        """
+        owned = {}
+        for (open_type, price), open_orders in self.open_orders_index.items():
+            if open_type == order_type:
+                owned[price] = open_orders[-1]['order_number']
+        self.book.sides[order_type].set_owned(owned)
+
+        self.order_book[order_type] = self.book.sides[order_type]
+        return self.order_book[order_type]
+
+
+    @timed('load_market')
+    def load_market(self):
+        """
+        loads everything a tick needs: the order book, and the open orders
+        and balances if they may have changed.
+        """
+        self.load_order_book()
+        if self.balances_stale():
+            self.load_balances()
+            # my orders in the book again
+            self.process_order_book('buy')
+            self.process_order_book('sell')
+        self.watch_levels()
+
+
+    def tick_wait(self):
+        """
+        seconds to wait before the next tick.
+        """
+        if self.scheduler is None:
+            return self.exchange_wait_time
+        # the book, the balances and open orders, and a call per open order
+        calls = 3 + len(self.open_orders)
+        return self.scheduler.next_wait(self.book, len(self.open_orders), calls)
+
+
+    def wait_next_tick(self):
+        wait = self.tick_wait()
+        log.debug('next tick', extra=self.log_fields(wait=round(wait, 3)))
+        time.sleep(wait)
+
+
+    def find_sell_price(self):
+        # first level that is not mine with amount >= dust_amount or where
+        # the levels that are not mine add up to dust_total
+        side = self.book.sides['sell']
+        index = side.find_dust_level(self.dust_amount, self.dust_total)
+        if index is not None:
+            return side.prices[index] - self.price_margin
+
+        return False
+
+
+    def find_buy_price(self):
+        # first level that is not mine with amount >= dust_amount or where
+        # the levels that are not mine add up to dust_total
+        side = self.book.sides['buy']
+        index = side.find_dust_level(self.dust_amount, self.dust_total)
+        if index is not None:
+            return side.prices[index] + self.price_margin
+
+        return False
+
+
+    def find_ladder_prices(self, order_type):
+        """
+        prices of the ladder levels, best first. Level k is put inside the
+        first level that is not mine where the dust thresholds times k + 1
+        are reached, levels that land on the same price are merged.
+        """
+        side = self.book.sides[order_type]
+        if order_type == 'sell':
+            margin = -self.price_margin
+        else:
+            margin = self.price_margin
+        prices = []
+        for level in range(1, self.ladder_levels + 1):
+            index = side.find_dust_level(self.dust_amount * level, self.dust_total * level)
+            if index is None:
+                break
+            price = side.prices[index] + margin
+            if not prices or price != prices[-1]:
+                prices.append(price)
+        return prices
+
+
+    def ladder(self, order_type, prices, amount=None, currency=None):
+        """
+        the desired orders of the amount (of the coin), or of the currency
+        for buys, spread equally over the prices. Fewer levels are used when
+        the parts would be under the minimum order total.
+        """
+        levels = len(prices)
+        if currency is not None:
+            while levels > 1 and currency // levels < self.min_order_total:
+                levels -= 1
+        else:
+            while levels > 1 and mul_satoshi(amount // levels, prices[0]) < self.min_order_total:
+                levels -= 1
+        desired = []
+        for level, price in enumerate(prices[:levels]):
+            if currency is not None:
+                part = currency // levels
+                level_amount = div_satoshi(part, price) - self.dust_balance
+            else:
+                level_amount = amount // levels
+                if level == 0:
+                    level_amount += amount % levels
+            if level_amount > 0:
+                desired.append({'type': order_type, 'price': price, 'amount': level_amount})
+        return desired
+
+
+    @timed('decide_to_trade')
+    def decide_to_trade(self):
+        self.sell_price = self.find_sell_price()
+        self.buy_price = self.find_buy_price()
+        self.price_spread = self.sell_price - self.buy_price
+
+        if (not self.sell_price) or (not self.buy_price):
+            log.warning('no sell or buy price, will not trade', extra=self.log_fields(
+                sell_price=from_satoshi(self.sell_price) if self.sell_price else None,
+                buy_price=from_satoshi(self.buy_price) if self.buy_price else None))
+            self.trade = False
+            return False
+
+
+        if self.total_currency_balance > self.min_currency_balance and self.can_buy():
+            self.trade = 'buy'
+        else:
+            if self.price_spread >= self.min_spread:
+                # sell or buy?
+                if self.total_coin_balance > 0:
+                    self.trade = 'sell'
+                else:
+                    self.trade = False
+            else:
+                self.trade = False
+
+        if log.isEnabledFor(logging.INFO):
+            log.info('decision', extra=self.log_fields(
+                trade=self.trade, sell_price=from_satoshi(self.sell_price),
+                buy_price=from_satoshi(self.buy_price),
+                spread=from_satoshi(self.price_spread),
+                currency_balance=from_satoshi(self.total_currency_balance),
+                coin_balance=from_satoshi(self.total_coin_balance)))
+
+        return bool(self.trade)
+
+
+    @timed('cancel_order')
+    def send_cancel(self, order):
+        self.orders_sent = True
+        try:
+            retval = self.call('cancelOrder', order["order_number"])
+        except RuntimeError:
+            retval = False
+            log.exception('cancel failed', extra=self.log_fields(**self.order_fields(order)))
+        else:
+            log.info('order canceled', extra=self.log_fields(**self.order_fields(order)))
+        return retval
+
+
+    def cancel_orders(self, orders):
+        """
+        cancels the orders one after the other with no waiting in between.
+        """
+        for order in orders:
+            self.send_cancel(order)
+            self.remove_open_order(order)
+
+
+    def cancel_open_orders(self, buy_sell):
+        self.cancel_orders([order for order in self.open_orders if order['type'] == buy_sell])
+
+
+    def cancel_open_order(self, order):
+        self.send_cancel(order)
+        if self.cancel_wait_time:
+            time.sleep(self.cancel_wait_time)
+        self.remove_open_order(order)
+
+
+    def risk_check(self, order_type, price, amount, extra=0):
+        """
+        True if the risk checks let the order go out. extra is the coin of
+        other orders of its batch that are not open yet.
+        """
+        if self.risk is None:
+            return True
+        reason = self.risk.check(self.my_pair, order_type, price, amount,
+                                 self.book.best_bid(), self.book.best_ask(), extra)
+        if reason is None:
+            return True
+        log.warning('order blocked', extra=self.log_fields(
+            reason=reason, type=order_type, price=from_satoshi(price),
+            amount=from_satoshi(amount)))
+        return False
+
+
+    def buy_room(self, price):
+        """
+        the most coin the buy orders may hold at the price within the risk
+        limits, None for no limit.
+        """
+        if self.risk is None:
+            return None
+        return self.risk.buy_room(self.my_pair, price, self.book.best_bid(),
+                                  self.book.best_ask())
+
+
+    def can_buy(self):
+        """
+        False if the risk limits leave no room for a buy order at the buy
+        price the exchange would take, then the coin is sold instead.
+        """
+        if self.buy_room(self.buy_price) is None:
+            return True
+        return mul_satoshi(self.find_buy_amount(), self.buy_price) >= self.min_order_total
+
+
+    def allowed_orders(self, wants):
+        """
+        the desired orders the risk checks let go out, checked as one batch.
+        """
+        if self.risk is None:
+            return wants
+        allowed = []
+        extra = {'buy': 0, 'sell': 0}
+        for want in wants:
+            if self.risk_check(want['type'], want['price'], want['amount'], extra[want['type']]):
+                allowed.append(want)
+                extra[want['type']] += want['amount']
+        return allowed
+
+
+    def allowed_moves(self, moves):
+        if self.risk is None:
+            return moves
+        allowed = []
+        extra = {'buy': 0, 'sell': 0}
+        for order, want in moves:
+            change = want['amount'] - order['amount']
+            if self.risk_check(order['type'], want['price'], want['amount'],
+                               extra[order['type']] - order['amount']):
+                allowed.append((order, want))
+                extra[order['type']] += change
+        return allowed
+
+
+    @timed('place_order')
+    def send_order(self, order_type, price, amount, checked=False):
+        """
+        sends a new order. Returns the answer of the exchange, False if it
+        failed or None if the risk checks blocked it. checked skips them.
+        """
+        if not checked and not self.risk_check(order_type, price, amount):
+            return None
+        try:
+            if order_type == 'sell':
+                retval = self.call('sell', currencyPair=self.my_pair, rate=from_satoshi(price),
+                                   amount=from_satoshi(amount))
+            else:
+                retval = self.call('buy', currencyPair=self.my_pair, rate=from_satoshi(price),
+                                   amount=from_satoshi(amount))
+        except RuntimeError:
+            log.exception('order failed', extra=self.log_fields(
+                type=order_type, price=from_satoshi(price), amount=from_satoshi(amount)))
+            retval = False
+
+        self.observe_order()
+        return retval
+
+
+    def track_placed(self, order_type, price, amount, retval):
+        order = self.add_placed_order(order_type, price, amount, retval)
+        if retval:
+            log.info('order placed', extra=self.log_fields(
+                type=order_type, price=from_satoshi(price), amount=from_satoshi(amount),
+                order_number=retval.get('orderNumber'), open=order is not None))
+
+
+    def place_order(self, order_type, price, amount):
+        """
+        sends a new order and keeps track of it.
+        """
+        retval = self.send_order(order_type, price, amount)
+        self.track_placed(order_type, price, amount, retval)
+        return retval
+
+
+    def place_orders(self, wants):
+        """
+        places the desired orders, {'type', 'price', 'amount'}, one after the
+        other with no waiting in between.
+        """
+        for want in wants:
+            self.place_order(want['type'], want['price'], want['amount'])
+
+
+    @timed('move_order')
+    def send_move(self, order, price, amount, checked=False):
+        """
+        moves the order to the new price and amount with one call. Returns
+        the answer of the exchange, False if it failed or None if the risk
+        checks blocked it.
+        """
+        if not checked and not self.risk_check(order['type'], price, amount, -order['amount']):
+            return None
+        try:
+            retval = self.call('moveOrder', orderNumber=order['order_number'],
+                               rate=from_satoshi(price), amount=from_satoshi(amount))
+        except RuntimeError:
+            log.exception('move failed', extra=self.log_fields(**self.order_fields(order)))
+            retval = False
+        self.observe_order()
+        return retval
+
+
+    def track_moved(self, order, price, amount, retval):
+        """
+        the old order is dropped either way, the next load_open_orders has
+        the truth. A blocked move didn't go out, the order stays.
+        """
+        if retval is None:
+            return
+        self.remove_open_order(order)
+        self.add_placed_order(order['type'], price, amount, retval)
+        if retval:
+            log.info('order moved', extra=self.log_fields(
+                old_price=from_satoshi(order['price']), price=from_satoshi(price),
+                amount=from_satoshi(amount), order_number=retval.get('orderNumber'),
+                type=order['type']))
+
+
+    def move_order(self, order, price, amount):
+        retval = self.send_move(order, price, amount)
+        self.track_moved(order, price, amount, retval)
+        return retval
+
+
+    def move_orders(self, moves):
+        """
+        moves the orders, a list of (order, desired) pairs, one after the other.
+        """
+        for order, want in moves:
+            self.move_order(order, want['price'], want['amount'])
+
+
+    def reconcile_orders(self, desired):
+        """
+        brings my open orders in line with the desired ones, a list of
+        {'type', 'price', 'amount'}, with the fewest calls. see reconcile.
+        """
+        self.intent = desired
+        plan = diff_orders(desired, self.open_orders, self.resize_min_change)
+        if log.isEnabledFor(logging.DEBUG):
+            for order in plan['keep']:
+                log.debug('order is ok', extra=self.log_fields(**self.order_fields(order)))
+        if plan['cancel']:
+            self.cancel_orders(plan['cancel'])
+            if (plan['move'] or plan['place']) and self.cancel_wait_time:
+                # let the exchange free the balance of the canceled orders
+                time.sleep(self.cancel_wait_time)
+        if plan['move']:
+            # the moves that take an order down go first, so the ones that
+            # grow one are checked against the smaller open orders
+            self.move_orders(sorted(plan['move'],
+                                    key=lambda move: move[1]['amount'] - move[0]['amount']))
+        if plan['place']:
+            self.place_orders(plan['place'])
+
+        return plan
+
+
+    def find_sell_amount(self):
+        if self.total_coin_balance > self.max_trading_amount:
+            return self.max_trading_amount
+        return self.total_coin_balance
+
+
+    def find_buy_amount(self):
+        if self.total_currency_balance > self.make_satoshi('0.00001000'):
+            amount = div_satoshi(self.total_currency_balance, self.buy_price) - self.dust_balance
+            room = self.buy_room(self.buy_price)
+            if room is not None and amount > room:
+                amount = room
+            return amount
+        return 0
+
+
+    def sell(self):
+        # one sell order at the sell price, or a ladder from it, and no buy orders.
+        self.sell_amount = self.find_sell_amount()
+        if self.ladder_levels > 1:
+            prices = self.find_ladder_prices('sell') or [self.sell_price]
+            self.reconcile_orders(self.ladder('sell', prices, amount=self.sell_amount))
+            return
+        self.reconcile_orders([{'type': 'sell', 'price': self.sell_price,
+                                'amount': self.sell_amount}])
+
+
+    def buy(self):
+        # one buy order at the buy price, or a ladder from it, and no sell orders.
+        self.buy_amount = self.find_buy_amount()
+        desired = []
+        if self.buy_amount > 0 and self.ladder_levels > 1:
+            prices = self.find_ladder_prices('buy') or [self.buy_price]
+            currency = self.total_currency_balance
+            # the lowest price buys the most coin
+            room = self.buy_room(prices[-1])
+            if room is not None:
+                currency = min(currency, mul_satoshi(room, prices[-1]))
+            desired = self.ladder('buy', prices, currency=currency)
+        elif self.buy_amount > 0:
+            desired.append({'type': 'buy', 'price': self.buy_price, 'amount': self.buy_amount})
+        else:
+            log.info('buying amount is low, not buying', extra=self.log_fields())
+        self.reconcile_orders(desired)
+
+
+    def scalp(self):
+        if self.risk is not None and self.risk.killed is not None:
+            # no new orders and none left open
+            log.warning('kill switch on', extra=self.log_fields(reason=self.risk.killed))
+            self.cancel_open_orders('buy')
+            self.cancel_open_orders('sell')
+            self.trade = False
+            return False
+
+        # trade or not trade?
+        trade = self.decide_to_trade()
+
+        if self.trade == 'sell':
+            self.sell()
+        elif self.trade == 'buy':
+            self.buy()
+        else:
+            #Will not trade. Cancel all orders.
+            self.cancel_open_orders('buy')
+            self.cancel_open_orders('sell')
+
+        return trade
+
+
+    def run_scalping(self):
+        self.resume()
+        while True:
+            self.start_tick()
+            self.load_market()
+            self.scalp()
+            self.end_tick()
+
+            self.wait_next_tick()
+
+
+    def apply_market_event(self, event):
+        """
+        applies a push feed event to the order book. Returns False if the book
+        is out of sync and needs a new snapshot.
+        """
+        if event['type'] == 'snapshot':
+            self.book.apply_snapshot(event['bids'], event['asks'], event.get('seq'))
+        elif event['type'] == 'update':
+            return self.book.apply_updates(event.get('seq'), event['changes'])
+        elif event['type'] == 'trade':
+            self.last_trade = event
+        return True
+
+
+    def trade_hits_my_orders(self, trade):
+        """
+        True if the trade may have filled one of my orders.
+        """
+        price = self.make_satoshi(trade['price'])
+        if trade['trade_type'] == 'buy':
+            return any(order['price'] <= price for order in self.open_orders_sell)
+        return any(order['price'] >= price for order in self.open_orders_buy)
+
+
+    def run_streaming(self, feed):
+        """
+        scalping driven by a push feed. decide_to_trade runs only when the
+        prices found within the dust thresholds change or one of my orders may
+        have been filled. The REST order book is only used to recover from a gap.
+        """
+        feed.subscribe(self.my_pair)
+        if not self.resume() or self.balances_expired():
+            self.load_balances()
+        self.last_prices = None
+        for event in feed.events():
+            self.on_market_event(event)
+
+
+    def on_market_event(self, event):
+        """
+        handles one push feed event. Returns True if the scalp logic ran.
+        """
+        if event.get('pair') != self.my_pair:
+            return False
+        self.start_tick()
+        if not self.apply_market_event(event):
+            log.debug('order book is out of sync, loading a snapshot',
+                      extra=self.log_fields())
+            self.load_order_book()
+        if not self.book.synced:
+            return False
+
+        if event['type'] == 'trade' and self.trade_hits_my_orders(event):
+            self.load_balances()
+            self.last_prices = None
+
+        self.process_order_book('buy')
+        self.process_order_book('sell')
+        prices = (self.find_sell_price(), self.find_buy_price())
+        if prices == self.last_prices:
+            return False
+        self.last_prices = prices
+
+        self.scalp()
+        self.end_tick()
+        return True
+
+
+    def add_sell_all_order(self):
+        # compute the amount
+        self.sell_amount = self.total_coin_balance
+
+        if self.sell_amount and self.risk_check('sell', self.sell_price, self.sell_amount):
+            # send order to exchange
+            try:
+                retval = self.call('sell', currencyPair=self.my_pair,
+                                   rate=from_satoshi(self.sell_price),
+                                   amount=from_satoshi(self.sell_amount))
+            except RuntimeError:
+                log.exception('sell all order failed', extra=self.log_fields(
+                    price=from_satoshi(self.sell_price), amount=from_satoshi(self.sell_amount)))
+                retval = False
+
+            self.observe_order()
+            self.add_placed_order('sell', self.sell_price, self.sell_amount, retval)
+            if retval:
+                log.info('sell all order placed', extra=self.log_fields(
+                    price=from_satoshi(self.sell_price), amount=from_satoshi(self.sell_amount),
+                    order_number=retval.get('orderNumber')))
+
+            return retval
+        else:
+            return False
+
+
+    def sell_all(self):
+        # cancel all buy orders first.
+        self.cancel_open_orders('buy')
+        # check open sell orders if the sell price is ok.
+        for order in list(self.open_orders_sell):
+            if order['price'] == self.sell_price:
+                log.debug('order is ok', extra=self.log_fields(**self.order_fields(order)))
+            else:
+                # cancel the order.
+                retval = self.cancel_open_order(order)
+
+        if len(self.open_orders_sell) == 0:
+            retval = self.add_sell_all_order()
+
+
+    def run_sell_all(self):
+        self.trade = 'sell'
+        while self.trade == 'sell':
+            self.start_tick()
+            self.load_market()
+
+            self.sell_price = self.find_sell_price()
+
+            if self.total_coin_balance > 0.0:
+                self.trade = 'sell'
+            else:
+                self.trade = False
+            log.info('decision', extra=self.log_fields(
+                trade=self.trade, sell_price=from_satoshi(self.sell_price),
+                coin_balance=from_satoshi(self.total_coin_balance)))
+
+            if self.trade == 'sell':
+                self.sell_all()
+            else:
+                #Will not trade. Cancel all orders.
+                self.cancel_open_orders('buy')
+                self.cancel_open_orders('sell')
+
+            self.end_tick()
+
+            self.wait_next_tick()
+
+
+    def add_buy_all_order(self):
+        # compute the amount, within the risk limits
+        self.buy_amount = self.find_buy_amount()
+        if self.buy_amount <= 0:
+            log.info('buying amount is low, not buying', extra=self.log_fields())
+            return False
+        if not self.risk_check('buy', self.buy_price, self.buy_amount):
+            return False
+
+        # send order to exchange
+        try:
+            retval = self.call('buy', currencyPair=self.my_pair, rate=from_satoshi(self.buy_price),
+                               amount=from_satoshi(self.buy_amount))
+        except RuntimeError:
+            log.exception('buy all order failed', extra=self.log_fields(
+                price=from_satoshi(self.buy_price), amount=from_satoshi(self.buy_amount)))
+            retval = False
+
+        self.observe_order()
+        self.add_placed_order('buy', self.buy_price, self.buy_amount, retval)
+        if retval:
+            log.info('buy all order placed', extra=self.log_fields(
+                price=from_satoshi(self.buy_price), amount=from_satoshi(self.buy_amount),
+                order_number=retval.get('orderNumber')))
+
+        return retval
+
+
+    def buy_all(self):
+        # cancel all buy orders first.
+        self.cancel_open_orders('sell')
+        # check open sell orders if the sell price is ok.
+        for order in list(self.open_orders_buy):
+            if order['price'] == self.buy_price:
+                log.debug('order is ok', extra=self.log_fields(**self.order_fields(order)))
+            else:
+                # cancel the order.
+                retval = self.cancel_open_order(order)
+
+        if len(self.open_orders_buy) == 0:
+            retval = self.add_buy_all_order()
+
+
+    def run_buy_all(self):
+        self.trade = 'buy'
+        while self.trade == 'buy':
+            self.start_tick()
+            self.load_market()
+
+            self.buy_price = self.find_buy_price()
+
+            if self.total_currency_balance > self.min_currency_balance:
+                self.trade = 'buy'
+            else:
+                self.trade = False
+            log.info('decision', extra=self.log_fields(
+                trade=self.trade, buy_price=from_satoshi(self.buy_price),
+                currency_balance=from_satoshi(self.total_currency_balance)))
+
+            if self.trade == 'buy':
+                self.buy_all()
+            else:
+                #Will not trade. Cancel all orders.
+                self.cancel_open_orders('buy')
+                self.cancel_open_orders('sell')
+
+            self.end_tick()
+
+            self.wait_next_tick()
+
+
+class ConcurrentTrader(Trader):
+    """
+    Trader that sends the independent api calls of a tick at the same time:
+    open orders, balances and the order book are fetched in parallel and the
+    cancels, new orders and moves of a tick go out together, gathered on an
+    asyncio event loop. The http client blocks, so the calls themselves run
+    on worker threads. A token bucket keeps every call within the exchange
+    request budget instead of the fixed sleeps.
+    """
+    def __init__(self, *args, **kwargs):
+        self.limiter = kwargs.pop('limiter', None) or TokenBucket(6)
+        self.workers = kwargs.pop('workers', 4)
+        Trader.__init__(self, *args, **kwargs)
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(self.workers)
+        # the limiter paces the calls
+        self.cancel_wait_time = 0
+
+
+    def call(self, method, *args, **kwargs):
+        """
+        calls the api method when the rate limiter allows it.
+        """
+        self.limiter.acquire()
+        return Trader.call(self, method, *args, **kwargs)
+
+
+    def submit(self, function, *args, **kwargs):
+        """
+        starts the function on a worker thread, returns its asyncio future.
+        """
+        return self.loop.run_in_executor(self.executor,
+                                         functools.partial(function, *args, **kwargs))
+
+
+    def wait(self, *futures):
+        """
+        runs the loop until the futures are done, returns their results in
+        order.
+        """
+        import asyncio
+
+        async def gather():
+            return await asyncio.gather(*futures)
+        return self.loop.run_until_complete(gather())
+
+
+    def fetch_accounts(self):
+        return (self.submit(self.call, 'returnOpenOrders', currencyPair=self.my_pair),
+                self.submit(self.call, 'returnBalances'))
+
+
+    def apply_accounts(self, open_orders, balances):
+        self.process_open_orders(open_orders)
+        self.process_balances(balances)
+        self.balances_loaded = time.time()
+        self.orders_sent = False
+
+
+    @timed('load_balances')
+    def load_balances(self):
+        self.apply_accounts(*self.wait(*self.fetch_accounts()))
+
+
+    @timed('load_market')
+    def load_market(self):
+        order_book = self.submit(self.call, 'returnOrderBook', currencyPair=self.my_pair,
+                                 depth='200')
+        # when orders went out the balances are loaded with the book, else
+        # only if the book says one may have been filled
+        accounts = None
+        if self.balances_loaded is None or self.orders_sent:
+            accounts = self.fetch_accounts()
+        self.apply_order_book(self.wait(order_book)[0])
+        if accounts is None and self.balances_stale():
+            accounts = self.fetch_accounts()
+        if accounts is not None:
+            self.apply_accounts(*self.wait(*accounts))
+            self.process_order_book('buy')
+            self.process_order_book('sell')
+        self.watch_levels()
+
+
+    def cancel_orders(self, orders):
+        self.wait(*[self.submit(self.send_cancel, order) for order in orders])
+        for order in orders:
+            self.remove_open_order(order)
+
+
+    def cancel_open_order(self, order):
+        self.send_cancel(order)
+        self.remove_open_order(order)
+
+
+    def place_orders(self, wants):
+        # the orders go out together, the bookkeeping stays in this thread
+        wants = self.allowed_orders(wants)
+        results = self.wait(*[self.submit(self.send_order, want['type'], want['price'],
+                                          want['amount'], True)
+                              for want in wants])
+        for want, result in zip(wants, results):
+            self.track_placed(want['type'], want['price'], want['amount'], result)
+
+
+    def move_orders(self, moves):
+        moves = self.allowed_moves(moves)
+        results = self.wait(*[self.submit(self.send_move, order, want['price'],
+                                          want['amount'], True)
+                              for order, want in moves])
+        for (order, want), result in zip(moves, results):
+            self.track_moved(order, want['price'], want['amount'], result)
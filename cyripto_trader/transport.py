@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP transport of the poloniex api.
+
+PoloniexClient keeps a pool of keep-alive connections in one requests
+session, so the calls don't pay a TCP and TLS handshake each, and every call
+has a connect and a read timeout. The nonces of the private calls come from
+one generator that is always increasing, also when threads call at the same
+time. Reads (the public calls and the return* ones) are retried a few times
+with a jittered backoff on connection errors, timeouts and 5xx answers. A
+call rejected for its nonce is retried with a new one whatever it is, since
+the exchange didn't run it.
+
+The methods are the ones of the poloniex client, any other command is sent
+with its keyword arguments. Errors are raised as RuntimeError.
+"""
+import hashlib
+import hmac
+import random
+import threading
+import time
+
+from urllib.parse import urlencode
+
+
+PUBLIC_URL = 'https://poloniex.com/public'
+PRIVATE_URL = 'https://poloniex.com/tradingApi'
+
+PUBLIC_COMMANDS = ('returnTicker', 'return24hVolume', 'returnOrderBook', 'returnChartData',
+                   'returnCurrencies', 'returnLoanOrders')
+# private commands that only read, safe to send again
+READ_COMMANDS = ('returnBalances', 'returnCompleteBalances', 'returnOpenOrders',
+                 'returnTradeHistory', 'returnOrderTrades', 'returnDepositAddresses')
+
+
+class NonceGenerator(object):
+    """
+    microseconds since the epoch, and always one more than the last one if
+    the clock didn't move or went back. Safe to share between threads.
+    """
+    def __init__(self):
+        self.last = 0
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            self.last = max(self.last + 1, int(time.time() * 1000000))
+            return self.last
+
+    __next__ = next
+
+
+class PoloniexClient(object):
+    """
+    The poloniex api over a pooled session. url is the base url of another
+    server with the same api (e.g. the simulator), pool_size the number of
+    connections kept open, and retries how many times a read is sent again.
+    """
+    def __init__(self, api_key=None, api_secret=None, url=None, pool_size=4,
+                 connect_timeout=3.05, read_timeout=10.0, retries=2, backoff=0.1):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key
+        self.api_secret = api_secret
+        if url:
+            url = url.rstrip('/')
+            self.public_url = url + '/public'
+            self.private_url = url + '/tradingApi'
+        else:
+            self.public_url = PUBLIC_URL
+            self.private_url = PRIVATE_URL
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.nonces = NonceGenerator()
+        self.random = random.Random()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # connection errors worth a retry
+        self.retry_errors = (requests.ConnectionError, requests.Timeout)
+        # any other error of requests, made a RuntimeError like the exchange errors
+        self.request_errors = requests.RequestException
+
+    def wait(self, attempt):
+        """
+        exponential backoff with full jitter.
+        """
+        time.sleep(self.random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def send(self, command, params):
+        params = dict((key, value) for key, value in params.items() if value is not None)
+        params['command'] = command
+        if command in PUBLIC_COMMANDS:
+            return self.session.get(self.public_url, params=params, timeout=self.timeout)
+        if not self.api_key or not self.api_secret:
+            raise RuntimeError('%s needs the api key and secret.' % command)
+        params['nonce'] = self.nonces.next()
+        body = urlencode(params)
+        sign = hmac.new(self.api_secret.encode('utf-8'), body.encode('utf-8'),
+                        hashlib.sha512).hexdigest()
+        headers = {'Key': self.api_key, 'Sign': sign,
+                   'Content-Type': 'application/x-www-form-urlencoded'}
+        return self.session.post(self.private_url, data=body, headers=headers,
+                                 timeout=self.timeout)
+
+    def call(self, command, **params):
+        """
+        sends the command and returns the decoded answer.
+        """
+        idempotent = command in PUBLIC_COMMANDS or command in READ_COMMANDS
+        attempt = 0
+        while True:
+            try:
+                response = self.send(command, params)
+            except self.retry_errors as e:
+                if not idempotent or attempt >= self.retries:
+                    raise RuntimeError('%s failed: %s' % (command, e))
+            except self.request_errors as e:
+                raise RuntimeError('%s failed: %s' % (command, e))
+            else:
+                if not (response.status_code >= 500 and idempotent and attempt < self.retries):
+                    try:
+                        retval = response.json()
+                    except (ValueError, self.request_errors):
+                        raise RuntimeError('%s: invalid answer, status %s' % (
+                            command, response.status_code))
+                    if not (isinstance(retval, dict) and 'error' in retval):
+                        return retval
+                    error = retval['error']
+                    if 'nonce' not in error.lower() or attempt >= self.retries:
+                        raise RuntimeError(error)
+            self.wait(attempt)
+            attempt += 1
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def command(**params):
+            return self.call(name, **params)
+        return command
+
+    def returnBalances(self):
+        return self.call('returnBalances')
+
+    def returnOpenOrders(self, currencyPair='all'):
+        return self.call('returnOpenOrders', currencyPair=currencyPair)
+
+    def returnOrderBook(self, currencyPair='all', depth='50'):
+        return self.call('returnOrderBook', currencyPair=currencyPair, depth=depth)
+
+    def returnTradeHistory(self, currencyPair='all', start=None, end=None, limit=None):
+        return self.call('returnTradeHistory', currencyPair=currencyPair, start=start,
+                         end=end, limit=limit)
+
+    def sell(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.call('sell', currencyPair=currencyPair, rate=rate, amount=amount)
+
+    def buy(self, currencyPair, rate, amount, *args, **kwargs):
+        return self.call('buy', currencyPair=currencyPair, rate=rate, amount=amount)
+
+    def cancelOrder(self, orderNumber):
+        return self.call('cancelOrder', orderNumber=orderNumber)
+
+    def moveOrder(self, orderNumber, rate, amount=None, *args, **kwargs):
+        return self.call('moveOrder', orderNumber=orderNumber, rate=rate, amount=amount)
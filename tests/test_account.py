@@ -0,0 +1,82 @@
+import pytest
+
+from cyripto_trader.account import Account, open_order_fields
+from cyripto_trader.satoshi import to_satoshi
+
+PAIR = 'BTC_ETH'
+
+
+def order(account, order_type, rate, amount):
+    price, amount, held = account.hold(PAIR, order_type, rate, amount)
+    return {'type': order_type, 'price': price, 'amount': amount, 'starting_amount': amount,
+            'held': held}
+
+
+def test_hold_checks_like_the_exchange():
+    account = Account({'BTC': 1, 'ETH': 2})
+    with pytest.raises(RuntimeError, match='Invalid rate or amount'):
+        account.hold(PAIR, 'buy', '0', '1')
+    with pytest.raises(RuntimeError, match='Total must be at least 0.00010000'):
+        account.hold(PAIR, 'buy', '0.01', '0.001')
+    with pytest.raises(RuntimeError, match='Not enough ETH'):
+        account.hold(PAIR, 'sell', '0.1', '3')
+    with pytest.raises(RuntimeError, match='Not enough BTC'):
+        account.hold(PAIR, 'buy', '0.1', '11')
+    assert account.balances == {'BTC': to_satoshi(1), 'ETH': to_satoshi(2)}
+    assert account.orders_placed == 0
+
+    assert account.hold(PAIR, 'buy', '0.1', '5') == (to_satoshi('0.1'), to_satoshi(5),
+                                                      to_satoshi('0.5'))
+    assert account.hold(PAIR, 'sell', '0.2', '2')[2] == to_satoshi(2)
+    assert account.balances == {'BTC': to_satoshi('0.5'), 'ETH': 0}
+    assert account.orders_placed == 2
+    assert account.amount_placed == to_satoshi(7)
+
+
+def test_settle_buy_at_a_better_price():
+    account = Account({'BTC': 1, 'ETH': 0}, maker_fee=0.001, taker_fee=0.002)
+    buy = order(account, 'buy', '0.1', '4')
+    account.settle(PAIR, buy, to_satoshi('0.09'), to_satoshi(1), account.taker_fee)
+    # the coin less the fee, and the currency held over the fill price back
+    assert account.balances['ETH'] == to_satoshi('0.998')
+    assert account.balances['BTC'] == to_satoshi('0.6') + to_satoshi('0.01')
+    assert buy['held'] == to_satoshi('0.3')
+    assert account.fees == to_satoshi('0.00018')
+    account.release(PAIR, buy)
+    assert buy['held'] == 0
+    assert account.balances['BTC'] == to_satoshi('0.91')
+
+
+def test_settle_sell():
+    account = Account({'BTC': 0, 'ETH': 3}, maker_fee=0.001)
+    sell = order(account, 'sell', '0.1', '3')
+    account.settle(PAIR, sell, to_satoshi('0.1'), to_satoshi(2), account.maker_fee)
+    assert account.balances == {'ETH': 0, 'BTC': to_satoshi('0.2') - to_satoshi('0.0002')}
+    assert sell['held'] == to_satoshi(1)
+    assert account.amount_filled == to_satoshi(2)
+    assert account.volume == to_satoshi('0.2')
+
+
+def test_replace_holds_the_old_order_again_on_failure():
+    account = Account({'BTC': 1})
+    buy = order(account, 'buy', '0.1', '5')
+
+    def place():
+        return order(account, 'buy', '0.1', '20')
+
+    with pytest.raises(RuntimeError, match='Not enough BTC'):
+        account.replace(PAIR, buy, place)
+    assert buy['held'] == to_satoshi('0.5')
+    assert account.balances['BTC'] == to_satoshi('0.5')
+
+    new = account.replace(PAIR, buy, lambda: order(account, 'buy', '0.1', '8'))
+    assert new['held'] == to_satoshi('0.8')
+    assert account.balances['BTC'] == to_satoshi('0.2')
+
+
+def test_open_order_fields():
+    account = Account({'BTC': 1})
+    assert open_order_fields(7, order(account, 'buy', '0.1', '2')) == {
+        'orderNumber': '7', 'type': 'buy', 'rate': '0.10000000', 'amount': '2.00000000',
+        'startingAmount': '2.00000000', 'total': '0.20000000'}
+    assert account.balance_fields() == {'BTC': '0.80000000'}
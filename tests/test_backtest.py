@@ -0,0 +1,113 @@
+import random
+import sys
+
+import pytest
+
+from cyripto_trader.backtest import BacktestExchange, run_backtest
+from cyripto_trader.satoshi import from_satoshi, to_satoshi
+from cyripto_trader.trader import Trader
+
+PAIR = 'BTC_ETH'
+
+
+def snapshot(bids, asks, seq=1, ts=1000.0):
+    return {'type': 'snapshot', 'pair': PAIR, 'seq': seq, 'ts': ts, 'bids': bids, 'asks': asks}
+
+
+def exchange(**options):
+    options.setdefault('maker_fee', 0.001)
+    options.setdefault('taker_fee', 0.002)
+    exchange = BacktestExchange(PAIR, **options)
+    exchange.apply_market_event(snapshot([['0.099', '5'], ['0.098', '5']],
+                                         [['0.101', '5'], ['0.102', '5']]))
+    return exchange
+
+
+def test_order_takes_the_book():
+    market = exchange(currency_balance=1)
+    retval = market.buy(PAIR, '0.1015', '6')
+    # 5 taken at 0.101, 1 rests at 0.1015
+    assert retval['resultingTrades'] == [{'amount': '5.00000000', 'rate': '0.10100000',
+                                          'type': 'buy'}]
+    assert market.balances['ETH'] == to_satoshi('4.99')
+    assert market.balances['BTC'] == to_satoshi('1') - to_satoshi('0.505') - to_satoshi('0.1015')
+    orders = market.returnOpenOrders(PAIR)
+    assert [(order['rate'], order['amount']) for order in orders] == [('0.10150000',
+                                                                       '1.00000000')]
+
+
+def test_resting_order_filled_by_trades_and_crossed_book():
+    market = exchange(currency_balance=0, coin_balance=10)
+    number = market.sell(PAIR, '0.1005', '4')['orderNumber']
+    market.apply_market_event({'type': 'trade', 'pair': PAIR, 'ts': 1001.0,
+                               'trade_type': 'buy', 'price': '0.1006', 'amount': '1'})
+    assert market.returnOpenOrders(PAIR)[0]['amount'] == '3.00000000'
+    assert market.filled
+    # only trades through the price fill it
+    market.apply_market_event({'type': 'trade', 'pair': PAIR, 'ts': 1002.0,
+                               'trade_type': 'buy', 'price': '0.1004', 'amount': '1'})
+    assert market.returnOpenOrders(PAIR)[0]['amount'] == '3.00000000'
+    market.apply_market_event({'type': 'update', 'pair': PAIR, 'seq': 2, 'ts': 1003.0,
+                               'changes': [['buy', '0.1005', '1']]})
+    assert market.returnOpenOrders(PAIR) == []
+    assert market.account.orders_filled == 1
+    # sold 4 at 0.1005 with the maker fee
+    assert market.balances['BTC'] == to_satoshi('0.402') - to_satoshi('0.000402')
+    assert market.balances['ETH'] == to_satoshi(6)
+    with pytest.raises(RuntimeError, match='Invalid order number'):
+        market.cancelOrder(number)
+
+
+def test_cancel_and_move():
+    market = exchange(currency_balance='0.5')
+    number = market.buy(PAIR, '0.095', '2')['orderNumber']
+    assert market.balances['BTC'] == to_satoshi('0.31')
+    retval = market.moveOrder(number, '0.096', '3')
+    assert market.balances['BTC'] == to_satoshi('0.212')
+    # a move that can't be placed leaves the order as it was
+    with pytest.raises(RuntimeError, match='Not enough BTC'):
+        market.moveOrder(retval['orderNumber'], '0.096', '10')
+    assert market.returnOpenOrders(PAIR)[0]['amount'] == '3.00000000'
+    assert market.balances['BTC'] == to_satoshi('0.212')
+    assert market.cancelOrder(retval['orderNumber']) == {'success': 1}
+    assert market.balances['BTC'] == to_satoshi('0.5')
+    with pytest.raises(RuntimeError, match='Total must be at least'):
+        market.buy(PAIR, '0.095', '0.001')
+
+
+def market_events(count, seed=3):
+    rand = random.Random(seed)
+    mid = 10000000
+    events = [snapshot([[from_satoshi(mid - level * 10000), '3'] for level in range(1, 20)],
+                       [[from_satoshi(mid + level * 10000), '3'] for level in range(1, 20)])]
+    for index in range(count):
+        ts = 1000.0 + index
+        trade_type = rand.choice(['buy', 'sell'])
+        price = mid + rand.randrange(-30000, 30000)
+        events.append({'type': 'trade', 'pair': PAIR, 'ts': ts, 'trade_type': trade_type,
+                       'price': from_satoshi(price), 'amount': '2'})
+        if index % 10 == 0:
+            mid += rand.choice([-10000, 10000])
+            events.append(snapshot(
+                [[from_satoshi(mid - level * 10000), '3'] for level in range(1, 20)],
+                [[from_satoshi(mid + level * 10000), '3'] for level in range(1, 20)],
+                seq=index + 2, ts=ts))
+    return events
+
+
+def test_run_backtest(capsys):
+    market = BacktestExchange(PAIR, currency_balance=1)
+    trader = Trader(None, None, 'ETH', 'BTC', dust_total=0.1, dust_amount=2,
+                    min_spread=0.0001, max_trading_amount=5, polo=market)
+    stdout = sys.stdout
+    report = run_backtest(trader, market, market_events(300), sample_every=100)
+    assert sys.stdout is stdout
+    assert report['events'] == 331
+    assert report['decisions'] > 0
+    assert report['orders_placed'] > 0
+    assert report['orders_filled'] > 0
+    assert len(report['inventory']) == 3
+    coin, currency = market.holdings()
+    assert report['coin'] == from_satoshi(coin)
+    assert report['currency'] == from_satoshi(currency)
+    assert capsys.readouterr() == ('', '')
@@ -0,0 +1,87 @@
+import json
+import threading
+
+from cyripto_trader.rate_limiter import TokenBucket
+from cyripto_trader.simulator import ExchangeSimulator, ScriptFlow
+from cyripto_trader.trader import ConcurrentTrader, Trader
+
+PAIR = 'BTC_ETH'
+
+
+class CountingLimiter(TokenBucket):
+    def __init__(self):
+        TokenBucket.__init__(self, 1000)
+        self.acquired = 0
+
+    def acquire(self, tokens=1):
+        self.acquired += tokens
+        TokenBucket.acquire(self, tokens)
+
+
+class MeetingExchange(object):
+    """
+    the open orders and balances calls only return once both were made, so
+    the trader has to make them at the same time.
+    """
+    def __init__(self):
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def returnOpenOrders(self, currencyPair):
+        self.barrier.wait()
+        return [{'orderNumber': '7', 'type': 'sell', 'rate': '0.101', 'amount': '2',
+                 'startingAmount': '2'}]
+
+    def returnBalances(self):
+        self.barrier.wait()
+        return {'BTC': '0.5', 'ETH': '1'}
+
+
+def make_trader(trader_class, polo, **options):
+    trader = trader_class(None, None, 'ETH', 'BTC', dust_total=10, dust_amount=3,
+                          min_spread=0.0001, max_trading_amount=5, polo=polo, **options)
+    trader.cancel_wait_time = 0
+    return trader
+
+
+def quiet_market(tmp_path):
+    with open(str(tmp_path / 'flow.jsonl'), 'w') as f:
+        for order_type, prices in (('sell', ['0.101', '0.102', '0.103', '0.104']),
+                                   ('buy', ['0.099', '0.098', '0.097', '0.096'])):
+            # a ladder level on each of the first three
+            for price, amount in zip(prices, ['4', '7', '10', '13']):
+                f.write(json.dumps({'action': 'limit', 'type': order_type, 'price': price,
+                                    'amount': amount}) + '\n')
+    flow = ScriptFlow(str(tmp_path / 'flow.jsonl'))
+    simulator = ExchangeSimulator({'BTC': 1, 'ETH': 3}, {PAIR: flow})
+    while flow.position < len(flow.actions):
+        simulator.returnOrderBook(PAIR)
+    return simulator
+
+
+def test_accounts_are_fetched_together():
+    trader = make_trader(ConcurrentTrader, MeetingExchange(), limiter=CountingLimiter())
+    trader.load_balances()
+    assert [order['order_number'] for order in trader.open_orders] == ['7']
+    assert trader.total_coin_balance == 300000000
+    assert trader.currency_balance == 50000000
+    assert trader.limiter.acquired == 2
+
+
+def test_same_orders_as_the_trader(tmp_path):
+    results = []
+    for trader_class, options in ((Trader, {}),
+                                  (ConcurrentTrader, {'limiter': CountingLimiter()})):
+        simulator = quiet_market(tmp_path)
+        trader = make_trader(trader_class, simulator, **options)
+        trader.ladder_levels = 3
+        calls = simulator.calls
+        for _ in range(3):
+            trader.load_market()
+            trader.scalp()
+        trader.load_balances()
+        results.append(sorted((order['type'], order['price'], order['amount'])
+                              for order in trader.open_orders))
+        if options:
+            assert options['limiter'].acquired == simulator.calls - calls
+    assert results[0] == results[1]
+    assert len(results[0]) == 3
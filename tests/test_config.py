@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from cyripto_trader.config import ConfigError, load_config, make_config
+
+SETTINGS = {'polo_api': {'key': 'key', 'secret': 'secret'}, 'coin': {'my_coin': 'ETH',
+            'currency': 'BTC'}, 'dust_total': 0.01, 'dust_amount': 1, 'min_spread': 0.005,
+            'max_trading_amount': 0.5}
+
+
+def settings(**changes):
+    result = dict(SETTINGS)
+    result.update(changes)
+    return result
+
+
+def test_valid_settings():
+    config = make_config(settings(pairs=[{'coin': 'XMR', 'currency': 'BTC', 'share': 0.5}],
+                                  risk={'enabled': True, 'max_position': 10}))
+    assert config.pair.pair == 'BTC_ETH'
+    # ints are taken for floats
+    assert config.pair.dust_amount == 1.0
+    assert isinstance(config.pair.dust_amount, float)
+    assert [pair.pair for pair in config.pairs] == ['BTC_XMR']
+    assert config.pairs[0].min_spread == 0.005
+    assert config.risk.max_position == 10.0
+    assert config.exchange.retries == 2
+    config.require_api_keys()
+
+
+def test_defaults():
+    config = make_config(settings())
+    assert config.pairs == (config.pair,)
+    assert config.risk.enabled is False
+    assert config.priority == 'spread'
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'unknown': 1}, 'unknown settings: unknown'),
+    ({'exchange': {'retires': 3}}, 'unknown settings in exchange: retires'),
+    ({'exchange': {'retries': '3'}}, "exchange.retries should be int, not '3'"),
+    ({'exchange': {'retries': True}}, 'exchange.retries should be int, not True'),
+    ({'exchange': {'connect_timeout': 'slow'}}, 'exchange.connect_timeout should be float'),
+    ({'exchange': [1]}, 'exchange should be a mapping'),
+    ({'min_spread': 'wide'}, 'min_spread should be float'),
+    ({'coin': {'currency': 'BTC'}}, 'coin misses my_coin'),
+    ({'coin': 'ETH'}, 'coin should be a mapping'),
+    ({'pairs': [{'coin': 'XMR'}]}, 'pairs[0] misses currency'),
+    ({'pairs': [{'coin': 'XMR', 'currency': 'BTC', 'share': 'half'}]},
+     'pairs[0].share should be float'),
+    ({'priority': 'size'}, 'priority should be spread or volatility'),
+    ({'polo_api': 'key'}, 'polo_api should be a mapping'),
+    ({'sweep': [1]}, 'sweep should be dict'),
+    ({'risk': {'enabled': 'yes'}}, 'risk.enabled should be bool'),
+])
+def test_errors(changes, message):
+    with pytest.raises(ConfigError, match='^' + message.replace('[', r'\[').replace(']', r'\]')):
+        make_config(settings(**changes))
+
+
+def test_missing_pair_values():
+    values = settings()
+    del values['min_spread']
+    with pytest.raises(ConfigError, match='coin misses min_spread'):
+        make_config(values)
+
+
+def test_settings_not_a_mapping():
+    with pytest.raises(ConfigError):
+        make_config(['coin'])
+
+
+def test_missing_api_keys():
+    config = make_config(settings(polo_api=None))
+    with pytest.raises(ConfigError, match='api keys missing'):
+        config.require_api_keys()
+
+
+def test_load_config(tmp_path):
+    path = tmp_path / 'settings.yaml'
+    with pytest.raises(ConfigError, match='not found'):
+        load_config(str(path))
+    path.write_text('coin: [1\n')
+    with pytest.raises(ConfigError, match='not valid yaml'):
+        load_config(str(path))
+    path.write_text('polo_api: {key: a, secret: b}\ncoin: {my_coin: ETH, currency: BTC}\n'
+                    'dust_total: 0.01\ndust_amount: 1\nmin_spread: 0.005\n'
+                    'max_trading_amount: 0.5\n')
+    assert load_config(str(path)).pair.coin == 'ETH'
+
+
+def test_example_settings_are_valid():
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'settings_example.yaml')
+    config = load_config(path)
+    assert config.pair.coin
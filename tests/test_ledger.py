@@ -0,0 +1,171 @@
+import json
+import time
+
+from cyripto_trader.ledger import FillIngester, Ledger, Position, parse_trade
+from cyripto_trader.satoshi import mul_satoshi, to_satoshi
+
+
+def fill(order_type, price, amount, fee=0, ts=1000, number=None, pair='BTC_ETH'):
+    price = to_satoshi(price)
+    amount = to_satoshi(amount)
+    fill.count += 1
+    return {'pair': pair, 'id': str(number or fill.count), 'order_number': '', 'ts': ts,
+            'type': order_type, 'price': price, 'amount': amount,
+            'total': mul_satoshi(price, amount), 'fee': to_satoshi(fee)}
+
+
+fill.count = 0
+
+
+def position_of(*fills):
+    position = Position('BTC_ETH')
+    for one in fills:
+        position.add(one)
+    return position
+
+
+def test_long():
+    position = position_of(fill('buy', 100, 2), fill('sell', 150, 1))
+    assert position.position == to_satoshi(1)
+    assert position.cost == to_satoshi(100)
+    assert position.realized == to_satoshi(50)
+    assert position.average_price() == to_satoshi(100)
+    pnl = position.pnl(to_satoshi(120))
+    assert pnl['unrealized'] == to_satoshi(20)
+    assert pnl['total'] == to_satoshi(70)
+    assert pnl['volume'] == to_satoshi(350)
+
+
+def test_short():
+    position = position_of(fill('sell', 100, 2), fill('buy', 80, 1))
+    assert position.position == to_satoshi(-1)
+    assert position.cost == to_satoshi(-100)
+    assert position.realized == to_satoshi(20)
+    assert position.average_price() == to_satoshi(100)
+    assert position.pnl(to_satoshi(110))['unrealized'] == to_satoshi(-10)
+
+
+def test_flip_long_to_short_and_back():
+    position = position_of(fill('buy', 100, 1), fill('sell', 120, 3))
+    assert position.realized == to_satoshi(20)
+    assert position.position == to_satoshi(-2)
+    assert position.cost == to_satoshi(-240)
+    assert position.average_price() == to_satoshi(120)
+    assert position.pnl(to_satoshi(110))['unrealized'] == to_satoshi(20)
+
+    position.add(fill('buy', 90, 3))
+    assert position.realized == to_satoshi(80)
+    assert position.position == to_satoshi(1)
+    assert position.cost == to_satoshi(90)
+
+
+def test_closed_position_has_no_cost():
+    position = position_of(fill('buy', 100, 1), fill('buy', 110, 1), fill('sell', 120, 2))
+    assert position.position == 0
+    assert position.cost == 0
+    assert position.realized == to_satoshi(30)
+    assert position.average_price() is None
+
+
+def test_fees():
+    position = position_of(fill('buy', 100, 1, fee='0.01'), fill('sell', 100, '0.99', fee='0.01'))
+    assert position.coin_fees == to_satoshi('0.01')
+    assert position.currency_fees == to_satoshi('0.01')
+    assert position.position == 0
+    # bought 0.99 for 100, sold it for 99 minus the fee
+    assert position.realized == to_satoshi('-1.01')
+
+
+def test_parse_trade_fees():
+    buy = parse_trade('BTC_ETH', {'globalTradeID': 7, 'tradeID': 1, 'date': '1970-01-01 00:16:40',
+                                  'rate': '0.5', 'amount': '2', 'total': '1', 'fee': '0.0025',
+                                  'type': 'buy', 'orderNumber': 3})
+    assert buy['id'] == '7'
+    assert buy['ts'] == 1000
+    assert buy['fee'] == to_satoshi('0.005')
+    sell = parse_trade('BTC_ETH', {'tradeID': 2, 'date': '1970-01-01 00:16:40', 'rate': '0.5',
+                                   'amount': '2', 'total': '1', 'fee': '0.0025', 'type': 'sell'})
+    assert sell['id'] == '2'
+    assert sell['fee'] == to_satoshi('0.0025')
+
+
+def test_append_drops_known_fills(tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.jsonl'))
+    fills = [fill('buy', 100, 1, ts=10, number='a'), fill('buy', 100, 1, ts=11, number='b')]
+    assert ledger.append(fills) == fills
+    assert ledger.append(fills) == []
+    late = fill('sell', 120, 1, ts=11, number='c')
+    assert ledger.append(fills + [late]) == [late]
+    assert ledger.cursor('BTC_ETH') == 11
+    assert ledger.cursor('BTC_XMR') is None
+    assert ledger.pnl('BTC_ETH')['fills'] == 3
+
+
+def test_reload_and_truncated_file(tmp_path):
+    path = str(tmp_path / 'ledger.jsonl')
+    ledger = Ledger(path)
+    ledger.append([fill('buy', 100, 2, ts=10), fill('sell', 150, 1, ts=11),
+                   fill('buy', 1, 5, ts=12, pair='BTC_XMR')])
+    expected = dict((pair, ledger.pnl(pair)) for pair in ('BTC_ETH', 'BTC_XMR'))
+    with open(path) as f:
+        good = f.read()
+    with open(path, 'a') as f:
+        f.write(json.dumps(fill('sell', 150, 1, ts=12))[:30])
+
+    ledger = Ledger(path)
+    assert dict((pair, ledger.pnl(pair)) for pair in expected) == expected
+    with open(path) as f:
+        assert f.read() == good
+
+    added = fill('sell', 150, 1, ts=13)
+    ledger.append([added])
+    ledger = Ledger(path)
+    assert ledger.pnl('BTC_ETH')['position'] == 0
+    assert ledger.pnl('BTC_ETH')['realized'] == to_satoshi(100)
+    assert ledger.cursor('BTC_ETH') == 13
+
+
+class TradeHistory(object):
+    """
+    returnTradeHistory of a list of trades, newest limit ones first.
+    """
+    def __init__(self, trades):
+        self.trades = trades
+        self.calls = 0
+
+    def returnTradeHistory(self, currencyPair, start, end, limit):
+        self.calls += 1
+        assert self.calls < 100
+        page = [trade for trade in self.trades if start <= trade['ts'] <= end]
+        page.sort(key=lambda trade: (-trade['ts'], -trade['id']))
+        return [{'tradeID': trade['id'], 'date': trade['date'], 'rate': '1', 'amount': '1',
+                 'total': '1', 'type': 'buy'} for trade in page[:limit]]
+
+
+def trade(number, ts):
+    return {'id': number, 'ts': ts,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))}
+
+
+def test_ingest_follows_pages():
+    trades = [trade(number, 1000 + number // 3) for number in range(20)]
+    ledger = Ledger()
+    ingester = FillIngester(TradeHistory(trades), ledger, 'BTC_ETH', since=1000, limit=4)
+    added = ingester.ingest()
+    assert sorted(int(one['id']) for one in added) == list(range(20))
+    assert ingester.ingest() == []
+
+
+def test_full_page_of_one_second_ends():
+    trades = [trade(number, 1000) for number in range(10)] + [trade(10, 999)]
+    polo = TradeHistory(trades)
+    fetched = FillIngester(polo, None, 'BTC_ETH', limit=4).fetch(900, 2000)
+    # the rest of the second can't be paged to, the older trades still are
+    assert set(one['tradeID'] for one in fetched) == set([9, 8, 7, 6, 10])
+
+
+def test_full_page_reaching_the_start_second():
+    trades = [trade(number, 1000) for number in range(3)] + [trade(3, 1001)]
+    fetched = FillIngester(TradeHistory(trades), None, 'BTC_ETH', limit=3).fetch(1000, 2000)
+    # the second at start is paged again, the ledger drops the ones it has
+    assert sorted(one['tradeID'] for one in fetched) == [0, 1, 1, 2, 2, 3]
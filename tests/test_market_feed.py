@@ -0,0 +1,114 @@
+import json
+
+from cyripto_trader.backtest import BacktestExchange
+from cyripto_trader.market_feed import PoloniexPushFeed, ReplayFeed, make_feed
+from cyripto_trader.trader import Trader
+
+PAIR = 'BTC_ETH'
+
+SNAPSHOT = {'type': 'snapshot', 'pair': PAIR, 'seq': 1,
+            'bids': [['0.099', '5'], ['0.098', '5']],
+            'asks': [['0.101', '5'], ['0.102', '5']]}
+
+
+class CallLog(object):
+    """
+    the exchange, with the names of the methods called on it.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.calls = []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.exchange, name)
+
+
+def make_trader():
+    exchange = BacktestExchange(PAIR, 1, 0, 0, 0)
+    exchange.apply_market_event(dict(SNAPSHOT, ts=1000.0))
+    polo = CallLog(exchange)
+    trader = Trader(None, None, 'ETH', 'BTC', dust_total=0.1, dust_amount=3,
+                    min_spread=0.0001, max_trading_amount=5, polo=polo)
+    trader.cancel_wait_time = 0
+    return trader, polo
+
+
+def write_events(path, events):
+    with open(str(path), 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def test_replay_feed_reads_the_subscribed_pairs(tmp_path):
+    other = dict(SNAPSHOT, pair='BTC_ZEC')
+    write_events(tmp_path / 'events.jsonl', [SNAPSHOT, other])
+    feed = ReplayFeed(str(tmp_path / 'events.jsonl'))
+    assert list(feed.events()) == [SNAPSHOT, other]
+    feed.subscribe(PAIR)
+    assert list(feed.events()) == [SNAPSHOT]
+    assert isinstance(make_feed(str(tmp_path / 'events.jsonl')), ReplayFeed)
+
+
+def test_push_feed_messages():
+    feed = PoloniexPushFeed()
+    events = feed.parse([148, 10, [
+        ['i', {'currencyPair': PAIR, 'orderBook': [{'0.101': '5', '0.102': '1'},
+                                                    {'0.098': '2', '0.099': '5'}]}]]])
+    assert events == [{'type': 'snapshot', 'pair': PAIR, 'seq': 10,
+                       'bids': [('0.099', '5'), ('0.098', '2')],
+                       'asks': [('0.101', '5'), ('0.102', '1')]}]
+    events = feed.parse([148, 11, [['t', '42', 0, '0.099', '1.5', 1500000000],
+                                   ['o', 1, '0.099', '3.5']]])
+    assert events == [
+        {'type': 'update', 'pair': PAIR, 'seq': 11, 'changes': [['buy', '0.099', '3.5']]},
+        {'type': 'trade', 'pair': PAIR, 'seq': 11, 'trade_type': 'sell', 'price': '0.099',
+         'amount': '1.5', 'ts': 1500000000.0}]
+
+
+def test_trades_only_when_the_prices_move():
+    trader, polo = make_trader()
+    trader.load_balances()
+    assert trader.on_market_event(SNAPSHOT)
+    assert trader.trade == 'buy'
+    assert [order['price'] for order in trader.open_orders] == [9900003]
+
+    # another pair, and a level that doesn't move my prices
+    assert not trader.on_market_event(dict(SNAPSHOT, pair='BTC_ZEC'))
+    assert not trader.on_market_event({'type': 'update', 'pair': PAIR, 'seq': 2,
+                                       'changes': [['buy', '0.090', '5']]})
+
+    assert trader.on_market_event({'type': 'update', 'pair': PAIR, 'seq': 3,
+                                   'changes': [['buy', '0.0995', '5']]})
+    assert [order['price'] for order in trader.open_orders] == [9950003]
+
+
+def test_gap_loads_the_book_and_trades_reload_the_balances():
+    trader, polo = make_trader()
+    trader.load_balances()
+    trader.on_market_event(SNAPSHOT)
+    del polo.calls[:]
+    # seq 2 is missing
+    trader.on_market_event({'type': 'update', 'pair': PAIR, 'seq': 3,
+                            'changes': [['buy', '0.090', '5']]})
+    assert polo.calls == ['returnOrderBook']
+
+    del polo.calls[:]
+    trader.on_market_event({'type': 'trade', 'pair': PAIR, 'seq': 3, 'trade_type': 'sell',
+                            'price': '0.1', 'amount': '1', 'ts': 1001.0})
+    assert polo.calls == []
+    trader.on_market_event({'type': 'trade', 'pair': PAIR, 'seq': 3, 'trade_type': 'sell',
+                            'price': '0.099', 'amount': '1', 'ts': 1002.0})
+    assert polo.calls[:2] == ['returnOpenOrders', 'returnBalances']
+
+
+def test_run_streaming_on_a_replay(tmp_path):
+    write_events(tmp_path / 'events.jsonl', [
+        SNAPSHOT,
+        {'type': 'update', 'pair': PAIR, 'seq': 2, 'changes': [['sell', '0.1005', '5']]},
+        {'type': 'update', 'pair': PAIR, 'seq': 3, 'changes': [['sell', '0.1005', '0']]}])
+    trader, polo = make_trader()
+    trader.run_streaming(ReplayFeed(str(tmp_path / 'events.jsonl')))
+    assert trader.book.seq == 3
+    assert trader.book.best_ask() == 10100000
+    assert len(trader.open_orders) == 1
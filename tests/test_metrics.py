@@ -0,0 +1,50 @@
+import pytest
+
+from cyripto_trader.metrics import Histogram, Metrics, timed
+
+
+class Worker(object):
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+
+    @timed('work')
+    def work(self, value, fail=False):
+        """
+        does the work.
+        """
+        if fail:
+            raise RuntimeError('failed')
+        return value * 2
+
+
+def test_timed_keeps_the_method():
+    assert Worker.work.__name__ == 'work'
+    assert Worker.work.__qualname__ == 'Worker.work'
+    assert Worker.work.__module__ == __name__
+    assert 'does the work' in Worker.work.__doc__
+    assert Worker.work.__wrapped__(Worker(), 2) == 4
+
+
+def test_timed_observes_the_stage():
+    metrics = Metrics()
+    worker = Worker(metrics)
+    assert worker.work(3) == 6
+    with pytest.raises(RuntimeError):
+        worker.work(3, fail=True)
+    assert metrics.stages['work'].count == 2
+    assert Worker().work(1) == 2
+
+
+def test_histogram_quantiles_and_render():
+    histogram = Histogram()
+    for value in [0.0001] * 98 + [0.2, 3.0]:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.0005
+    assert histogram.quantile(0.99) == 0.25
+    assert histogram.quantile(1.0) == 3.0
+
+    metrics = Metrics()
+    metrics.observe_call('returnBalances', 0.01, error=True)
+    text = metrics.render()
+    assert 'trader_api_call_seconds_count{method="returnBalances"} 1' in text
+    assert 'trader_api_errors_total{method="returnBalances"} 1' in text
@@ -0,0 +1,102 @@
+import random
+
+from cyripto_trader.order_book import OrderBook
+from cyripto_trader.satoshi import from_satoshi, mul_satoshi, to_satoshi
+
+
+def naive_levels(levels, order_type):
+    return sorted(levels.items(), reverse=order_type == 'buy')
+
+
+def naive_dust_level(levels, order_type, owned, dust_amount, dust_total):
+    free_total = 0
+    for index, (price, amount) in enumerate(naive_levels(levels, order_type)):
+        if price in owned:
+            continue
+        free_total += mul_satoshi(price, amount)
+        if amount >= dust_amount or free_total >= dust_total:
+            return index
+    return None
+
+
+def random_levels(rand, low, high):
+    return dict((rand.randrange(low, high) * 1000, rand.randrange(1, 10 ** 9))
+                for _ in range(rand.randrange(0, 40)))
+
+
+def as_raw(levels):
+    return [[from_satoshi(price), from_satoshi(amount)] for price, amount in levels.items()]
+
+
+def check_book(book, model, owned, rand):
+    for order_type in ('buy', 'sell'):
+        side = book.sides[order_type]
+        expected = naive_levels(model[order_type], order_type)
+        assert list(zip(side.prices, side.amounts)) == expected
+        for _ in range(5):
+            dust_amount = rand.choice([0, rand.randrange(1, 10 ** 9)])
+            dust_total = rand.choice([0, rand.randrange(1, 10 ** 9)])
+            assert side.find_dust_level(dust_amount, dust_total) == naive_dust_level(
+                model[order_type], order_type, owned[order_type], dust_amount, dust_total)
+
+
+def test_snapshot_updates_and_dust_level():
+    rand = random.Random(5)
+    for _ in range(50):
+        book = OrderBook()
+        model = {'buy': random_levels(rand, 1000, 2000), 'sell': random_levels(rand, 2000, 3000)}
+        assert book.apply_snapshot(as_raw(model['buy']), as_raw(model['sell']), seq=1)
+        owned = {'buy': {}, 'sell': {}}
+        seq = 1
+        for _ in range(30):
+            seq += 1
+            changes = []
+            for _ in range(rand.randrange(1, 4)):
+                order_type = rand.choice(['buy', 'sell'])
+                levels = model[order_type]
+                if levels and rand.random() < 0.3:
+                    price = rand.choice(list(levels))
+                    amount = 0
+                    del levels[price]
+                else:
+                    low = 1000 if order_type == 'buy' else 2000
+                    price = rand.randrange(low, low + 1000) * 1000
+                    amount = rand.randrange(1, 10 ** 9)
+                    levels[price] = amount
+                changes.append((order_type, from_satoshi(price), from_satoshi(amount)))
+            assert book.apply_updates(seq, changes)
+            if rand.random() < 0.3:
+                for order_type in ('buy', 'sell'):
+                    prices = list(model[order_type])
+                    owned[order_type] = dict(
+                        (price, 'order%d' % price)
+                        for price in rand.sample(prices, min(len(prices), rand.randrange(0, 4))))
+                    book.sides[order_type].set_owned(owned[order_type])
+            check_book(book, model, owned, rand)
+
+
+def test_snapshot_resync_keeps_owned():
+    book = OrderBook()
+    book.apply_snapshot([['0.002', '1'], ['0.001', '2']], [['0.003', '1']], seq=1)
+    book.sides['buy'].set_owned({to_satoshi('0.002'): 'a'})
+    assert not book.apply_snapshot([], [], seq=1)
+    assert book.apply_snapshot([['0.0015', '3'], ['0.002', '4']], [['0.004', '1']], seq=7)
+    bids = book.sides['buy']
+    assert list(bids.prices) == [to_satoshi('0.002'), to_satoshi('0.0015')]
+    assert list(bids.own) == [1, 0]
+    assert bids.find_dust_level(1, 10 ** 12) == 1
+    assert book.best_bid() == to_satoshi('0.002')
+    assert book.best_ask() == to_satoshi('0.004')
+
+
+def test_sequence_gap_needs_snapshot():
+    book = OrderBook()
+    assert not book.apply_update(1, 'buy', '0.001', '1')
+    book.apply_snapshot([['0.001', '1']], [['0.002', '1']], seq=10)
+    assert book.apply_update(9, 'buy', '0.0015', '1')
+    assert book.best_bid() == to_satoshi('0.001')
+    assert book.apply_update(11, 'buy', '0.0015', '1')
+    assert book.best_bid() == to_satoshi('0.0015')
+    assert not book.apply_update(13, 'sell', '0.0019', '1')
+    assert not book.synced
+    assert book.best_ask() == to_satoshi('0.002')
@@ -0,0 +1,91 @@
+import json
+
+from cyripto_trader.portfolio import Portfolio
+from cyripto_trader.rate_limiter import RateLimitedClient, TokenBucket
+from cyripto_trader.simulator import ExchangeSimulator, ScriptFlow
+from cyripto_trader.trader import Trader
+
+
+def make_trader(coin, polo):
+    trader = Trader(None, None, coin, 'BTC', dust_total=0.1, dust_amount=3,
+                    min_spread=0.0001, max_trading_amount=5, polo=polo)
+    trader.cancel_wait_time = 0
+    return trader
+
+
+def quiet_market(tmp_path, pairs):
+    flows = {}
+    for pair in pairs:
+        path = str(tmp_path / ('%s.jsonl' % pair))
+        with open(path, 'w') as f:
+            for order_type, price in (('sell', '0.101'), ('buy', '0.099')):
+                f.write(json.dumps({'action': 'limit', 'type': order_type, 'price': price,
+                                    'amount': '50'}) + '\n')
+        flows[pair] = ScriptFlow(path)
+    simulator = ExchangeSimulator({'BTC': 1}, flows)
+    while any(flow.position < len(flow.actions) for flow in flows.values()):
+        simulator.returnOrderBook('all')
+    return simulator
+
+
+def buy_order(number, rate, amount):
+    return {'orderNumber': number, 'type': 'buy', 'rate': rate, 'amount': amount,
+            'startingAmount': amount}
+
+
+def test_shared_balance_is_split_by_the_shares():
+    eth = make_trader('ETH', None)
+    zec = make_trader('ZEC', None)
+    portfolio = Portfolio([eth, zec], None, TokenBucket(100), shares={'BTC_ETH': 3})
+    eth.process_open_orders([])
+    zec.process_open_orders([])
+    balances = {'BTC': '1.00000000', 'ETH': '2.00000000', 'ZEC': '0.00000000'}
+    assert portfolio.balances_for(eth, balances)['BTC'] == '0.75000000'
+    assert portfolio.balances_for(zec, balances)['BTC'] == '0.25000000'
+    # coins of one pair only are all its own
+    assert portfolio.balances_for(eth, balances)['ETH'] == '2.00000000'
+
+    # what is in the open orders is part of the share
+    eth.process_open_orders([buy_order('1', '0.1', '3')])
+    balances['BTC'] = '0.70000000'
+    assert portfolio.balances_for(eth, balances)['BTC'] == '0.45000000'
+    assert portfolio.balances_for(zec, balances)['BTC'] == '0.25000000'
+    # but never more than is free
+    zec.process_open_orders([buy_order('2', '0.1', '2.5')])
+    balances['BTC'] = '0.15000000'
+    assert portfolio.balances_for(eth, balances)['BTC'] == '0.15000000'
+    assert portfolio.balances_for(zec, balances)['BTC'] == '0.00000000'
+
+
+def test_schedule_by_priority_and_waits():
+    eth = make_trader('ETH', None)
+    zec = make_trader('ZEC', None)
+    portfolio = Portfolio([eth, zec], None, TokenBucket(100))
+    # pairs never seen go first
+    portfolio.stats['BTC_ETH']['spread'] = 0.01
+    assert portfolio.schedule() == [zec, eth]
+    portfolio.stats['BTC_ZEC']['spread'] = 0.005
+    assert portfolio.schedule() == [eth, zec]
+    portfolio.stats['BTC_ZEC']['waited'] = 2
+    assert portfolio.schedule() == [zec, eth]
+
+
+def test_tick_trades_every_pair_within_the_budget(tmp_path):
+    limiter = TokenBucket(100)
+    client = RateLimitedClient(quiet_market(tmp_path, ['BTC_ETH', 'BTC_ZEC']), limiter)
+    eth = make_trader('ETH', client)
+    zec = make_trader('ZEC', client)
+    portfolio = Portfolio([eth, zec], client, limiter, shares={'BTC_ETH': 3})
+    portfolio.tick()
+    totals = dict((trader.my_pair, sum(order['total'] for order in trader.open_orders_buy))
+                  for trader in (eth, zec))
+    assert totals == {'BTC_ETH': 75000000, 'BTC_ZEC': 25000000}
+
+    # the budget has the accounts and one pair: the other waits, and goes
+    # first next tick
+    limiter.rate = 0.001
+    limiter.tokens = 5
+    portfolio.tick()
+    waited = [pair for pair, stats in portfolio.stats.items() if stats['waited']]
+    assert len(waited) == 1
+    assert portfolio.schedule()[0].my_pair == waited[0]
@@ -0,0 +1,72 @@
+from cyripto_trader.reconcile import diff_orders
+
+
+def order(number, order_type, price, amount):
+    return {'order_number': number, 'type': order_type, 'price': price, 'amount': amount}
+
+
+def want(order_type, price, amount):
+    return {'type': order_type, 'price': price, 'amount': amount}
+
+
+def test_nothing_open_places_everything():
+    desired = [want('sell', 110, 5), want('buy', 90, 5)]
+    plan = diff_orders(desired, [])
+    assert plan == {'keep': [], 'move': [], 'cancel': [], 'place': desired}
+
+
+def test_same_orders_are_kept():
+    actual = [order('1', 'sell', 110, 5), order('2', 'buy', 90, 5)]
+    plan = diff_orders([want('buy', 90, 5), want('sell', 110, 5)], actual)
+    assert plan['keep'] == [actual[1], actual[0]]
+    assert plan['move'] == plan['cancel'] == plan['place'] == []
+
+
+def test_small_amount_change_is_kept_large_is_resized():
+    actual = [order('1', 'sell', 110, 100), order('2', 'buy', 90, 100)]
+    desired = [want('sell', 110, 101), want('buy', 90, 120)]
+    plan = diff_orders(desired, actual, min_change=0.05)
+    assert plan['keep'] == [actual[0]]
+    assert plan['move'] == [(actual[1], desired[1])]
+    plan = diff_orders(desired, actual)
+    assert plan['move'] == [(actual[0], desired[0]), (actual[1], desired[1])]
+
+
+def test_moves_to_new_price_of_same_type():
+    actual = [order('1', 'sell', 110, 5), order('2', 'buy', 90, 5)]
+    desired = [want('sell', 109, 5), want('buy', 91, 5)]
+    plan = diff_orders(desired, actual)
+    assert plan['move'] == [(actual[0], desired[0]), (actual[1], desired[1])]
+    assert plan['keep'] == plan['cancel'] == plan['place'] == []
+
+
+def test_type_is_never_changed_by_a_move():
+    actual = [order('1', 'sell', 110, 5)]
+    desired = [want('buy', 90, 5)]
+    plan = diff_orders(desired, actual)
+    assert plan['cancel'] == actual
+    assert plan['place'] == desired
+    assert plan['move'] == plan['keep'] == []
+
+
+def test_ladder_leftovers_are_canceled_or_placed():
+    actual = [order('1', 'sell', 110, 5), order('2', 'sell', 111, 5), order('3', 'sell', 112, 5)]
+    desired = [want('sell', 111, 5), want('sell', 113, 5)]
+    plan = diff_orders(desired, actual)
+    assert plan['keep'] == [actual[1]]
+    assert plan['move'] == [(actual[0], desired[1])]
+    assert plan['cancel'] == [actual[2]]
+    assert plan['place'] == []
+
+    plan = diff_orders(desired + [want('sell', 114, 5), want('sell', 115, 5)], actual[:2])
+    assert plan['keep'] == [actual[1]]
+    assert plan['move'] == [(actual[0], desired[1])]
+    assert plan['place'] == [want('sell', 114, 5), want('sell', 115, 5)]
+    assert plan['cancel'] == []
+
+
+def test_duplicate_prices_match_once():
+    actual = [order('1', 'buy', 90, 5), order('2', 'buy', 90, 5)]
+    plan = diff_orders([want('buy', 90, 5)], actual)
+    assert plan['keep'] == [actual[0]]
+    assert plan['cancel'] == [actual[1]]
@@ -0,0 +1,116 @@
+import os
+import random
+
+from cyripto_trader.order_book import OrderBook
+from cyripto_trader.recording import MarketRecorder, Recording, read_recording
+from cyripto_trader.satoshi import from_satoshi
+
+PAIR = 'BTC_ETH'
+
+
+def level(rand, low):
+    return [from_satoshi(rand.randrange(low, low + 100) * 1000),
+            from_satoshi(rand.randrange(1, 10 ** 9))]
+
+
+def make_events(count, seed=7):
+    rand = random.Random(seed)
+    events = [{'type': 'snapshot', 'pair': PAIR, 'seq': 1, 'ts': 1000.0,
+               'bids': sorted([level(rand, 1000) for _ in range(10)], reverse=True),
+               'asks': sorted([level(rand, 2000) for _ in range(10)])}]
+    seq = 1
+    for index in range(count):
+        ts = 1000.0 + (index + 1) * 0.25
+        if rand.random() < 0.2:
+            events.append({'type': 'trade', 'pair': PAIR, 'seq': seq, 'ts': ts,
+                           'trade_type': rand.choice(['buy', 'sell']),
+                           'price': level(rand, 1500)[0], 'amount': level(rand, 0)[1]})
+            continue
+        seq += 1
+        changes = []
+        for _ in range(rand.randrange(1, 4)):
+            order_type = rand.choice(['buy', 'sell'])
+            price, amount = level(rand, 1000 if order_type == 'buy' else 2000)
+            if rand.random() < 0.3:
+                amount = from_satoshi(0)
+            changes.append([order_type, price, amount])
+        events.append({'type': 'update', 'pair': PAIR, 'seq': seq, 'ts': ts,
+                       'changes': changes})
+    return events
+
+
+def record(directory, events, **options):
+    recorder = MarketRecorder(str(directory), PAIR, **options)
+    for event in events:
+        recorder.record(event)
+    recorder.close()
+    return os.path.join(str(directory), PAIR + '.rec')
+
+
+def book_of(events):
+    book = OrderBook()
+    for event in events:
+        if event['type'] == 'snapshot':
+            book.apply_snapshot(event['bids'], event['asks'], event['seq'])
+        elif event['type'] == 'update':
+            assert book.apply_updates(event['seq'], event['changes'])
+    return dict((order_type, list(zip(side.prices, side.amounts)))
+                for order_type, side in book.sides.items())
+
+
+def without_snapshots(events):
+    return [event for event in events if event['type'] != 'snapshot']
+
+
+def test_round_trip(tmp_path):
+    events = make_events(500)
+    path = record(tmp_path, events, block_records=64)
+    recording = Recording(path)
+    try:
+        assert recording.pair == PAIR
+        assert recording.blocks > 5
+        read = list(recording.events())
+    finally:
+        recording.close()
+    # every block after the first starts with a snapshot of the book
+    assert read[0] == events[0]
+    assert without_snapshots(read) == without_snapshots(events)
+    assert book_of(read) == book_of(events)
+
+
+def test_seek(tmp_path):
+    events = make_events(500)
+    path = record(tmp_path, events, block_records=64)
+    for start, end in [(1000.0, None), (1030.0, None), (1060.25, 1100.0), (1124.0, 1125.0),
+                       (2000.0, None)]:
+        read = list(read_recording(path, start, end))
+        expected = [event for event in events
+                    if event['ts'] >= start and (end is None or event['ts'] <= end)]
+        assert without_snapshots(read) == without_snapshots(expected)
+        if not expected:
+            assert read == []
+            continue
+        if expected[0]['type'] != 'snapshot':
+            assert read[0]['type'] == 'snapshot'
+        before = [event for event in events if event['ts'] < start]
+        assert book_of(read) == book_of(before + expected)
+
+
+def test_appends_and_half_written_block(tmp_path):
+    events = make_events(300)
+    record(tmp_path, events[:150], block_records=32)
+    path = record(tmp_path, events[150:], block_records=32)
+    assert without_snapshots(read_recording(path)) == without_snapshots(events)
+
+    recording = Recording(path)
+    blocks = recording.blocks
+    last_ts = recording.entry(blocks - 2)[1]
+    recording.close()
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+    recording = Recording(path)
+    assert recording.blocks == blocks - 1
+    recording.close()
+    read = list(read_recording(path))
+    assert without_snapshots(read) == without_snapshots(
+        [event for event in events if event['ts'] * 1000000 <= last_ts])
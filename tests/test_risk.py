@@ -0,0 +1,136 @@
+from cyripto_trader.config import RiskConfig, make_config
+from cyripto_trader.risk import RiskGate, make_risk_gate
+from cyripto_trader.satoshi import mul_satoshi, to_satoshi
+
+PAIR = 'BTC_ETH'
+BID = to_satoshi('0.099')
+ASK = to_satoshi('0.101')
+MID = to_satoshi('0.1')
+
+
+def check(gate, order_type, price, amount, extra=0, pair=PAIR):
+    return gate.check(pair, order_type, to_satoshi(price), to_satoshi(amount), BID, ASK,
+                      to_satoshi(extra))
+
+
+def test_collar():
+    gate = RiskGate(collar=0.05)
+    assert check(gate, 'sell', '0.105', 1) is None
+    assert check(gate, 'buy', '0.095', 1) is None
+    assert check(gate, 'sell', '0.10501', 1) == 'price outside the collar'
+    assert check(gate, 'buy', '0.09499', 1) == 'price outside the collar'
+    assert gate.blocked == 2
+    assert check(RiskGate(collar=None), 'buy', '0.01', 1) is None
+
+
+def test_position_limit():
+    gate = RiskGate(max_position=10, positions={'BTC_XMR': 1})
+    gate.set_position(PAIR, to_satoshi(6))
+    assert check(gate, 'buy', '0.1', 4) is None
+    assert check(gate, 'buy', '0.1', '4.00000001') == 'position limit'
+    # sells never add to the position
+    assert check(gate, 'sell', '0.1', 100) is None
+    gate.open_order(PAIR, {'type': 'buy', 'amount': to_satoshi(3),
+                           'total': to_satoshi('0.3')})
+    assert check(gate, 'buy', '0.1', 1) is None
+    assert check(gate, 'buy', '0.1', 1, extra=1) == 'position limit'
+    # a move replaces its order
+    assert check(gate, 'buy', '0.1', 3, extra=-2) is None
+    gate.reset_open(PAIR)
+    assert check(gate, 'buy', '0.1', 4) is None
+    assert check(gate, 'buy', '0.1', 2, pair='BTC_XMR') == 'position limit'
+
+
+def test_exposure_limit():
+    gate = RiskGate(max_exposure=1, collar=None)
+    gate.set_position(PAIR, to_satoshi(5))
+    # the value is known from the first check on, 5 at the mid of 0.1
+    assert check(gate, 'buy', '0.1', 5) is None
+    assert gate.exposure == to_satoshi('0.5')
+    assert check(gate, 'buy', '0.1', '5.0001') == 'exposure limit'
+    gate.open_order(PAIR, {'type': 'buy', 'amount': to_satoshi(2),
+                           'total': to_satoshi('0.2')})
+    assert gate.exposure == to_satoshi('0.7')
+    assert check(gate, 'buy', '0.1', 3) is None
+    assert check(gate, 'buy', '0.1', 4) == 'exposure limit'
+    # other pairs count too
+    gate.set_position('BTC_XMR', to_satoshi(1))
+    gate.check('BTC_XMR', 'sell', MID, 1, MID, MID)
+    assert check(gate, 'buy', '0.1', 3) == 'exposure limit'
+    gate.open_order(PAIR, {'type': 'buy', 'amount': to_satoshi(2),
+                           'total': to_satoshi('0.2')}, -1)
+    assert check(gate, 'buy', '0.1', 3) is None
+
+
+def test_buy_room_fits_the_checks():
+    for max_position, max_exposure, position, open_buy in [
+            (10, None, 6, 0), (None, 1, 5, 0), (10, 1, 2, 1), (10, 2, 3, 3), (4, 1, 5, 0),
+            (None, None, 1, 1)]:
+        gate = RiskGate(max_position=max_position, max_exposure=max_exposure)
+        gate.set_position(PAIR, to_satoshi(position))
+        if open_buy:
+            gate.open_order(PAIR, {'type': 'buy', 'amount': to_satoshi(open_buy),
+                                   'total': mul_satoshi(MID, to_satoshi(open_buy))})
+        for price in (MID, to_satoshi('0.0995'), to_satoshi('0.1049')):
+            room = gate.buy_room(PAIR, price, BID, ASK)
+            if max_position is None and max_exposure is None:
+                assert room is None
+                continue
+            # the open buys are in the room, so they are taken out of the order
+            amount = room - to_satoshi(open_buy)
+            if amount > 0:
+                assert gate.check(PAIR, 'buy', price, amount, BID, ASK) is None
+                assert gate.check(PAIR, 'buy', price, amount + to_satoshi('0.001'),
+                                  BID, ASK) is not None
+            else:
+                assert gate.check(PAIR, 'buy', price, to_satoshi('0.001'),
+                                  BID, ASK) is not None
+
+
+def test_order_rate():
+    gate = RiskGate(max_order_rate=3)
+    assert [check(gate, 'sell', '0.1', 1) for _ in range(4)] == [None] * 3 + ['order rate']
+
+
+def test_kill_switch_and_loss():
+    gate = RiskGate(max_loss=1)
+    gate.set_realized(PAIR, to_satoshi(-1))
+    assert check(gate, 'sell', '0.1', 1) is None
+    gate.set_realized('BTC_XMR', to_satoshi('-0.1'))
+    assert gate.killed is not None
+    assert check(gate, 'sell', '0.1', 1).startswith('kill switch: loss of')
+    gate.resume()
+    assert check(gate, 'sell', '0.1', 1) is None
+    gate.kill('by hand')
+    gate.kill('again')
+    assert check(gate, 'buy', '0.1', 1) == 'kill switch: by hand'
+
+
+def test_kill_file(tmp_path, monkeypatch):
+    kill_file = tmp_path / 'KILL'
+    now = [1000.0]
+    monkeypatch.setattr('cyripto_trader.risk.time.time', lambda: now[0])
+    gate = RiskGate(kill_file=str(kill_file), kill_check_interval=5)
+    gate.poll()
+    assert gate.killed is None
+    kill_file.write_text('')
+    now[0] += 4
+    gate.poll()
+    # looked at most once every kill_check_interval seconds
+    assert gate.killed is None
+    now[0] += 1
+    gate.poll()
+    assert gate.killed == 'kill file %s' % kill_file
+    assert check(gate, 'sell', '0.1', 1) == 'kill switch: kill file %s' % kill_file
+
+
+def test_make_risk_gate():
+    assert make_risk_gate(RiskConfig()) is None
+    config = make_config({'coin': {'my_coin': 'ETH', 'currency': 'BTC', 'max_position': 2},
+                          'dust_total': 0.01, 'dust_amount': 1, 'min_spread': 0.005,
+                          'max_trading_amount': 0.5,
+                          'risk': {'enabled': True, 'max_position': 5, 'collar': None}})
+    gate = make_risk_gate(config.risk, config.pairs)
+    assert gate.pair(PAIR).max_position == to_satoshi(2)
+    assert gate.pair('BTC_XMR').max_position == to_satoshi(5)
+    assert gate.collar is None
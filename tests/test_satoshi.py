@@ -0,0 +1,69 @@
+import decimal
+import random
+
+import pytest
+
+from cyripto_trader.satoshi import (QUANT, SATOSHI, div_round, div_satoshi, from_satoshi,
+                                    mul_satoshi, to_satoshi)
+
+
+def quantize(value):
+    return int(value.quantize(QUANT) * SATOSHI)
+
+
+def coins(value):
+    return decimal.Decimal(value) / SATOSHI
+
+
+def numbers(count, seed):
+    rand = random.Random(seed)
+    values = [0, 1, 2, 5, 50000000, SATOSHI, 150000000, 99999999, 123456789012]
+    for _ in range(count):
+        values.append(rand.randrange(1, 10 ** rand.randrange(1, 16)))
+    return values
+
+
+def test_mul_satoshi_is_quantized_product():
+    values = numbers(200, 1)
+    for a in values:
+        for b in values[:20]:
+            assert mul_satoshi(a, b) == quantize(coins(a) * coins(b))
+
+
+def test_div_satoshi_is_quantized_quotient():
+    values = numbers(200, 2)
+    with decimal.localcontext() as context:
+        context.prec = 60
+        for a in values:
+            for b in values[1:20]:
+                assert div_satoshi(a, b) == quantize(coins(a) / coins(b))
+
+
+@pytest.mark.parametrize('numerator, denominator, expected', [
+    (5, 2, 2), (7, 2, 4), (-5, 2, -2), (-7, 2, -4), (1, 3, 0), (2, 3, 1), (9, 3, 3)])
+def test_div_round_half_even(numerator, denominator, expected):
+    assert div_round(numerator, denominator) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '0', '1', '0.00000001', '0.12345678', '123.4', '.5', '5.', '-0.00000001', '-42.1',
+    '0.123456785', '0.123456775', '1e-5', '  0.3 ', '99999999.99999999'])
+def test_to_satoshi_of_strings(text):
+    assert to_satoshi(text) == quantize(decimal.Decimal(text))
+
+
+def test_to_satoshi_of_numbers():
+    rand = random.Random(3)
+    for _ in range(1000):
+        value = round(rand.uniform(-1000, 1000), rand.randrange(0, 10))
+        assert to_satoshi(value) == quantize(decimal.Decimal(value))
+    assert to_satoshi(3) == 3 * SATOSHI
+    assert to_satoshi(1e8) == quantize(decimal.Decimal(1e8))
+    assert to_satoshi(decimal.Decimal('0.000000015')) == 2
+
+
+def test_from_satoshi_round_trip():
+    for value in numbers(200, 4) + [-1, -SATOSHI, -123456789]:
+        text = from_satoshi(value)
+        assert decimal.Decimal(text) == coins(value)
+        assert to_satoshi(text) == value
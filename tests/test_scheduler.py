@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from cyripto_trader.order_book import OrderBook
+from cyripto_trader.rate_limiter import TokenBucket
+from cyripto_trader.scheduler import TickScheduler
+from cyripto_trader.simulator import ExchangeSimulator, ScriptFlow
+from cyripto_trader.trader import Trader
+
+PAIR = 'BTC_ETH'
+
+
+def book(bid, ask, seq=None):
+    result = OrderBook()
+    result.apply_snapshot([[bid, '5']], [[ask, '5']], seq)
+    return result
+
+
+def test_quiet_market_waits_the_base_wait():
+    scheduler = TickScheduler(base_wait=0.8, min_wait=0.2, max_wait=5.0)
+    assert scheduler.next_wait(book('0.099', '0.101', 1)) == 0.8
+    assert scheduler.next_wait(book('0.099', '0.101', 2)) == 0.8
+
+
+def test_moving_market_waits_less():
+    scheduler = TickScheduler(base_wait=0.8, min_wait=0.2, volatility_scale=0.0005)
+    scheduler.next_wait(book('0.099', '0.101'))
+    # the mid moves 0.05%, the wait is halved
+    assert scheduler.next_wait(book('0.09905', '0.10105')) == pytest.approx(0.4)
+    # and never goes under min_wait
+    assert scheduler.next_wait(book('0.2', '0.21')) == 0.2
+
+
+def test_idle_book_waits_longer_but_not_with_orders():
+    scheduler = TickScheduler(base_wait=0.8, max_wait=5.0, order_wait=1.0, idle_after=10.0)
+    scheduler.next_wait(book('0.099', '0.101'))
+    scheduler.changed -= 30
+    assert scheduler.next_wait(book('0.099', '0.101')) == pytest.approx(2.4, rel=0.01)
+    assert scheduler.next_wait(book('0.099', '0.101'), open_orders=1) == 1.0
+    scheduler.changed -= 300
+    assert scheduler.next_wait(book('0.099', '0.101')) == 5.0
+    # a change starts over
+    assert scheduler.next_wait(book('0.099', '0.1011')) < 0.8
+
+
+def test_wait_for_the_request_budget():
+    limiter = TokenBucket(rate=2, burst=6)
+    scheduler = TickScheduler(base_wait=0.8, max_wait=5.0, limiter=limiter)
+    assert scheduler.next_wait(book('0.099', '0.101'), calls=3) == 0.8
+    while limiter.try_acquire():
+        pass
+    assert scheduler.next_wait(book('0.099', '0.101'), calls=6) == pytest.approx(3.0, rel=0.01)
+
+
+class CallLog(object):
+    """
+    the exchange, with the names of the methods called on it.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.calls = []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.exchange, name)
+
+
+def test_quiet_ticks_skip_the_balance_loads(tmp_path):
+    with open(str(tmp_path / 'flow.jsonl'), 'w') as f:
+        for order_type, price in (('sell', '0.101'), ('buy', '0.099')):
+            f.write(json.dumps({'action': 'limit', 'type': order_type, 'price': price,
+                                'amount': '5'}) + '\n')
+    flow = ScriptFlow(str(tmp_path / 'flow.jsonl'))
+    simulator = ExchangeSimulator({'BTC': 1}, {PAIR: flow})
+    while flow.position < len(flow.actions):
+        simulator.returnOrderBook(PAIR)
+    polo = CallLog(simulator)
+    trader = Trader(None, None, 'ETH', 'BTC', dust_total=0.1, dust_amount=3,
+                    min_spread=0.0001, max_trading_amount=5, polo=polo)
+    trader.cancel_wait_time = 0
+
+    def tick():
+        del polo.calls[:]
+        trader.load_market()
+        trader.scalp()
+        return [call for call in polo.calls if call.startswith('return')]
+
+    assert tick() == ['returnOrderBook', 'returnOpenOrders', 'returnBalances']
+    # the buy went out, the balances changed
+    assert trader.open_orders
+    assert tick() == ['returnOrderBook', 'returnOpenOrders', 'returnBalances']
+    assert tick() == ['returnOrderBook']
+    assert tick() == ['returnOrderBook']
+
+    # part of the buy is filled
+    flow.actions.append({'action': 'market', 'type': 'sell', 'amount': '1'})
+    assert tick() == ['returnOrderBook', 'returnOpenOrders', 'returnBalances']
+    while tick() != ['returnOrderBook']:
+        pass
+
+    # and a minute later they are loaded anyway
+    trader.balances_loaded -= trader.balance_max_age + 1
+    assert tick() == ['returnOrderBook', 'returnOpenOrders', 'returnBalances']
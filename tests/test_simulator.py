@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from cyripto_trader.satoshi import to_satoshi
+from cyripto_trader.simulator import (MARKET, ME, ExchangeSimulator, MatchingEngine, RandomFlow,
+                                      ScriptFlow, run_load_test)
+from cyripto_trader.trader import Trader
+
+PAIR = 'BTC_ZEC'
+
+
+def engine_order(number, order_type, price, amount, account=MARKET):
+    return {'number': number, 'account': account, 'type': order_type, 'price': price,
+            'amount': amount, 'starting_amount': amount, 'held': 0}
+
+
+def test_matching_price_time_priority():
+    engine = MatchingEngine(PAIR)
+    engine.rest(engine_order(1, 'sell', 102, 5))
+    engine.rest(engine_order(2, 'sell', 101, 5))
+    engine.rest(engine_order(3, 'sell', 101, 5))
+    engine.rest(engine_order(4, 'buy', 99, 5))
+    assert engine.best('sell') == 101
+    assert engine.best('buy') == 99
+    assert engine.depth('sell', 5) == [[101, 10], [102, 5]]
+
+    taker = engine_order(5, 'buy', 102, 12)
+    fills = engine.match(taker)
+    assert [(maker['number'], price, amount) for maker, price, amount in fills] == [
+        (2, 101, 5), (3, 101, 5), (1, 102, 2)]
+    assert taker['amount'] == 0
+    assert engine.depth('sell', 5) == [[102, 3]]
+    # a market order takes any price
+    fills = engine.match(engine_order(6, 'sell', None, 10))
+    assert [(maker['number'], amount) for maker, price, amount in fills] == [(4, 5)]
+    assert engine.best('buy') is None
+
+
+def script(tmp_path, actions):
+    path = tmp_path / 'flow.jsonl'
+    path.write_text(''.join(json.dumps(action) + '\n' for action in actions))
+    return ScriptFlow(str(path))
+
+
+def test_my_orders_against_a_script(tmp_path):
+    flow = script(tmp_path, [
+        {'action': 'limit', 'type': 'sell', 'price': '0.0202', 'amount': '3', 'ref': 'a'},
+        {'action': 'limit', 'type': 'buy', 'price': '0.0198', 'amount': '3'},
+        {'action': 'market', 'type': 'sell', 'amount': '2'},
+        {'action': 'cancel', 'ref': 'a'},
+    ])
+    simulator = ExchangeSimulator({'BTC': 1}, {PAIR: flow}, maker_fee=0.001, taker_fee=0.002)
+    # one flow action runs before each call
+    book = simulator.returnOrderBook(PAIR)
+    assert book['asks'] == [['0.02020000', '3.00000000']]
+    assert book['bids'] == []
+    number = simulator.buy(PAIR, '0.0199', '5')['orderNumber']
+    assert simulator.engines[PAIR].best('buy') == to_satoshi('0.0199')
+    # the market sell fills 2 of my buy at my price, with the maker fee
+    assert simulator.returnBalances() == {'BTC': '0.90050000', 'ZEC': '1.99800000'}
+    # the cancel takes the ask away
+    orders = simulator.returnOpenOrders(PAIR)
+    assert [(order['orderNumber'], order['amount']) for order in orders] == [(number,
+                                                                              '3.00000000')]
+    assert simulator.returnOrderBook(PAIR)['asks'] == []
+    history = simulator.returnTradeHistory(PAIR, start=0, end=2 ** 40)
+    assert [(trade['amount'], trade['rate'], trade['type']) for trade in history] == [
+        ('2.00000000', '0.01990000', 'buy')]
+    assert history[0]['fee'] == '0.00100000'
+
+    # the script is done, a move that can't be placed leaves the order
+    with pytest.raises(RuntimeError, match='Not enough BTC'):
+        simulator.moveOrder(number, '0.0199', '100')
+    assert simulator.returnOpenOrders(PAIR)[0]['amount'] == '3.00000000'
+    retval = simulator.moveOrder(number, '0.0197', '4')
+    assert simulator.balances['BTC'] == to_satoshi('0.8814')
+    assert simulator.cancelOrder(retval['orderNumber']) == {'success': 1}
+    assert simulator.balances['BTC'] == to_satoshi('1') - to_satoshi('0.0398')
+    with pytest.raises(RuntimeError, match='Invalid order number'):
+        simulator.cancelOrder(retval['orderNumber'])
+
+
+def test_taker_fills_and_rate_limit():
+    flow = RandomFlow(mid=0.02, tick=0.00001, depth=5, amount=1, seed=1)
+    simulator = ExchangeSimulator({'BTC': 1}, {PAIR: flow}, flow_steps=0, taker_fee=0.002,
+                                  rate_limit=2)
+    ask = to_satoshi(simulator.returnOrderBook(PAIR)['asks'][0][0])
+    retval = simulator.buy(PAIR, '0.03', '0.5')
+    assert retval['resultingTrades'][0]['rate'] == '%.8f' % (ask / 1e8)
+    with pytest.raises(RuntimeError, match='Please do not make more than 2 API calls'):
+        simulator.returnOpenOrders(PAIR)
+    # filled at once, nothing rests and the price difference came back
+    assert simulator.account.orders_filled == 1
+    assert simulator.engines[PAIR].mine == {}
+
+
+def make_trader(simulator, **options):
+    trader = Trader(None, None, 'ZEC', 'BTC', dust_total=0.05, dust_amount=5,
+                    min_spread=0.00001, max_trading_amount=5, polo=simulator, **options)
+    return trader
+
+
+@pytest.mark.parametrize('levels', [1, 3])
+def test_trader_loop_against_the_simulator(levels):
+    simulator = ExchangeSimulator({'BTC': 1, 'ZEC': 10}, {PAIR: RandomFlow(seed=5)},
+                                  flow_steps=3)
+    trader = make_trader(simulator)
+    trader.ladder_levels = levels
+    report = run_load_test(trader, simulator, 200)
+    assert report['ticks'] == 200
+    assert report['trades'] > 0
+    assert report['api_calls'] >= 200
+    assert simulator.account.orders_placed > 0
+    for balance in simulator.balances.values():
+        assert balance >= 0
+
+    # the trader's book of my orders is the exchange's
+    trader.load_balances()
+    mine = simulator.engines[PAIR].mine
+    assert sorted(str(order['order_number']) for order in trader.open_orders) == sorted(
+        str(number) for number in mine)
+    held = dict((coin, 0) for coin in ('BTC', 'ZEC'))
+    for order in mine.values():
+        held['ZEC' if order['type'] == 'sell' else 'BTC'] += order['held']
+    assert trader.total_coin_balance == simulator.balances['ZEC'] + held['ZEC']
+    assert len(trader.open_orders) <= levels
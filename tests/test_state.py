@@ -0,0 +1,121 @@
+import json
+import time
+
+from cyripto_trader.simulator import ExchangeSimulator, ScriptFlow
+from cyripto_trader.state import StateFile
+from cyripto_trader.trader import Trader
+
+PAIR = 'BTC_ETH'
+
+
+class CallLog(object):
+    """
+    the exchange, with the names of the methods called on it.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.calls = []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.exchange, name)
+
+
+def market(tmp_path):
+    """
+    a simulator whose market places a book of three levels a side and goes
+    quiet.
+    """
+    with open(str(tmp_path / 'flow.jsonl'), 'w') as f:
+        for order_type, prices in (('sell', ['0.101', '0.102', '0.103']),
+                                   ('buy', ['0.099', '0.098', '0.097'])):
+            for price in prices:
+                f.write(json.dumps({'action': 'limit', 'type': order_type, 'price': price,
+                                    'amount': '5'}) + '\n')
+    flow = ScriptFlow(str(tmp_path / 'flow.jsonl'))
+    exchange = ExchangeSimulator({'BTC': 1}, {PAIR: flow})
+    while flow.position < len(flow.actions):
+        exchange.returnOrderBook(PAIR)
+    return exchange
+
+
+def make_trader(polo, path):
+    trader = Trader(None, None, 'ETH', 'BTC', dust_total=0.1, dust_amount=3,
+                    min_spread=0.0001, max_trading_amount=5, polo=polo)
+    trader.cancel_wait_time = 0
+    trader.state_file = StateFile(str(path))
+    return trader
+
+
+def run_tick(trader):
+    trader.start_tick()
+    trader.load_market()
+    trader.scalp()
+    trader.end_tick()
+
+
+def test_save_skips_unchanged_state(tmp_path):
+    state_file = StateFile(str(tmp_path / 'state.json'))
+    assert state_file.save({'a': 1})
+    assert not state_file.save({'a': 1})
+    assert state_file.save({'a': 2})
+    assert state_file.load() == {'a': 2}
+    assert [path.name for path in tmp_path.iterdir()] == ['state.json']
+
+
+def test_load_rejects_old_and_foreign_states(tmp_path):
+    path = tmp_path / 'state.json'
+    assert StateFile(str(path)).load() is None
+    path.write_text('{"version": 1, "saved": ')
+    assert StateFile(str(path)).load() is None
+    path.write_text(json.dumps({'version': 0, 'saved': time.time(), 'state': {}}))
+    assert StateFile(str(path)).load() is None
+    path.write_text(json.dumps({'version': 1, 'saved': time.time() - 700, 'state': {}}))
+    assert StateFile(str(path)).load() is None
+    assert StateFile(str(path), max_age=0).load() == {}
+
+
+def test_resumed_trader_keeps_its_saved_orders(tmp_path):
+    exchange = market(tmp_path)
+    first = make_trader(exchange, tmp_path / 'state.json')
+    run_tick(first)
+    run_tick(first)
+    saved = first.open_orders
+    assert [order['type'] for order in saved] == ['buy']
+
+    polo = CallLog(exchange)
+    trader = make_trader(polo, tmp_path / 'state.json')
+    assert trader.resume()
+    assert trader.open_orders == saved
+    assert trader.currency_balance == first.currency_balance
+    run_tick(trader)
+    # nothing changed since the save: no reload, and the order is kept
+    assert polo.calls == ['returnOrderBook']
+    assert trader.open_orders == saved
+    assert trader.trade == 'buy'
+
+
+def test_resumed_trader_reloads_old_or_touched_orders(tmp_path):
+    exchange = market(tmp_path)
+    first = make_trader(exchange, tmp_path / 'state.json')
+    run_tick(first)
+    run_tick(first)
+    first.balances_loaded -= first.balance_max_age + 1
+    first.end_tick()
+
+    polo = CallLog(exchange)
+    trader = make_trader(polo, tmp_path / 'state.json')
+    assert trader.resume()
+    trader.load_market()
+    assert 'returnOpenOrders' in polo.calls
+
+    # the order was hit while the trader was down
+    first.balances_loaded = time.time()
+    first.end_tick()
+    exchange.flows[PAIR].actions.append({'action': 'market', 'type': 'sell', 'amount': '2'})
+    polo = CallLog(exchange)
+    trader = make_trader(polo, tmp_path / 'state.json')
+    assert trader.resume()
+    trader.load_market()
+    assert 'returnOpenOrders' in polo.calls
+    assert trader.open_orders[0]['amount'] < first.open_orders[0]['amount']
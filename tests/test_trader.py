@@ -0,0 +1,100 @@
+import pytest
+
+from cyripto_trader.backtest import BacktestExchange
+from cyripto_trader.rate_limiter import TokenBucket
+from cyripto_trader.risk import RiskGate
+from cyripto_trader.satoshi import to_satoshi
+from cyripto_trader.simulator import ExchangeSimulator, RandomFlow
+from cyripto_trader.trader import ConcurrentTrader, Trader
+
+PAIR = 'BTC_ETH'
+
+
+def market(currency_balance=1, coin_balance=0):
+    exchange = BacktestExchange(PAIR, currency_balance, coin_balance, 0, 0)
+    exchange.apply_market_event({
+        'type': 'snapshot', 'pair': PAIR, 'seq': 1, 'ts': 1000.0,
+        'bids': [['0.099', '5'], ['0.098', '5'], ['0.097', '5'], ['0.096', '5']],
+        'asks': [['0.101', '5'], ['0.102', '5'], ['0.103', '5'], ['0.104', '5']]})
+    return exchange
+
+
+def make_trader(polo, trader_class=Trader, **options):
+    if trader_class is ConcurrentTrader:
+        options['limiter'] = TokenBucket(1000)
+    trader = trader_class(None, None, 'ETH', 'BTC', dust_total=0.1, dust_amount=3,
+                          min_spread=0.0001, max_trading_amount=5, polo=polo, **options)
+    trader.cancel_wait_time = 0
+    return trader
+
+
+def open_amounts(exchange):
+    return sorted(order['amount'] for order in exchange.returnOpenOrders(PAIR))
+
+
+def test_buys_when_there_is_currency():
+    trader = make_trader(market(currency_balance=1, coin_balance=20))
+    trader.load_market()
+    assert trader.decide_to_trade()
+    assert trader.trade == 'buy'
+
+
+def test_sells_when_the_risk_limits_leave_no_buy():
+    exchange = market(currency_balance=1, coin_balance=20)
+    trader = make_trader(exchange)
+    trader.risk = RiskGate(max_position=20)
+    trader.load_market()
+    trader.scalp()
+    assert trader.trade == 'sell'
+    assert [order['type'] for order in exchange.returnOpenOrders(PAIR)] == ['sell']
+
+    # room for less than the smallest order is no room either
+    trader.risk = RiskGate(max_position='20.0001')
+    trader.load_market()
+    assert trader.decide_to_trade()
+    assert trader.trade == 'sell'
+
+    trader.risk = RiskGate(max_position=21)
+    trader.load_market()
+    assert trader.decide_to_trade()
+    assert trader.trade == 'buy'
+
+
+def test_loop_at_the_position_limit_sells():
+    simulator = ExchangeSimulator({'BTC': 1}, {'BTC_ZEC': RandomFlow(seed=5)}, flow_steps=3)
+    trader = Trader(None, None, 'ZEC', 'BTC', dust_total=0.05, dust_amount=5,
+                    min_spread=0.0000001, max_trading_amount=5, polo=simulator)
+    trader.risk = RiskGate(max_position=20, collar=None)
+    trader.cancel_wait_time = 0
+    decisions = []
+    for _ in range(300):
+        trader.start_tick()
+        trader.load_market()
+        trader.scalp()
+        decisions.append(trader.trade)
+    assert decisions.count('sell') > 0
+    assert to_satoshi(simulator._balances()['ZEC']) <= to_satoshi(20)
+
+
+@pytest.mark.parametrize('trader_class', [Trader, ConcurrentTrader])
+def test_ladder_rebalance_within_the_position_limit(trader_class):
+    exchange = market(currency_balance=10)
+    exchange.buy(PAIR, '0.098', '2.54')
+    exchange.buy(PAIR, '0.097', '9.85')
+    trader = make_trader(exchange, trader_class)
+    trader.risk = RiskGate(max_position='12.4', collar=None)
+    trader.load_market()
+
+    desired = [{'type': 'buy', 'price': to_satoshi('0.098'), 'amount': to_satoshi('6.2')},
+               {'type': 'buy', 'price': to_satoshi('0.097'), 'amount': to_satoshi('6.2')}]
+    plan = trader.reconcile_orders(desired)
+    assert len(plan['move']) == 2
+    assert trader.risk.blocked == 0
+    assert open_amounts(exchange) == ['6.20000000', '6.20000000']
+
+    # over the limit once done, the growing move is still blocked
+    desired[1]['amount'] = to_satoshi('6.3')
+    trader.load_market()
+    trader.reconcile_orders(desired)
+    assert trader.risk.blocked == 1
+    assert open_amounts(exchange) == ['6.20000000', '6.20000000']
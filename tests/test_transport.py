@@ -0,0 +1,130 @@
+import hashlib
+import hmac
+import threading
+
+import pytest
+import requests
+
+from cyripto_trader.transport import NonceGenerator, PoloniexClient
+
+
+class Response(object):
+    def __init__(self, answer, status_code=200):
+        self.answer = answer
+        self.status_code = status_code
+
+    def json(self):
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+class Session(object):
+    """
+    answers the calls in turn, an exception is raised.
+    """
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def send(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def get(self, url, **kwargs):
+        return self.send('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.send('post', url, **kwargs)
+
+
+def client(*answers, **options):
+    options.setdefault('backoff', 0)
+    polo = PoloniexClient('key', 'secret', url='http://simulator/', **options)
+    polo.session = Session(*answers)
+    return polo
+
+
+def test_nonces_always_increase_across_threads():
+    nonces = NonceGenerator()
+    seen = []
+
+    def take():
+        seen.extend(nonces.next() for _ in range(1000))
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(seen)) == 4000
+    assert next(nonces) > max(seen)
+
+
+def test_private_call_is_signed():
+    polo = client(Response({'BTC': '1'}))
+    assert polo.returnBalances() == {'BTC': '1'}
+    method, url, kwargs = polo.session.calls[0]
+    assert (method, url) == ('post', 'http://simulator/tradingApi')
+    assert 'command=returnBalances' in kwargs['data']
+    assert kwargs['headers']['Key'] == 'key'
+    assert kwargs['headers']['Sign'] == hmac.new(b'secret', kwargs['data'].encode('utf-8'),
+                                                 hashlib.sha512).hexdigest()
+
+
+def test_public_call_leaves_out_none():
+    polo = client(Response({'bids': [], 'asks': []}))
+    polo.returnOrderBook(currencyPair='BTC_ETH', depth=None)
+    method, url, kwargs = polo.session.calls[0]
+    assert (method, url) == ('get', 'http://simulator/public')
+    assert kwargs['params'] == {'command': 'returnOrderBook', 'currencyPair': 'BTC_ETH'}
+
+
+def test_reads_are_retried():
+    polo = client(requests.ConnectionError('down'), Response({}, 502), requests.Timeout('slow'),
+                  Response({'ok': 1}), retries=3)
+    assert polo.returnOpenOrders('BTC_ETH') == {'ok': 1}
+    assert len(polo.session.calls) == 4
+
+
+def test_reads_give_up_after_the_retries():
+    polo = client(requests.Timeout('slow'), requests.Timeout('slow'), retries=1)
+    with pytest.raises(RuntimeError, match='returnBalances failed: slow'):
+        polo.returnBalances()
+
+
+def test_writes_are_not_retried():
+    polo = client(requests.Timeout('slow'), Response({'orderNumber': 1}))
+    with pytest.raises(RuntimeError, match='buy failed'):
+        polo.buy('BTC_ETH', '0.1', '1')
+    assert len(polo.session.calls) == 1
+
+
+def test_nonce_errors_are_retried_for_writes():
+    polo = client(Response({'error': 'Nonce must be greater than 5.'}),
+                  Response({'orderNumber': 1}))
+    assert polo.sell('BTC_ETH', '0.1', '1') == {'orderNumber': 1}
+
+
+@pytest.mark.parametrize('answer, message', [
+    (Response({'error': 'Not enough BTC.'}), 'Not enough BTC.'),
+    (Response({'error': 'Invalid nonce'}, 200), 'Invalid nonce'),
+    (Response(ValueError('no json')), 'returnBalances: invalid answer, status 200'),
+    (Response(requests.exceptions.InvalidJSONError('no json'), 500),
+     'returnBalances: invalid answer, status 500'),
+    (requests.exceptions.ChunkedEncodingError('cut'), 'returnBalances failed: cut'),
+    (requests.exceptions.InvalidURL('bad url'), 'returnBalances failed: bad url'),
+])
+def test_errors_are_runtime_errors(answer, message):
+    polo = client(answer, answer, answer, retries=2)
+    with pytest.raises(RuntimeError, match='^' + message):
+        polo.returnBalances()
+
+
+def test_private_call_needs_keys():
+    polo = PoloniexClient(url='http://simulator')
+    with pytest.raises(RuntimeError, match='needs the api key'):
+        polo.returnBalances()